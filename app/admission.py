@@ -0,0 +1,267 @@
+# admission.py - Admission Control: Concurrency Limit, Priority Queue and Step-by-step Load Shedding
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, Iterator, AsyncIterator, Callable
+
+import numpy as np
+
+import metrics
+
+# Requests running at once per process; the rest wait in a priority queue
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+# Questions allowed to wait (more are answered "busy" at once), and the longest any request waits (seconds)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+# Queue depth, as a share of ADMISSION_QUEUE_SIZE, from which admitted questions skip
+# the LLM judge, and from which they get retrieval-only answers (no LLM at all)
+ADMISSION_SKIP_JUDGE_AT = float(os.getenv("ADMISSION_SKIP_JUDGE_AT", "0.25"))
+ADMISSION_RETRIEVAL_ONLY_AT = float(os.getenv("ADMISSION_RETRIEVAL_ONLY_AT", "0.5"))
+
+# Priorities, served lowest first; feedback writes and retries are never turned away for a full queue
+FEEDBACK, RETRY, QUESTION = 0, 1, 2
+PRIORITY_NAMES = {FEEDBACK: "feedback", RETRY: "retry", QUESTION: "question"}
+
+# Degradation levels, mildest first
+FULL, NO_JUDGE, RETRIEVAL_ONLY, BUSY = "full", "no_judge", "retrieval_only", "busy"
+LEVELS = (FULL, NO_JUDGE, RETRIEVAL_ONLY, BUSY)
+# Mildest level a retry can be pushed to: a user retrying after "busy" still gets a generated answer
+RETRY_MAX_LEVEL = NO_JUDGE
+
+ADMISSIONS = metrics.counter("rag_admission_requests_total",
+                             "Requests by priority and the degradation level they were served at (busy = shed)",
+                             ["priority", "level"])
+SHED = metrics.counter("rag_admission_shed_total", "Requests turned away, by reason (queue_full, timeout)",
+                       ["priority", "reason"])
+IN_FLIGHT = metrics.gauge("rag_admission_in_flight", "Admitted requests running")
+QUEUE_DEPTH = metrics.gauge("rag_admission_queue_depth", "Requests waiting for admission")
+DEGRADATION_LEVEL = metrics.gauge("rag_admission_degradation_level",
+                                  "Level a question admitted now would get (0 full, 1 no judge, 2 retrieval only)")
+
+class Overloaded(RuntimeError):
+    """The request was shed: the queue was full, or no slot freed up before the deadline"""
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "event", "granted", "level", "wake")
+
+    def __init__(self, priority: int, seq: int, wake: Optional[Callable[[], None]] = None):
+        self.priority = priority
+        self.seq = seq
+        self.event = threading.Event()
+        self.granted = False
+        self.level = FULL
+        # Called (from the releasing thread) when the slot is handed over; used by async waiters
+        self.wake = wake
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class Admission:
+    """An admitted request: the level to serve it at and how long it queued"""
+    __slots__ = ("priority", "level", "waited")
+
+    def __init__(self, priority: int, level: str, waited: float):
+        self.priority = priority
+        self.level = level
+        self.waited = waited
+
+class AdmissionController:
+    """
+    At most `max_concurrency` requests run; the rest wait, highest priority first
+
+    The queue depth when a request gets its slot decides how much work it
+    does: the full pipeline, no LLM judge past `skip_judge_at`, retrieval
+    only past `retrieval_only_at` (shares of `max_queue`), so a backlog
+    drains faster the longer it gets. Retries are never degraded beyond
+    no judge. Questions arriving to a full queue,
+    and any request still waiting after `timeout`, raise Overloaded, which
+    callers turn into a quick "busy" answer.
+    """
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, max_queue: int = ADMISSION_QUEUE_SIZE,
+                 timeout: float = ADMISSION_QUEUE_TIMEOUT, skip_judge_at: float = ADMISSION_SKIP_JUDGE_AT,
+                 retrieval_only_at: float = ADMISSION_RETRIEVAL_ONLY_AT, window: int = 200):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.skip_judge_at = skip_judge_at
+        self.retrieval_only_at = retrieval_only_at
+        self.inflight = 0
+        self.queue: list = []
+        self.seq = itertools.count()
+        self.waits = deque(maxlen=window)
+        self.counters = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def level(self) -> str:
+        """Level for a question admitted now (caller holds the lock)"""
+        depth = len(self.queue) / self.max_queue if self.max_queue > 0 else 0.0
+        if depth >= self.retrieval_only_at:
+            return RETRIEVAL_ONLY
+        if depth >= self.skip_judge_at:
+            return NO_JUDGE
+        return FULL
+
+    def _level_for(self, priority: int) -> str:
+        """Level for a request of this priority admitted now (caller holds the lock)"""
+        level = self.level()
+        if priority == RETRY and LEVELS.index(level) > LEVELS.index(RETRY_MAX_LEVEL):
+            return RETRY_MAX_LEVEL
+        return level
+
+    def _update_gauges(self):
+        """Publish the current state (caller holds the lock)"""
+        IN_FLIGHT.set(self.inflight)
+        QUEUE_DEPTH.set(len(self.queue))
+        DEGRADATION_LEVEL.set(LEVELS.index(self.level()))
+
+    def _shed(self, priority: int, reason: str, message: str) -> Overloaded:
+        """Count a shed request (caller holds the lock) and build its error"""
+        self.counters[f"shed_{reason}"] += 1
+        self.counters[BUSY] += 1
+        SHED.inc(priority=PRIORITY_NAMES[priority], reason=reason)
+        ADMISSIONS.inc(priority=PRIORITY_NAMES[priority], level=BUSY)
+        return Overloaded(message)
+
+    def _admitted(self, waiter: _Waiter, waited: float) -> Admission:
+        """Count an admission (caller holds the lock)"""
+        self.counters[waiter.level] += 1
+        self.waits.append(waited)
+        ADMISSIONS.inc(priority=PRIORITY_NAMES[waiter.priority], level=waiter.level)
+        return Admission(waiter.priority, waiter.level, waited)
+
+    def _admit_or_enqueue(self, waiter: _Waiter) -> Optional[Admission]:
+        """Take a free slot (the Admission) or join the queue (None); raises Overloaded"""
+        with self.lock:
+            if self.inflight < self.max_concurrency and not self.queue:
+                self.inflight += 1
+                waiter.level = self._level_for(waiter.priority)
+                self._update_gauges()
+                return self._admitted(waiter, 0.0)
+            if waiter.priority == QUESTION and len(self.queue) >= self.max_queue:
+                raise self._shed(waiter.priority, "queue_full", f"{len(self.queue)} requests already waiting")
+            heapq.heappush(self.queue, waiter)
+            self.counters["queued"] += 1
+            self._update_gauges()
+            return None
+
+    def _finish_wait(self, waiter: _Waiter, waited: float) -> Admission:
+        """Leave the queue after waiting: the Admission, or Overloaded on timeout"""
+        with self.lock:
+            if not waiter.granted:
+                self.queue.remove(waiter)
+                heapq.heapify(self.queue)
+                self._update_gauges()
+                raise self._shed(waiter.priority, "timeout", f"no slot after {waited:.1f}s")
+            return self._admitted(waiter, waited)
+
+    def _new_waiter(self, priority: int, wake: Optional[Callable[[], None]] = None) -> _Waiter:
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"Unknown priority: {priority}")
+        return _Waiter(priority, next(self.seq), wake)
+
+    def acquire(self, priority: int = QUESTION, timeout: Optional[float] = None) -> Admission:
+        """
+        Take a slot, waiting behind higher-priority and earlier requests
+
+        Returns:
+            The Admission, with the degradation level to serve the request at
+
+        Raises:
+            Overloaded: queue full (questions only, no wait) or no slot within the timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        waiter = self._new_waiter(priority)
+        admission = self._admit_or_enqueue(waiter)
+        if admission:
+            return admission
+
+        start_time = time.time()
+        waiter.event.wait(timeout)
+        return self._finish_wait(waiter, time.time() - start_time)
+
+    async def aacquire(self, priority: int = QUESTION, timeout: Optional[float] = None) -> Admission:
+        """acquire() for coroutines: waits in the same queue without blocking the event loop"""
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+            except RuntimeError:
+                pass  # Loop already closed; nobody is waiting any more
+
+        waiter = self._new_waiter(priority, wake)
+        admission = self._admit_or_enqueue(waiter)
+        if admission:
+            return admission
+
+        start_time = time.time()
+        try:
+            await asyncio.wait_for(granted, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Give up our place, or the slot if it was handed over meanwhile
+            with self.lock:
+                handed_over = waiter.granted
+                if not handed_over:
+                    self.queue.remove(waiter)
+                    heapq.heapify(self.queue)
+                    self._update_gauges()
+            if handed_over:
+                self.release()
+            raise
+        return self._finish_wait(waiter, time.time() - start_time)
+
+    def release(self):
+        """Free a slot, handing it to the highest-priority waiter"""
+        with self.lock:
+            if self.queue:
+                waiter = heapq.heappop(self.queue)
+                waiter.level = self._level_for(waiter.priority)
+                waiter.granted = True
+                waiter.event.set()
+                if waiter.wake:
+                    waiter.wake()
+            else:
+                self.inflight -= 1
+            self._update_gauges()
+
+    @contextmanager
+    def admit(self, priority: int = QUESTION) -> Iterator[Admission]:
+        """Hold a slot for the block; raises Overloaded when the request is shed"""
+        admission = self.acquire(priority)
+        try:
+            yield admission
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aadmit(self, priority: int = QUESTION) -> AsyncIterator[Admission]:
+        """admit() for coroutines"""
+        admission = await self.aacquire(priority)
+        try:
+            yield admission
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Slots in use, queue depth, current level, queue wait percentiles and counts per level"""
+        with self.lock:
+            waits = list(self.waits)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "inflight": self.inflight,
+                "queue_depth": len(self.queue),
+                "level": self.level(),
+                "p50_queue_wait": float(np.percentile(waits, 50)) if waits else None,
+                "p95_queue_wait": float(np.percentile(waits, 95)) if waits else None,
+                **self.counters,
+            }
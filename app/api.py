@@ -0,0 +1,329 @@
+# api.py - HTTP API for the RAG Pipeline (FastAPI, run with uvicorn)
+#
+#   uvicorn api:app --app-dir app --host 0.0.0.0 --port 8000 --workers 2
+#
+# Every worker process loads its own copy of the embedding model.
+import os
+import json
+import time
+import uuid
+import asyncio
+from functools import partial
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Union, Literal, Callable, AsyncIterator
+
+import asyncpg
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+import rag
+import limiter
+import metrics
+import tracing
+import resilience
+from tracing import span
+from admission import AdmissionController, Overloaded, QUESTION, RETRY, FEEDBACK, NO_JUDGE, RETRIEVAL_ONLY, BUSY
+from db import (asave_conversation, asave_feedback, close_async_pool, migrate_db, pool_stats,
+                get_feedback_stats, get_model_usage_stats)
+
+# Pipeline runs executing at once per worker (coroutines, not threads); further requests queue in
+# admission control (ADMISSION_QUEUE_SIZE etc.), which degrades and finally sheds them under load
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "64"))
+# Seconds a client told "busy" (HTTP 503) should wait before retrying
+API_RETRY_AFTER = int(os.getenv("API_RETRY_AFTER", "5"))
+API_BATCH_LIMIT = int(os.getenv("API_BATCH_LIMIT", "32"))
+DEFAULT_MODEL = os.getenv("API_DEFAULT_MODEL", "openai/gpt-3.5-turbo")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        # Newer columns and the spans table on databases created before them
+        await asyncio.to_thread(migrate_db)
+    except Exception as e:
+        print(f"⚠️  Database migration failed: {e}")
+    metrics.start_publisher()
+    yield
+    await close_async_pool()
+    tracing.flush()
+    metrics.stop_publisher()
+
+app = FastAPI(title="Brahman.ai API", description="Travel RAG assistant", lifespan=lifespan)
+admission_control = AdmissionController(API_MAX_CONCURRENCY)
+
+HTTP_REQUESTS = metrics.counter("rag_http_requests_total", "HTTP requests by route and status",
+                                ["method", "path", "status"])
+HTTP_SECONDS = metrics.histogram("rag_http_request_duration_seconds",
+                                 "HTTP request time (streams: until the response starts)", ["path"])
+HTTP_IN_FLIGHT = metrics.gauge("rag_http_requests_in_flight", "HTTP requests being handled")
+
+# Mirrors of the components' stats() (the /stats worker block), refreshed on every scrape
+DB_POOL = metrics.gauge("rag_db_pool_connections", "asyncpg pool connections (size, idle, max_size)", ["state"])
+CACHE_ENTRIES = metrics.gauge("rag_cache_entries", "Entries held by an in-process cache", ["cache"])
+# Every worker reports the same shared store; unset for Redis, which is not counted
+RETRIEVAL_CACHE_ENTRIES = metrics.gauge("rag_retrieval_cache_entries", "Entries in the shared retrieval cache store")
+LLM_IN_FLIGHT = metrics.gauge("rag_llm_in_flight", "LLM calls holding one of the model's slots", ["model"])
+LLM_QUEUE_DEPTH = metrics.gauge("rag_llm_queue_depth", "Requests waiting for one of the model's slots", ["model"])
+LLM_QUEUE_EVENTS = metrics.counter("rag_llm_queue_events_total",
+                                   "Model limiter admissions, queueing and rejections", ["model", "event"])
+PROVIDER_EVENTS = metrics.counter("rag_provider_events_total",
+                                  "Provider calls, failures, retries and short-circuits", ["provider", "event"])
+RETRY_SLEEP = metrics.counter("rag_provider_retry_sleep_seconds_total",
+                              "Seconds spent backing off before retrying a provider", ["provider"])
+BREAKER_STATE = metrics.gauge("rag_circuit_breaker_state", "0 closed, 1 half-open, 2 open", ["provider"])
+ROUTER_EVENTS = metrics.counter("rag_router_events_total", "Router hedges and fallbacks per model",
+                                ["model", "event"])
+SINGLEFLIGHT_EVENTS = metrics.counter("rag_singleflight_events_total", "Leader and coalesced pipeline runs",
+                                      ["event"])
+SINGLEFLIGHT_IN_FLIGHT = metrics.gauge("rag_singleflight_in_flight", "Pipeline runs shared right now")
+RERANKER_EVENTS = metrics.counter("rag_reranker_events_total", "Reranks, budget skips and timeouts", ["event"])
+TRACE_EVENTS = metrics.counter("rag_trace_events_total", "Traces seen, exported and dropped", ["event"])
+TRACE_QUEUE_DEPTH = metrics.gauge("rag_trace_queue_depth", "Traces waiting for the exporter")
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def _set_events(metric: metrics.Counter, counts: Dict[str, Any], events: List[str], **labels):
+    for event in events:
+        if counts.get(event) is not None:
+            metric.set(counts[event], event=event, **labels)
+
+def collect_worker_stats():
+    """Copy this worker's component stats into the gauges and counters above"""
+    DB_POOL.clear()
+    for state, value in (pool_stats() or {}).items():
+        if state != "min_size":
+            DB_POOL.set(value, state=state)
+
+    CACHE_ENTRIES.set(len(rag._relevance_cache), cache="relevance")
+    if rag.retrieval_cache:
+        entries = rag.retrieval_cache.stats()["entries"]
+        if entries is not None:
+            RETRIEVAL_CACHE_ENTRIES.set(entries)
+
+    for model, queue in limiter.stats().items():
+        LLM_IN_FLIGHT.set(queue["inflight"], model=model)
+        LLM_QUEUE_DEPTH.set(queue["queue_depth"], model=model)
+        _set_events(LLM_QUEUE_EVENTS, queue, ["admitted", "queued", "rejected_queue_full", "rejected_timeout"],
+                    model=model)
+
+    for provider, counts in resilience.stats().items():
+        BREAKER_STATE.set(BREAKER_STATES.get(counts["breaker_state"], 0), provider=provider)
+        _set_events(PROVIDER_EVENTS, counts, ["calls", "failures", "retries", "short_circuited", "breaker_opens"],
+                    provider=provider)
+        if counts.get("retry_seconds") is not None:
+            RETRY_SLEEP.set(counts["retry_seconds"], provider=provider)
+
+    if rag.llm_router:
+        for model, counts in rag.llm_router.stats().items():
+            _set_events(ROUTER_EVENTS, counts,
+                        ["calls", "errors", "hedges", "fallbacks", "abandoned", "abandoned_completed"],
+                        model=model)
+
+    flight = rag.answer_flight.stats()
+    SINGLEFLIGHT_IN_FLIGHT.set(flight["in_flight"])
+    _set_events(SINGLEFLIGHT_EVENTS, flight, ["leaders", "coalesced", "errors"])
+
+    if rag.reranker:
+        _set_events(RERANKER_EVENTS, rag.reranker.stats(),
+                    ["reranked", "skipped_over_budget", "truncated_pools", "timeouts"])
+
+    trace_stats = tracing.stats()
+    TRACE_QUEUE_DEPTH.set(trace_stats["queue_depth"])
+    _set_events(TRACE_EVENTS, trace_stats, ["traces", "exported_traces", "dropped_traces", "export_errors"])
+
+metrics.register_collector(collect_worker_stats)
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    start_time = time.time()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Route template, not the raw URL, to keep the label set small
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+        HTTP_SECONDS.observe(time.time() - start_time, path=path)
+
+class AnswerRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    model: str = DEFAULT_MODEL
+    search_type: Literal["semantic", "hybrid"] = "semantic"
+    location: Optional[Union[str, List[str]]] = None
+    conversation_id: Optional[str] = None
+    save: bool = True
+    stream: bool = False
+    # A retry after a busy response; queued ahead of new questions
+    retry: bool = False
+
+class BatchRequest(BaseModel):
+    requests: List[AnswerRequest] = Field(..., min_length=1)
+
+class FeedbackRequest(BaseModel):
+    conversation_id: str
+    feedback: Literal[1, -1]
+
+async def run_blocking(fn: Callable, *args) -> Any:
+    """Run blocking database code on a worker thread"""
+    return await asyncio.to_thread(partial(fn, *args))
+
+def busy_error(error: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Busy, please retry shortly ({error})",
+                         headers={"Retry-After": str(API_RETRY_AFTER)})
+
+async def answer_at_level(request: AnswerRequest, level: str) -> Dict[str, Any]:
+    """The answer at an admission degradation level: full, without the LLM judge, or retrieval only"""
+    if level == RETRIEVAL_ONLY:
+        return await rag.aget_retrieval_answer(request.question, request.search_type, request.location)
+    return await rag.aget_answer(request.question, request.model, request.search_type, request.location,
+                                 skip_judge=level == NO_JUDGE)
+
+async def answer_and_save(request: AnswerRequest) -> Dict[str, Any]:
+    """
+    aget_answer, then asave_conversation under the request's (or a new) conversation id
+
+    Raises:
+        HTTPException: 503 with Retry-After when admission control sheds the request
+    """
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    with span("question", question=request.question, model=request.model, search_type=request.search_type,
+              conversation_id=conversation_id, retry=request.retry) as root:
+        try:
+            async with admission_control.aadmit(RETRY if request.retry else QUESTION) as admission:
+                root.set(degradation=admission.level)
+                answer_data = await answer_at_level(request, admission.level)
+                if request.save:
+                    await asave_conversation(conversation_id, request.question, answer_data)
+        except Overloaded as e:
+            root.set(degradation=BUSY)
+            raise busy_error(e)
+    return {"conversation_id": conversation_id, "trace_id": root.trace_id, "degradation": admission.level,
+            **answer_data}
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_events(request: AnswerRequest) -> AsyncIterator[str]:
+    """
+    SSE body: token events while the LLM generates, then one done event with the metadata
+
+    A retrieval-only answer comes as a single token event; a shed request
+    gets a busy event (with retry_after) instead of tokens.
+    """
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    with span("question", question=request.question, model=request.model, search_type=request.search_type,
+              conversation_id=conversation_id, stream=True, retry=request.retry) as root:
+        yield sse_event("start", {"conversation_id": conversation_id, "trace_id": root.trace_id})
+        try:
+            async with admission_control.aadmit(RETRY if request.retry else QUESTION) as admission:
+                root.set(degradation=admission.level)
+                if admission.level == RETRIEVAL_ONLY:
+                    answer_data = await answer_at_level(request, admission.level)
+                    events = iter([("token", answer_data["answer"]), ("done", answer_data)])
+                else:
+                    events = rag.astream_answer(request.question, request.model, request.search_type,
+                                                request.location, skip_judge=admission.level == NO_JUDGE)
+                async for event, data in _as_async(events):
+                    if event == "done":
+                        # The client gets the done event while the conversation is written
+                        write = asyncio.create_task(asave_conversation(conversation_id, request.question, data)) \
+                            if request.save else None
+                        yield sse_event(event, {"conversation_id": conversation_id, "degradation": admission.level,
+                                                **data})
+                        if write:
+                            await write
+                    else:
+                        yield sse_event(event, data)
+        except Overloaded as e:
+            root.set(degradation=BUSY)
+            yield sse_event("busy", {"detail": str(e), "retry_after": API_RETRY_AFTER})
+
+async def _as_async(events) -> AsyncIterator:
+    """Iterate a plain or async iterator of events asynchronously"""
+    if hasattr(events, "__aiter__"):
+        async for event in events:
+            yield event
+    else:
+        for event in events:
+            yield event
+
+@app.post("/answer")
+async def answer(request: AnswerRequest):
+    """
+    Answer a question
+
+    With "stream": true the response is text/event-stream: a start event
+    with the conversation id, token events, then a done event carrying
+    the same fields as the non-streaming response.
+
+    Under load the answer may skip the LLM judge or list the retrieved
+    passages instead ("degradation" says which); when the request is shed
+    the response is 503 with Retry-After (a busy event when streaming).
+    Set "retry": true when retrying after that to be served first.
+    """
+    if request.stream:
+        return StreamingResponse(stream_events(request), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return await answer_and_save(request)
+
+@app.post("/answer/batch")
+async def answer_batch(batch: BatchRequest):
+    """Answer several questions concurrently (their database writes too); results keep the request order"""
+    if len(batch.requests) > API_BATCH_LIMIT:
+        raise HTTPException(status_code=413, detail=f"At most {API_BATCH_LIMIT} questions per batch")
+    results = await asyncio.gather(
+        *(answer_and_save(request) for request in batch.requests), return_exceptions=True
+    )
+    return [
+        {"error": str(result)} if isinstance(result, Exception) else result
+        for result in results
+    ]
+
+@app.post("/feedback")
+async def feedback(request: FeedbackRequest):
+    """Record thumbs up (1) or down (-1) for a saved conversation (queued ahead of questions)"""
+    try:
+        async with admission_control.aadmit(FEEDBACK):
+            await asave_feedback(request.conversation_id, request.feedback)
+    except asyncpg.ForeignKeyViolationError:
+        raise HTTPException(status_code=404, detail=f"Unknown conversation: {request.conversation_id}")
+    except Overloaded as e:
+        raise busy_error(e)
+    return {"status": "ok"}
+
+@app.get("/stats")
+async def stats():
+    """Feedback and 24h model usage from Postgres, plus this worker's in-process counters"""
+    feedback_stats, model_usage = await asyncio.gather(
+        run_blocking(get_feedback_stats), run_blocking(get_model_usage_stats)
+    )
+    return {
+        "feedback": feedback_stats,
+        "model_usage": [dict(row) for row in model_usage],
+        "worker": {
+            "pid": os.getpid(),
+            "admission": admission_control.stats(),
+            "providers": resilience.stats(),
+            "llm_queues": limiter.stats(),
+            "router": rag.llm_router.stats() if rag.llm_router else None,
+            "reranker": rag.reranker.stats() if rag.reranker else None,
+            "singleflight": rag.answer_flight.stats(),
+            "retrieval_cache": rag.retrieval_cache.stats() if rag.retrieval_cache else None,
+            "tracing": tracing.stats(),
+        },
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (all workers' metrics when METRICS_DIR is shared)"""
+    body = await asyncio.to_thread(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
@@ -1,19 +1,95 @@
 # app.py - Enhanced UI with Custom Submit Button
+import os
 import streamlit as st
 import time
 import uuid
-from rag import get_answer
+import requests
 from db import (
     save_conversation,
     save_feedback,
     get_recent_conversations,
     get_feedback_stats,
-    get_model_usage_stats
+    get_model_usage_stats,
+    migrate_db
 )
 
+# When set, questions and feedback go through the HTTP API (api.py) instead of running in-process
+API_URL = os.getenv("API_URL", "").rstrip("/")
+
 def print_log(message):
     """Print log message"""
     print(message, flush=True)
+
+@st.cache_resource
+def get_admission_controller():
+    """One admission controller shared by every Streamlit session in this process"""
+    from admission import AdmissionController
+    return AdmissionController()
+
+def fetch_answer(conversation_id, question, model_choice, search_type, retry=False):
+    """
+    Answer a question and save the conversation, via the API when API_URL is set
+
+    Returns:
+        The answer data (with the "degradation" level it was served at), or None when busy
+    """
+    if API_URL:
+        response = requests.post(f"{API_URL}/answer", json={
+            "question": question,
+            "model": model_choice,
+            "search_type": search_type,
+            "conversation_id": conversation_id,
+            "retry": retry,
+        }, timeout=180)
+        if response.status_code == 503:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    from rag import get_answer, get_retrieval_answer
+    from tracing import span
+    from admission import Overloaded, QUESTION, RETRY, NO_JUDGE, RETRIEVAL_ONLY, BUSY
+
+    with span("question", question=question, model=model_choice, search_type=search_type,
+              conversation_id=conversation_id, retry=retry) as root:
+        try:
+            with get_admission_controller().admit(RETRY if retry else QUESTION) as admission:
+                root.set(degradation=admission.level)
+                if admission.level == RETRIEVAL_ONLY:
+                    answer_data = get_retrieval_answer(question, search_type)
+                else:
+                    answer_data = get_answer(question, model_choice, search_type,
+                                             skip_judge=admission.level == NO_JUDGE)
+                save_conversation(conversation_id, question, answer_data)
+        except Overloaded as e:
+            root.set(degradation=BUSY)
+            print_log(f"Question shed by admission control: {e}")
+            return None
+    return {**answer_data, "degradation": admission.level}
+
+def send_feedback(conversation_id, feedback):
+    """
+    Save feedback, via the API when API_URL is set
+
+    Returns:
+        False when the app was too busy to save it
+    """
+    if API_URL:
+        response = requests.post(f"{API_URL}/feedback",
+                                 json={"conversation_id": conversation_id, "feedback": feedback}, timeout=30)
+        if response.status_code == 503:
+            return False
+        response.raise_for_status()
+        return True
+
+    from admission import Overloaded, FEEDBACK
+
+    try:
+        with get_admission_controller().admit(FEEDBACK):
+            save_feedback(conversation_id, feedback)
+    except Overloaded:
+        return False
+    return True
     
 def main():
     print_log("Starting the RAG Travel Assistant application")
@@ -138,6 +214,14 @@ def main():
     st.title("🌍 Brahman.ai - Your Smart Travel Assistant")
     st.markdown("Hi! I'm here to help you plan your next adventure. Ask me anything about travel destinations, tips, and more! ✈️🌴😎") 
 
+    # Bring an existing conversations table up to date (no-op when it already is)
+    if "db_migrated" not in st.session_state:
+        try:
+            migrate_db()
+        except Exception as e:
+            print_log(f"Database migration failed: {e}")
+        st.session_state.db_migrated = True
+
     # Session state initialization
     if "conversation_id" not in st.session_state:
         st.session_state.conversation_id = str(uuid.uuid4())
@@ -149,6 +233,9 @@ def main():
     if "current_answer_data" not in st.session_state:
         st.session_state.current_answer_data = None
 
+    if "busy_question" not in st.session_state:
+        st.session_state.busy_question = None
+
     # Sidebar configuration
     st.sidebar.header("Configuration")
     
@@ -201,6 +288,14 @@ def main():
             
             st.markdown('</div>', unsafe_allow_html=True)
 
+        # A question answered "busy" can be resubmitted; retries are queued ahead of new questions
+        busy_question = st.session_state.get("busy_question")
+        retry = False
+        if busy_question and not submitted:
+            st.warning("⏳ The assistant is busy right now, so your question was not answered.")
+            if st.button("🔁 Try again"):
+                user_input, submitted, retry = busy_question, True, True
+
         # Process form submission
         if submitted and user_input.strip():
             with st.spinner("Processing your question..."):
@@ -208,17 +303,22 @@ def main():
                 
                 print_log(f"Getting answer using {model_choice} model and {search_type} search")
                 start_time = time.time()
-                answer_data = get_answer(user_input, model_choice, search_type)
+                # FIXED: Save conversation using the same conversation_id
+                answer_data = fetch_answer(st.session_state.conversation_id, user_input, model_choice, search_type,
+                                           retry=retry)
                 end_time = time.time()
                 
+                if answer_data is None:
+                    print_log(f"Busy after {end_time - start_time:.2f} seconds; question not answered")
+                    st.session_state.busy_question = user_input
+                    st.session_state.current_answer_data = None
+                    st.rerun()
+
                 print_log(f"Answer received in {end_time - start_time:.2f} seconds")
-                
-                # FIXED: Save conversation using the same conversation_id
-                print_log(f"Saving conversation with ID: {st.session_state.conversation_id}")
-                save_conversation(st.session_state.conversation_id, user_input, answer_data)
-                print_log("Conversation saved successfully")
+                print_log(f"Conversation saved with ID: {st.session_state.conversation_id}")
                 
                 # Store in session state for feedback functionality
+                st.session_state.busy_question = None
                 st.session_state.current_answer_data = answer_data
 
         elif submitted and not user_input.strip():
@@ -230,6 +330,9 @@ def main():
             
             # Display answer
             st.success("✅ Answer Generated!")
+            if answer_data.get("degradation") == "retrieval_only":
+                st.info("⏳ The assistant is under heavy load, so these are the most relevant passages found "
+                        "rather than a generated answer.")
             st.markdown("### Answer:")
             st.write(answer_data["answer"])
 
@@ -240,10 +343,17 @@ def main():
                 with col_meta1:
                     st.metric("Response Time", f"{answer_data['response_time']:.2f}s")
                     st.metric("Relevance", answer_data['relevance'])
+                    st.caption(f"Evaluated by: {answer_data.get('relevance_method', 'llm')}")
+                    if answer_data.get("degradation") == "no_judge":
+                        st.caption("⏳ Relevance not checked by the LLM judge (heavy load)")
+                    if answer_data.get("coalesced"):
+                        st.caption("⚡ Shared with an identical question asked at the same time")
                     st.metric("Model Used", answer_data['model_used'])
                 
                 with col_meta2:
                     st.metric("Total Tokens", answer_data['total_tokens'])
+                    if answer_data.get("cached_tokens"):
+                        st.metric("Cached Prompt Tokens", answer_data['cached_tokens'])
                     st.metric("Search Results", answer_data['search_results_count'])
                     if answer_data["openai_cost"] > 0:
                         st.metric("OpenAI Cost", f"${answer_data['openai_cost']:.4f}")
@@ -259,10 +369,12 @@ def main():
                 if st.button("👍 Helpful", key="thumbs_up"):
                     if not st.session_state.feedback_given:
                         # FIXED: Use the same conversation_id
-                        save_feedback(st.session_state.conversation_id, 1)
-                        st.session_state.feedback_given = True
-                        st.success("Thank you for your feedback! 🙏")
-                        print_log(f"Positive feedback saved for conversation: {st.session_state.conversation_id}")
+                        if send_feedback(st.session_state.conversation_id, 1):
+                            st.session_state.feedback_given = True
+                            st.success("Thank you for your feedback! 🙏")
+                            print_log(f"Positive feedback saved for conversation: {st.session_state.conversation_id}")
+                        else:
+                            st.warning("Too busy to save your feedback right now, please try again.")
                     else:
                         st.info("Feedback already recorded for this conversation.")
             
@@ -270,10 +382,12 @@ def main():
                 if st.button("👎 Not Helpful", key="thumbs_down"):
                     if not st.session_state.feedback_given:
                         # FIXED: Use the same conversation_id
-                        save_feedback(st.session_state.conversation_id, -1)
-                        st.session_state.feedback_given = True
-                        st.error("Thank you for your feedback. We'll try to improve! 🙏")
-                        print_log(f"Negative feedback saved for conversation: {st.session_state.conversation_id}")
+                        if send_feedback(st.session_state.conversation_id, -1):
+                            st.session_state.feedback_given = True
+                            st.error("Thank you for your feedback. We'll try to improve! 🙏")
+                            print_log(f"Negative feedback saved for conversation: {st.session_state.conversation_id}")
+                        else:
+                            st.warning("Too busy to save your feedback right now, please try again.")
                     else:
                         st.info("Feedback already recorded for this conversation.")
 
@@ -282,6 +396,7 @@ def main():
             st.session_state.conversation_id = str(uuid.uuid4())
             st.session_state.feedback_given = False
             st.session_state.current_answer_data = None
+            st.session_state.busy_question = None
             print_log(f"New conversation started with ID: {st.session_state.conversation_id}")
             st.rerun()
 
@@ -0,0 +1,230 @@
+# benchmark.py - Performance Regression Gate against a Stored Baseline
+import os
+import sys
+import json
+import time
+import fnmatch
+import platform
+import resource
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(os.getenv("BENCHMARK_BASELINE", PROJECT_ROOT / "benchmarks" / "baseline.json"))
+RESULTS_DIR = PROJECT_ROOT / "results"
+
+BASELINE_SCHEMA = 1
+
+# Allowed drift per metric pattern (first match wins): "higher"/"lower" is the
+# better direction; the allowance is the larger of the absolute and relative slack
+DEFAULT_TOLERANCES = {
+    "retrieval.*": {"direction": "higher", "abs": 0.01, "rel": 0.0},
+    "pipeline.error_rate": {"direction": "lower", "abs": 0.01, "rel": 0.0},
+    "latency.*": {"direction": "lower", "abs": 5.0, "rel": 0.25},
+    "indexing.*": {"direction": "higher", "abs": 0.0, "rel": 0.25},
+    "memory.*": {"direction": "lower", "abs": 50.0, "rel": 0.20},
+}
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, if available"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure_indexing(offline: bool) -> Dict[str, float]:
+    """
+    Index the processed documents and time it
+
+    Offline, this fills the in-memory travel-docs collection used by the
+    rest of the run; otherwise a scratch collection is created and dropped.
+    """
+    import rag
+    import standins
+    from setup import setup_qdrant, load_documents, index_documents
+
+    if offline:
+        start_time = time.time()
+        count = standins.index_local_qdrant()
+        elapsed = time.time() - start_time
+    else:
+        collection_name = "benchmark-indexing"
+        documents = load_documents()
+        setup_qdrant(rag.qdrant_client, collection_name)
+        start_time = time.time()
+        index_documents(rag.qdrant_client, collection_name, documents)
+        elapsed = time.time() - start_time
+        count = len(documents)
+        rag.qdrant_client.delete_collection(collection_name)
+    return {"indexing.docs_per_sec": count / elapsed if elapsed > 0 else 0.0}
+
+def measure_retrieval(search_types: List[str], sample: int) -> Dict[str, float]:
+    """Hit rate and MRR per search type on the first `sample` ground-truth questions"""
+    from retrieval_eval import load_ground_truth, run_searches, relevance_matrix, compute_metrics
+
+    ground_truth = load_ground_truth(sample=sample)
+    metrics = {}
+    for search_type in search_types:
+        results, _ = run_searches(ground_truth["question"].tolist(), search_type)
+        scores = compute_metrics(relevance_matrix(ground_truth["id"].tolist(), results, 5))
+        metrics[f"retrieval.{search_type}.hit_rate"] = scores["hit_rate"]
+        metrics[f"retrieval.{search_type}.mrr"] = scores["mrr"]
+    return metrics
+
+def measure_pipeline(requests: int, concurrency: int, model_choice: str, search_type: str) -> Dict[str, float]:
+    """Per-stage latency percentiles and error rate of get_answer under load"""
+    from loadtest import load_questions, run_request, run_closed_loop, summarize
+
+    kwargs = {"model_choice": model_choice, "search_type": search_type, "target": "rag"}
+    questions = load_questions(requests + 1)
+    run_request(questions[0], **kwargs)  # warm-up
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.time()
+    records = run_closed_loop(questions[1:], concurrency, **kwargs)
+    summary = summarize(records, time.time() - start_time, usage_before,
+                        resource.getrusage(resource.RUSAGE_SELF), 0)
+
+    metrics = {"pipeline.error_rate": summary["error_rate"]}
+    for stage, stats in summary["latency_ms"].items():
+        metrics[f"latency.{stage}.p50_ms"] = stats["p50"]
+        metrics[f"latency.{stage}.p95_ms"] = stats["p95"]
+    return metrics
+
+def tolerance_for(metric: str, tolerances: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    for pattern, tolerance in tolerances.items():
+        if fnmatch.fnmatch(metric, pattern):
+            return tolerance
+    return None
+
+def compare(baseline: Dict[str, float], current: Dict[str, float],
+            tolerances: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Compare current metrics with the baseline
+
+    Returns:
+        One row per metric with status "ok", "regression", "improved", "new" or "missing"
+    """
+    rows = []
+    for metric in sorted(set(baseline) | set(current)):
+        row = {"metric": metric, "baseline": baseline.get(metric), "current": current.get(metric)}
+        tolerance = tolerance_for(metric, tolerances)
+        if row["baseline"] is None:
+            row["status"] = "new"
+        elif row["current"] is None:
+            row["status"] = "missing"
+        elif tolerance is None:
+            row["status"] = "ok"
+        else:
+            slack = max(tolerance.get("abs", 0.0), tolerance.get("rel", 0.0) * abs(row["baseline"]))
+            delta = row["current"] - row["baseline"]
+            if tolerance["direction"] == "lower":
+                delta = -delta
+            row["allowed"] = slack
+            row["status"] = "regression" if delta < -slack else "improved" if delta > slack else "ok"
+        rows.append(row)
+    return rows
+
+def run_benchmarks(args) -> Dict[str, float]:
+    """Collect every gated metric"""
+    metrics = {}
+    print("📦 Indexing...")
+    metrics.update(measure_indexing(args.offline))
+    print("🔎 Retrieval quality...")
+    metrics.update(measure_retrieval(args.search_types, args.sample))
+    print(f"⏱️  Pipeline latency ({args.requests} requests, {args.concurrency} users)...")
+    metrics.update(measure_pipeline(args.requests, args.concurrency, args.model, args.search_types[0]))
+    metrics["memory.peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline and gate on regressions")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--offline", action="store_true", help="Use the stand-in LLM and an in-memory Qdrant")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stand-in LLM latency (offline)")
+    parser.add_argument("--sample", type=int, default=200, help="Ground-truth questions for retrieval metrics")
+    parser.add_argument("--requests", type=int, default=40, help="Pipeline requests for latency metrics")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model", default="openai/gpt-4o-mini")
+    parser.add_argument("--search-types", nargs="+", default=["semantic", "hybrid"], choices=["semantic", "hybrid"])
+    parser.add_argument("--tolerance", action="append", default=[], metavar="PATTERN=REL",
+                        help='Override the relative tolerance for a metric pattern, e.g. "latency.*=0.5"')
+    parser.add_argument("--retrieval-cache", action="store_true",
+                        help="Serve repeated searches from the retrieval cache (off so searches are measured)")
+    args = parser.parse_args()
+
+    if not args.retrieval_cache:
+        # Cache hits would stand in for the Qdrant searches being measured; set before
+        # anything imports rag (use_offline_services() requires that too)
+        os.environ["RETRIEVAL_CACHE"] = "off"
+
+    if args.offline:
+        import standins
+
+        # Fixed stand-in latency keeps offline runs comparable
+        standins.use_offline_services(latency=args.llm_latency, jitter=0.0, error_rate=0.0)
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    tolerances = dict((baseline or {}).get("tolerances", DEFAULT_TOLERANCES))
+    for override in args.tolerance:
+        pattern, value = override.split("=", 1)
+        # Overrides go first so they win over the broader default patterns
+        override = {**(tolerance_for(pattern, tolerances) or {"direction": "lower"}), "rel": float(value)}
+        tolerances = {pattern: override, **{k: v for k, v in tolerances.items() if k != pattern}}
+
+    metrics = run_benchmarks(args)
+    run = {
+        "schema": BASELINE_SCHEMA,
+        "git_commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "offline": args.offline,
+        "retrieval_cache": args.retrieval_cache,
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpus": os.cpu_count(), "model": args.model},
+        "metrics": metrics,
+    }
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    run_path = RESULTS_DIR / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    run_path.write_text(json.dumps(run, indent=2))
+
+    if args.update_baseline:
+        run["version"] = (baseline or {}).get("version", 0) + 1
+        run["tolerances"] = tolerances
+        baseline_path.parent.mkdir(exist_ok=True)
+        baseline_path.write_text(json.dumps(run, indent=2) + "\n")
+        print(f"✅ Baseline v{run['version']} written to {baseline_path}")
+        return
+
+    if baseline is None:
+        print(f"❌ No baseline at {baseline_path}; run with --update-baseline first")
+        sys.exit(2)
+    if baseline.get("offline") != args.offline:
+        print("⚠️  Baseline and this run differ in --offline; latency comparisons are not meaningful")
+    if baseline.get("retrieval_cache", False) != args.retrieval_cache:
+        print("⚠️  Baseline and this run differ in --retrieval-cache; search latencies are not comparable")
+
+    rows = compare(baseline["metrics"], metrics, tolerances)
+    print(f"\n📊 Against baseline v{baseline.get('version')} ({baseline.get('git_commit')}, {baseline.get('timestamp')}):")
+    icons = {"ok": "✅", "improved": "🚀", "regression": "❌", "new": "🆕", "missing": "⚠️ "}
+    for row in rows:
+        baseline_value = "-" if row["baseline"] is None else f"{row['baseline']:.4f}"
+        current_value = "-" if row["current"] is None else f"{row['current']:.4f}"
+        print(f"   {icons[row['status']]} {row['metric']:<32} {baseline_value:>12} -> {current_value:>12}")
+
+    regressions = [row for row in rows if row["status"] == "regression"]
+    print(f"\n   Run saved to: {run_path}")
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(row['metric'] for row in regressions)}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+if __name__ == "__main__":
+    main()
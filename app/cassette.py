@@ -0,0 +1,164 @@
+# cassette.py - Record/Replay Store for LLM Calls
+import os
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# off: call the LLM; record: call the LLM and store the result; replay: serve stored results only
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = Path(os.getenv("LLM_CASSETTE_PATH", PROJECT_ROOT / "data" / "cassettes" / "llm_calls.db"))
+# Sleep for the recorded latency when replaying (scaled, 0 disables)
+CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "0"))
+
+MODES = ("off", "record", "replay")
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a (model, prompt) pair was never recorded"""
+
+def prompt_hash(prompt: str) -> str:
+    """SHA-256 of the prompt text"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+class Cassette:
+    """
+    SQLite store of LLM calls keyed by (model, prompt hash)
+
+    Prompts and answers are zlib-compressed; token usage and the observed
+    latency are kept alongside so replayed runs report the same costs.
+    """
+
+    def __init__(self, path: Path = CASSETTE_PATH, mode: str = CASSETTE_MODE,
+                 latency_scale: float = CASSETTE_LATENCY_SCALE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode} (choose from {', '.join(MODES)})")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by worker threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                prompt BLOB NOT NULL,
+                answer BLOB NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                total_tokens INTEGER NOT NULL,
+                cached_tokens INTEGER NOT NULL DEFAULT 0,
+                latency REAL NOT NULL,
+                recorded_at TEXT NOT NULL,
+                PRIMARY KEY (model, prompt_hash)
+            ) WITHOUT ROWID
+        """)
+        # Cassettes recorded before cached-token accounting lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_calls)")}
+        if "cached_tokens" not in columns:
+            self._conn.execute("ALTER TABLE llm_calls ADD COLUMN cached_tokens INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["Cassette"]:
+        """Cassette configured from LLM_CASSETTE_* variables, or None when mode is off"""
+        return None if CASSETTE_MODE == "off" else cls()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def lookup(self, model: str, prompt: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a recorded call
+
+        Returns:
+            Dictionary with answer, tokens and latency, or None if not recorded
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT answer, prompt_tokens, completion_tokens, total_tokens, cached_tokens, latency
+                   FROM llm_calls WHERE model = ? AND prompt_hash = ?""",
+                (model, prompt_hash(prompt)),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "answer": zlib.decompress(row[0]).decode("utf-8"),
+            "tokens": {"prompt_tokens": row[1], "completion_tokens": row[2], "total_tokens": row[3],
+                       "cached_tokens": row[4]},
+            "latency": row[5],
+        }
+
+    def replay(self, model: str, prompt: str) -> Dict[str, Any]:
+        """Recorded call for (model, prompt); raises CassetteMiss if there is none"""
+        recorded = self.lookup(model, prompt)
+        if recorded is None:
+            raise CassetteMiss(f"No recorded {model} call for prompt {prompt_hash(prompt)[:12]}")
+        return recorded
+
+    def record(self, model: str, prompt: str, answer: str, tokens: Dict[str, int], latency: float) -> None:
+        """Store (or overwrite) a call"""
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO llm_calls
+                   (model, prompt_hash, prompt, answer, prompt_tokens, completion_tokens,
+                    total_tokens, cached_tokens, latency, recorded_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    model,
+                    prompt_hash(prompt),
+                    zlib.compress(prompt.encode("utf-8")),
+                    zlib.compress(answer.encode("utf-8")),
+                    tokens["prompt_tokens"],
+                    tokens["completion_tokens"],
+                    tokens["total_tokens"],
+                    tokens.get("cached_tokens", 0),
+                    latency,
+                    datetime.now().isoformat(),
+                ),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Recorded calls, mean latency and total tokens per model"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT model, COUNT(*), AVG(latency), SUM(total_tokens)
+                   FROM llm_calls GROUP BY model ORDER BY model"""
+            ).fetchall()
+        return {
+            model: {"calls": count, "avg_latency": avg_latency, "total_tokens": total_tokens}
+            for model, count, avg_latency, total_tokens in rows
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the LLM cassette")
+    parser.add_argument("command", choices=["stats"])
+    parser.add_argument("--path", default=str(CASSETTE_PATH))
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        cassette = Cassette(Path(args.path), mode="replay")
+        stats = cassette.stats()
+        print(f"📼 {args.path} ({Path(args.path).stat().st_size / 1e6:.2f} MB)")
+        for model, row in stats.items():
+            print(f"   {model}: {row['calls']} calls, avg latency {row['avg_latency']:.2f}s, "
+                  f"{row['total_tokens']} tokens")
+        if not stats:
+            print("   (empty)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# chunking.py - Pluggable Chunking Stage and Chunking Benchmark
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PROCESSED_DIR = Path(os.getenv("PROCESSED_DIR", PROJECT_ROOT / "data" / "processed"))
+RESULTS_DIR = PROJECT_ROOT / "results"
+
+DEFAULT_CHUNKER = os.getenv("CHUNKER", "langchain")
+
+def generate_document_id(location: str, doc_id: str, content: str) -> str:
+    """Stable chunk ID (same scheme as notebooks/2_ground_truth_data.ipynb)"""
+    combined = f"{location}-{doc_id}-{content[:20]}"
+    return hashlib.md5(combined.encode()).hexdigest()[:8]
+
+class Chunker:
+    """Base chunker: turns one PDF's markdown into setup.py documents"""
+
+    name = "base"
+
+    def split(self, markdown: str) -> List[List[str]]:
+        """Split markdown into sections, each a list of chunk texts"""
+        raise NotImplementedError
+
+    def chunk(self, pdf_name: str, markdown: str) -> List[Dict[str, Any]]:
+        """
+        Chunk a PDF's markdown
+
+        Args:
+            pdf_name: Source PDF file name
+            markdown: Markdown text of the PDF
+
+        Returns:
+            List of documents (location, doc_id, content, id)
+        """
+        location = pdf_name.rsplit(".", 1)[0]
+        documents = []
+        for section in self.split(markdown):
+            for i, text in enumerate(section):
+                # Part number restarts per section, as in notebook 1
+                doc_id = hashlib.md5(f"{pdf_name}_part_{i}".encode()).hexdigest()[:10]
+                documents.append({
+                    "location": location,
+                    "doc_id": doc_id,
+                    "content": text,
+                    "id": generate_document_id(location, doc_id, text),
+                })
+        return documents
+
+class LangChainChunker(Chunker):
+    """Markdown header split + RecursiveCharacterTextSplitter (notebook 1)"""
+
+    name = "langchain"
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 100):
+        from langchain_text_splitters import (
+            MarkdownHeaderTextSplitter,
+            RecursiveCharacterTextSplitter,
+        )
+
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        self.markdown_splitter = MarkdownHeaderTextSplitter(
+            headers_to_split_on=[("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3")]
+        )
+
+    def split(self, markdown: str) -> List[List[str]]:
+        return [
+            self.text_splitter.split_text(split.page_content)
+            for split in self.markdown_splitter.split_text(markdown)
+        ]
+
+class ChonkieChunker(Chunker):
+    """chonkie RecursiveChunker with the markdown recipe (transformers/chunks.ipynb)"""
+
+    name = "chonkie"
+
+    def __init__(self):
+        from chonkie import RecursiveChunker
+
+        self.chunker = RecursiveChunker.from_recipe("markdown", lang="en")
+
+    def split(self, markdown: str) -> List[List[str]]:
+        return [[chunk.text for chunk in self.chunker(markdown)]]
+
+CHUNKERS = {
+    LangChainChunker.name: LangChainChunker,
+    ChonkieChunker.name: ChonkieChunker,
+}
+
+def get_chunker(name: str = DEFAULT_CHUNKER) -> Chunker:
+    """Instantiate a chunker by name"""
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {name} (choose from {', '.join(CHUNKERS)})")
+    return CHUNKERS[name]()
+
+# Chunker instance, created once per worker process
+_worker_chunker = None
+
+def _init_worker(name: str):
+    global _worker_chunker
+    _worker_chunker = get_chunker(name)
+
+def _chunk_source(source: Tuple[str, str]) -> List[Dict[str, Any]]:
+    return _worker_chunker.chunk(*source)
+
+def chunk_documents(
+    sources: List[Tuple[str, str]],
+    chunker_name: str = DEFAULT_CHUNKER,
+    workers: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Chunk a batch of (pdf_name, markdown) sources, optionally in parallel
+
+    Args:
+        sources: List of (pdf_name, markdown) tuples
+        chunker_name: Registered chunker name
+        workers: Number of worker processes (1 runs in-process)
+
+    Returns:
+        Flat list of documents, in source order
+    """
+    if workers <= 1:
+        chunker = get_chunker(chunker_name)
+        return [doc for source in sources for doc in chunker.chunk(*source)]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(chunker_name,)
+    ) as pool:
+        return [doc for docs in pool.map(_chunk_source, sources) for doc in docs]
+
+def load_markdown_sources() -> List[Tuple[str, str]]:
+    """
+    Load per-PDF markdown for benchmarking
+
+    Uses the ingest.py conversion cache when present, otherwise rebuilds
+    each PDF's text from the chunks in docs_processed.jsonl.
+    """
+    from ingest import RAW_DIR, CACHE_DIR, file_hash, list_pdf_files
+
+    sources = []
+    if RAW_DIR.exists() and CACHE_DIR.exists():
+        for pdf_path in list_pdf_files(RAW_DIR):
+            cache_path = CACHE_DIR / f"{file_hash(pdf_path)}.md"
+            if cache_path.exists():
+                sources.append((pdf_path.name, cache_path.read_text(encoding="utf-8")))
+    if sources:
+        return sources
+
+    parts = defaultdict(list)
+    with open(PROCESSED_DIR / "docs_processed.jsonl", "r", encoding="utf-8") as f:
+        for line in f:
+            doc = json.loads(line)
+            parts[doc["metadata"]["pdf_name"]].append(doc["content"])
+    return [(name, "\n\n".join(texts)) for name, texts in parts.items()]
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+def chunks_overlap(a: str, b: str, threshold: float = 0.5, min_words: int = 5) -> bool:
+    """Whether two chunks share enough words to count as the same passage"""
+    wa, wb = _words(a), _words(b)
+    if min(len(wa), len(wb)) < min_words:
+        return False
+    return len(wa & wb) / min(len(wa), len(wb)) >= threshold
+
+def length_stats(lengths: List[int]) -> Dict[str, float]:
+    """Summary of the chunk-length distribution (characters)"""
+    arr = np.asarray(lengths)
+    return {
+        "mean": float(arr.mean()),
+        "min": int(arr.min()),
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": int(arr.max()),
+    }
+
+def evaluate_chunks(documents: List[Dict], eval_limit: int, limit: int = 5) -> Dict[str, Any]:
+    """
+    Index chunks into an in-memory Qdrant and score retrieval on the ground truth
+
+    A retrieved chunk counts as relevant when it overlaps the text of the
+    ground-truth chunk, so chunkings with different boundaries stay comparable.
+    """
+    import pandas as pd
+    from qdrant_client import QdrantClient, models
+    from setup import setup_qdrant, index_documents
+    from retrieval_eval import compute_metrics
+
+    with open(PROCESSED_DIR / "documents-with-ids.json", "r", encoding="utf-8") as f:
+        gt_content = {d["id"]: d["content"] for d in json.load(f)}
+    ground_truth = pd.read_csv(PROCESSED_DIR / "ground-truth-retrieval.csv")
+    ground_truth = ground_truth[ground_truth["id"].isin(gt_content)].head(eval_limit)
+
+    client, collection_name = setup_qdrant(QdrantClient(":memory:"), "chunking-benchmark")
+    start_time = time.time()
+    index_documents(client, collection_name, documents)
+    index_time = time.time() - start_time
+
+    requests = [
+        models.QueryRequest(
+            query=models.Document(text=q, model="jinaai/jina-embeddings-v2-small-en"),
+            using="jina-small",
+            limit=limit,
+            with_payload=["content"],
+        )
+        for q in ground_truth["question"]
+    ]
+    responses = client.query_batch_points(collection_name=collection_name, requests=requests)
+
+    relevance = np.zeros((len(requests), limit), dtype=bool)
+    for row, (gt_id, response) in enumerate(zip(ground_truth["id"], responses)):
+        for rank, point in enumerate(response.points):
+            relevance[row, rank] = chunks_overlap(point.payload["content"], gt_content[gt_id])
+
+    metrics = compute_metrics(relevance, ks=(1, 3, limit))
+    metrics["index_time"] = index_time
+    return metrics
+
+def benchmark(chunker_names: List[str], workers: int, eval_limit: int) -> List[Dict[str, Any]]:
+    """
+    Compare chunkers on throughput, chunk lengths, index size and retrieval quality
+
+    Args:
+        chunker_names: Chunkers to compare
+        workers: Worker processes used for chunking
+        eval_limit: Number of ground-truth questions (0 skips retrieval evaluation)
+
+    Returns:
+        One result dictionary per chunker
+    """
+    sources = load_markdown_sources()
+    print(f"📄 Benchmarking on {len(sources)} PDF(s), {sum(len(m) for _, m in sources)} characters")
+
+    results = []
+    for name in chunker_names:
+        print(f"\n✂️  Chunker: {name}")
+        start_time = time.time()
+        documents = chunk_documents(sources, name, workers)
+        chunk_time = time.time() - start_time
+
+        lengths = [len(doc["content"]) for doc in documents]
+        result = {
+            "chunker": name,
+            "chunks": len(documents),
+            "chunk_time": chunk_time,
+            "chunks_per_sec": len(documents) / chunk_time if chunk_time > 0 else 0.0,
+            "length_chars": length_stats(lengths),
+            # Raw index footprint: payload text + 512-d float32 dense vectors
+            "index_bytes": sum(lengths) + len(documents) * 512 * 4,
+        }
+        if eval_limit > 0:
+            result["retrieval"] = evaluate_chunks(documents, eval_limit)
+        results.append(result)
+
+        print(f"   Chunks: {result['chunks']} ({result['chunks_per_sec']:.0f} chunks/sec)")
+        print(f"   Length p50/p90/max: {result['length_chars']['p50']:.0f}/"
+              f"{result['length_chars']['p90']:.0f}/{result['length_chars']['max']} chars")
+        print(f"   Index size: {result['index_bytes'] / 1e6:.2f} MB")
+        if "retrieval" in result:
+            print(f"   Hit Rate: {result['retrieval']['hit_rate']:.4f} | "
+                  f"MRR: {result['retrieval']['mrr']:.4f} | "
+                  f"Index time: {result['retrieval']['index_time']:.1f}s")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = RESULTS_DIR / f"chunking_benchmark_{timestamp}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to: {output_path}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunking stage utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench = subparsers.add_parser("benchmark", help="Compare chunkers on speed and retrieval quality")
+    bench.add_argument("--chunkers", nargs="+", default=list(CHUNKERS), choices=list(CHUNKERS))
+    bench.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    bench.add_argument("--eval-limit", type=int, default=200,
+                       help="Ground-truth questions to evaluate (0 to skip)")
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        benchmark(args.chunkers, args.workers, args.eval_limit)
+
+if __name__ == "__main__":
+    main()
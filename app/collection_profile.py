@@ -0,0 +1,258 @@
+# collection_profile.py - Declarative Qdrant Collection Profiles and Profile Benchmark
+import os
+import re
+import json
+import time
+import resource
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import yaml
+import numpy as np
+import requests
+from qdrant_client import QdrantClient, models
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PROFILE_PATH = Path(os.getenv("QDRANT_PROFILE_PATH", Path(__file__).with_name("collection_profiles.yaml")))
+PROFILE_NAME = os.getenv("QDRANT_PROFILE", "default")
+
+# Top-level settings that can be overridden from the environment
+ENV_OVERRIDES = {
+    "QDRANT_SHARD_NUMBER": ("shard_number", int),
+    "QDRANT_REPLICATION_FACTOR": ("replication_factor", int),
+    "QDRANT_ON_DISK_PAYLOAD": ("on_disk_payload", lambda v: v.lower() == "true"),
+}
+
+def load_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load a collection profile from collection_profiles.yaml
+
+    Args:
+        name: Profile name (defaults to QDRANT_PROFILE, then "default")
+
+    Returns:
+        Profile dictionary, with environment overrides applied
+    """
+    name = name or PROFILE_NAME
+    with open(PROFILE_PATH, "r", encoding="utf-8") as f:
+        profiles = yaml.safe_load(f)
+    if name not in profiles:
+        raise ValueError(f"Unknown Qdrant profile: {name} (choose from {', '.join(profiles)})")
+
+    profile = dict(profiles[name])
+    for env_var, (key, cast) in ENV_OVERRIDES.items():
+        if os.getenv(env_var):
+            profile[key] = cast(os.getenv(env_var))
+    profile["name"] = name
+    return profile
+
+def collection_params(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Translate a profile into create_collection() keyword arguments
+
+    Args:
+        profile: Profile dictionary from load_profile()
+
+    Returns:
+        Keyword arguments for QdrantClient.create_collection
+    """
+    hnsw = profile.get("hnsw") or {}
+    sparse = profile.get("sparse") or {}
+    optimizers = profile.get("optimizers") or {}
+    wal = profile.get("wal") or {}
+
+    params = {
+        "vectors_config": {
+            # Dense vector configuration for semantic search
+            "jina-small": models.VectorParams(
+                size=512,  # Jina embeddings v2 small dimension
+                distance=models.Distance.COSINE,
+                on_disk=hnsw.get("on_disk"),
+                hnsw_config=models.HnswConfigDiff(**hnsw) if hnsw else None,
+            ),
+        },
+        "sparse_vectors_config": {
+            # Sparse vector configuration for keyword search
+            "bm25": models.SparseVectorParams(
+                modifier=models.Modifier.IDF,
+                index=models.SparseIndexParams(**sparse) if sparse else None,
+            )
+        },
+        "optimizers_config": models.OptimizersConfigDiff(**optimizers) if optimizers else None,
+        "wal_config": models.WalConfigDiff(**wal) if wal else None,
+    }
+    for key in ("shard_number", "replication_factor", "write_consistency_factor", "on_disk_payload"):
+        if key in profile:
+            params[key] = profile[key]
+    return params
+
+def is_local_client(client: QdrantClient) -> bool:
+    """Whether the client runs Qdrant in-process (":memory:" / path), which ignores topology settings"""
+    return type(getattr(client, "_client", None)).__name__ == "QdrantLocal"
+
+def verify_collection(client: QdrantClient, collection_name: str, profile: Dict[str, Any]) -> List[str]:
+    """
+    Compare a live collection's configuration with its profile
+
+    Args:
+        client: Qdrant client
+        collection_name: Collection to check
+        profile: Expected profile
+
+    Returns:
+        List of human-readable mismatches (empty when the collection matches)
+    """
+    config = client.get_collection(collection_name).config
+    dense = config.params.vectors["jina-small"]
+    sparse = (config.params.sparse_vectors or {}).get("bm25")
+    hnsw = dense.hnsw_config or config.hnsw_config
+
+    actual = {
+        "shard_number": config.params.shard_number,
+        "replication_factor": config.params.replication_factor,
+        "write_consistency_factor": config.params.write_consistency_factor,
+        "on_disk_payload": config.params.on_disk_payload,
+    }
+    sections = {
+        "hnsw": hnsw,
+        "optimizers": config.optimizer_config,
+        "wal": config.wal_config,
+        "sparse": sparse.index if sparse else None,
+    }
+
+    mismatches = []
+    for key, value in actual.items():
+        if key in profile and profile[key] != value:
+            mismatches.append(f"{key}: expected {profile[key]}, got {value}")
+    for section, live in sections.items():
+        for key, expected in (profile.get(section) or {}).items():
+            value = getattr(live, key, None) if live is not None else None
+            if expected != value:
+                mismatches.append(f"{section}.{key}: expected {expected}, got {value}")
+    return mismatches
+
+def qdrant_memory_bytes(qdrant_url: str) -> Optional[int]:
+    """Resident memory reported by the Qdrant server's /metrics endpoint"""
+    try:
+        text = requests.get(f"{qdrant_url.rstrip('/')}/metrics", timeout=5).text
+    except requests.RequestException:
+        return None
+    match = re.search(r"^memory_resident_bytes\s+(\d+)", text, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+def benchmark(profile_names: List[str], queries: int) -> List[Dict[str, Any]]:
+    """
+    Compare collection profiles on ingest time, memory and query latency
+
+    Each profile is applied to a scratch collection on the configured Qdrant
+    (QDRANT_URL, or ":memory:" for an in-process instance), filled with the
+    processed documents and queried with ground-truth questions.
+
+    Args:
+        profile_names: Profiles to compare
+        queries: Number of ground-truth questions to time
+
+    Returns:
+        One result dictionary per profile
+    """
+    import pandas as pd
+    from setup import setup_qdrant, load_documents, index_documents
+
+    qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
+    client = QdrantClient(qdrant_url)
+    documents = load_documents()
+    questions = pd.read_csv(PROJECT_ROOT / "data" / "processed" / "ground-truth-retrieval.csv")
+    questions = questions["question"].head(queries).tolist()
+
+    results = []
+    for name in profile_names:
+        print(f"\n📐 Profile: {name}")
+        profile = load_profile(name)
+        collection_name = f"profile-bench-{name}"
+        memory_before = qdrant_memory_bytes(qdrant_url)
+
+        setup_qdrant(client, collection_name, profile)
+        start_time = time.time()
+        index_documents(client, collection_name, documents)
+        ingest_time = time.time() - start_time
+
+        latencies = []
+        for question in questions:
+            query_start = time.time()
+            client.query_points(
+                collection_name=collection_name,
+                query=models.Document(text=question, model="jinaai/jina-embeddings-v2-small-en"),
+                using="jina-small",
+                limit=5,
+            )
+            latencies.append(time.time() - query_start)
+
+        memory_after = qdrant_memory_bytes(qdrant_url)
+        result = {
+            "profile": name,
+            "documents": len(documents),
+            "ingest_time": ingest_time,
+            "docs_per_sec": len(documents) / ingest_time if ingest_time > 0 else 0.0,
+            "server_memory_delta_bytes": (memory_after - memory_before)
+                if memory_before is not None and memory_after is not None else None,
+            # Client peak RSS (only meaningful for ":memory:" runs)
+            "client_peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "query_p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "query_p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "mismatches": [] if is_local_client(client)
+                else verify_collection(client, collection_name, profile),
+        }
+        results.append(result)
+        client.delete_collection(collection_name)
+
+        memory = result["server_memory_delta_bytes"]
+        print(f"   Ingest: {ingest_time:.1f}s ({result['docs_per_sec']:.1f} docs/sec)")
+        print(f"   Server RAM delta: {memory / 1e6:.1f} MB" if memory is not None else "   Server RAM: n/a")
+        print(f"   Query p50/p95: {result['query_p50_ms']:.1f}/{result['query_p95_ms']:.1f} ms")
+        if result["mismatches"]:
+            print(f"   ⚠️  Config mismatches: {result['mismatches']}")
+
+    results_dir = PROJECT_ROOT / "results"
+    results_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = results_dir / f"collection_profiles_{timestamp}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to: {output_path}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant collection profiles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show", help="Print a profile and its create_collection arguments")
+    show.add_argument("profile", nargs="?", default=None)
+
+    verify = subparsers.add_parser("verify", help="Check the live collection against a profile")
+    verify.add_argument("profile", nargs="?", default=None)
+    verify.add_argument("--collection", default="travel-docs")
+
+    bench = subparsers.add_parser("benchmark", help="Compare profiles on ingest time, RAM and query p95")
+    bench.add_argument("--profiles", nargs="+", default=["default", "ondisk"])
+    bench.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        profile = load_profile(args.profile)
+        print(yaml.safe_dump(profile, sort_keys=False))
+        print(collection_params(profile))
+    elif args.command == "verify":
+        profile = load_profile(args.profile)
+        client = QdrantClient(os.getenv("QDRANT_URL", "http://localhost:6333"))
+        mismatches = verify_collection(client, args.collection, profile)
+        for mismatch in mismatches:
+            print(f"⚠️  {mismatch}")
+        print("✅ Collection matches profile" if not mismatches else f"❌ {len(mismatches)} mismatch(es)")
+        raise SystemExit(1 if mismatches else 0)
+    elif args.command == "benchmark":
+        benchmark(args.profiles, args.queries)
+
+if __name__ == "__main__":
+    main()
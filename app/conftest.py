@@ -0,0 +1,57 @@
+# conftest.py - Shared fixtures: the RAG pipeline on the stand-ins with a small in-memory collection
+import sys
+import hashlib
+
+import numpy as np
+import pytest
+
+import standins
+
+DOCUMENTS = [
+    ("Mysore Palace is lit by nearly 100,000 bulbs on Sunday evenings.", "Karnataka"),
+    ("Baga Beach is known for its nightlife and water sports.", "Goa"),
+    ("Amber Fort overlooks Maota Lake near Jaipur.", "Rajasthan"),
+]
+
+def fake_vector(text: str):
+    digest = np.frombuffer(hashlib.sha256(text.encode()).digest() * 16, dtype=np.uint8)[:512].astype(float)
+    return (digest / np.linalg.norm(digest)).tolist()
+
+@pytest.fixture(scope="module")
+def rag():
+    """rag on the stand-ins, with a small collection and hashed query vectors"""
+    if "rag" not in sys.modules:
+        from huggingface_hub import try_to_load_from_cache
+        if try_to_load_from_cache("jinaai/jina-embeddings-v2-small-en", "config.json") is None:
+            pytest.skip("the jina embedding model is not in the local Hugging Face cache")
+        standins.use_offline_services(latency=0.0, jitter=0.0, error_rate=0.0)
+    import rag
+    from qdrant_client import QdrantClient, AsyncQdrantClient, models
+
+    saved = (rag.qdrant_client, rag.async_qdrant_client, rag.encode_query, rag.retrieval_cache,
+             rag.relevance_scorer, rag.SINGLEFLIGHT_ENABLED)
+    rag.qdrant_client, rag.async_qdrant_client = QdrantClient(":memory:"), AsyncQdrantClient(":memory:")
+    rag.retrieval_cache, rag.relevance_scorer, rag.SINGLEFLIGHT_ENABLED = None, None, False
+
+    def encode_query(model_name, query):
+        if model_name == rag.SPARSE_MODEL:
+            return models.SparseVector(indices=[1, 2], values=[1.0, 0.5])
+        return fake_vector(query)
+
+    rag.encode_query = encode_query
+    rag.qdrant_client.create_collection(
+        rag.COLLECTION_NAME,
+        vectors_config={"jina-small": models.VectorParams(size=512, distance=models.Distance.COSINE)},
+        sparse_vectors_config={"bm25": models.SparseVectorParams(modifier=models.Modifier.IDF)},
+    )
+    rag.qdrant_client.upsert(rag.COLLECTION_NAME, points=[
+        models.PointStruct(id=i, payload={"content": content, "location": location, "id": str(i)}, vector={
+            "jina-small": fake_vector(content), "bm25": models.SparseVector(indices=[1, i + 3], values=[1.0, 1.0])})
+        for i, (content, location) in enumerate(DOCUMENTS)
+    ])
+    rag.async_qdrant_client._client.collections = rag.qdrant_client._client.collections
+    # The stand-in LLM reports cached prompt tokens once it has seen the system prompts
+    rag.get_answer("Warm up", "openai/gpt-4o-mini")
+    yield rag
+    (rag.qdrant_client, rag.async_qdrant_client, rag.encode_query, rag.retrieval_cache,
+     rag.relevance_scorer, rag.SINGLEFLIGHT_ENABLED) = saved
@@ -1,15 +1,23 @@
 # db.py - PostgreSQL Database Module for RAG (TIMEZONE FIXED)
 
 import os
+import json
+import asyncio
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, Json, execute_values
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from typing import Dict, List, Optional, Any
 
+from tracing import span
+
 # FIXED: Define the timezone for India (IST = UTC+5:30)
 tz = ZoneInfo("Asia/Kolkata")
 
+# Connections kept by the async pool (asave_conversation, asave_feedback)
+POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+
 def get_db_connection():
     """Create database connection using environment variables"""
     return psycopg2.connect(
@@ -20,6 +28,58 @@ def get_db_connection():
         port=int(os.getenv("POSTGRES_PORT", 5432))
     )
 
+_async_pool = None
+
+async def get_async_pool():
+    """
+    asyncpg connection pool, created on first use
+
+    The pool belongs to the event loop that created it; close it with
+    close_async_pool() before that loop ends.
+    """
+    global _async_pool
+    if _async_pool is None:
+        import asyncpg
+
+        # Store the creating task so concurrent first callers share one pool
+        _async_pool = asyncio.ensure_future(asyncpg.create_pool(
+            host=os.getenv("POSTGRES_HOST", "localhost"),
+            database=os.getenv("POSTGRES_DB", "Brahman"),
+            user=os.getenv("POSTGRES_USER", "admin"),
+            password=os.getenv("POSTGRES_PASSWORD", "admin"),
+            port=int(os.getenv("POSTGRES_PORT", 5432)),
+            min_size=POSTGRES_POOL_MIN,
+            max_size=POSTGRES_POOL_MAX,
+        ))
+    pool_task = _async_pool
+    try:
+        return await pool_task
+    except Exception:
+        if _async_pool is pool_task:
+            _async_pool = None  # Let the next caller retry the connection
+        raise
+
+def pool_stats() -> Optional[Dict[str, int]]:
+    """Size, idle connections and limits of the asyncpg pool (None until it exists)"""
+    if _async_pool is None or not _async_pool.done() or _async_pool.cancelled() or _async_pool.exception():
+        return None
+    pool = _async_pool.result()
+    return {
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+    }
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        pool, _async_pool = _async_pool, None
+        try:
+            await (await pool).close()
+        except Exception as e:
+            print(f"⚠️  Closing the Postgres pool failed: {e}")
+
 def init_db():
     """Initialize database tables"""
     conn = get_db_connection()
@@ -28,6 +88,7 @@ def init_db():
             # Drop existing tables
             cur.execute("DROP TABLE IF EXISTS feedback")
             cur.execute("DROP TABLE IF EXISTS conversations")
+            cur.execute("DROP TABLE IF EXISTS spans")
             
             # Create conversations table
             cur.execute("""
@@ -40,14 +101,20 @@ def init_db():
                     response_time FLOAT NOT NULL,
                     relevance TEXT NOT NULL,
                     relevance_explanation TEXT NOT NULL,
+                    relevance_method TEXT DEFAULT 'llm',
+                    relevance_confidence FLOAT,
+                    local_relevance TEXT,
                     prompt_tokens INTEGER NOT NULL,
                     completion_tokens INTEGER NOT NULL,
                     total_tokens INTEGER NOT NULL,
+                    cached_tokens INTEGER DEFAULT 0,
                     eval_prompt_tokens INTEGER NOT NULL,
                     eval_completion_tokens INTEGER NOT NULL,
                     eval_total_tokens INTEGER NOT NULL,
+                    eval_cached_tokens INTEGER DEFAULT 0,
                     openai_cost FLOAT NOT NULL,
                     search_results_count INTEGER DEFAULT 0,
+                    coalesced BOOLEAN DEFAULT FALSE,
                     timestamp TIMESTAMP WITH TIME ZONE NOT NULL
                 )
             """)
@@ -61,12 +128,99 @@ def init_db():
                     timestamp TIMESTAMP WITH TIME ZONE NOT NULL
                 )
             """)
+
+            # Create spans table (request traces, see tracing.py)
+            for statement in SPANS_TABLE:
+                cur.execute(statement)
             
             conn.commit()
             print("Database initialized successfully")
     finally:
         conn.close()
 
+# Columns added after the conversations table was first created, as (name, type)
+CONVERSATION_MIGRATIONS = [
+    ("cached_tokens", "INTEGER DEFAULT 0"),
+    ("eval_cached_tokens", "INTEGER DEFAULT 0"),
+    ("relevance_method", "TEXT DEFAULT 'llm'"),
+    ("relevance_confidence", "FLOAT"),
+    ("local_relevance", "TEXT"),
+    ("coalesced", "BOOLEAN DEFAULT FALSE"),
+]
+
+# Trace spans exported by tracing.py; root spans have no parent_id
+SPANS_TABLE = [
+    """
+    CREATE TABLE IF NOT EXISTS spans (
+        span_id TEXT PRIMARY KEY,
+        trace_id TEXT NOT NULL,
+        parent_id TEXT,
+        name TEXT NOT NULL,
+        start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+        duration_ms FLOAT NOT NULL,
+        attributes JSONB,
+        error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS spans_trace_id_idx ON spans (trace_id)",
+    "CREATE INDEX IF NOT EXISTS spans_root_start_idx ON spans (start_time) WHERE parent_id IS NULL",
+]
+
+def migrate_db():
+    """Add newer columns and tables to an existing database (safe to run repeatedly)"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for column, column_type in CONVERSATION_MIGRATIONS:
+                cur.execute(f"ALTER TABLE conversations ADD COLUMN IF NOT EXISTS {column} {column_type}")
+            for statement in SPANS_TABLE:
+                cur.execute(statement)
+            conn.commit()
+    finally:
+        conn.close()
+
+# Columns written by save_conversation, in conversation_row order
+CONVERSATION_COLUMNS = [
+    "id", "question", "answer", "model_used", "search_type", "response_time", "relevance",
+    "relevance_explanation", "relevance_method", "relevance_confidence", "local_relevance",
+    "prompt_tokens", "completion_tokens", "total_tokens",
+    "cached_tokens", "eval_prompt_tokens", "eval_completion_tokens", "eval_total_tokens",
+    "eval_cached_tokens", "openai_cost", "search_results_count", "coalesced", "timestamp",
+]
+
+def conversation_row(
+    conversation_id: str,
+    question: str,
+    answer_data: Dict[str, Any],
+    timestamp: datetime
+) -> tuple:
+    """Values for CONVERSATION_COLUMNS"""
+    return (
+        conversation_id,
+        question,
+        answer_data["answer"],
+        answer_data["model_used"],
+        answer_data["search_type"],
+        answer_data["response_time"],
+        answer_data["relevance"],
+        answer_data["relevance_explanation"],
+        answer_data.get("relevance_method", "llm"),
+        answer_data.get("relevance_confidence"),
+        answer_data.get("local_relevance"),
+        answer_data["prompt_tokens"],
+        answer_data["completion_tokens"],
+        answer_data["total_tokens"],
+        answer_data.get("cached_tokens", 0),
+        answer_data["eval_prompt_tokens"],
+        answer_data["eval_completion_tokens"],
+        answer_data["eval_total_tokens"],
+        answer_data.get("eval_cached_tokens", 0),
+        answer_data["openai_cost"],
+        answer_data["search_results_count"],
+        answer_data.get("coalesced", False),
+        timestamp,  # Direct IST timestamp (PostgreSQL converts to UTC automatically)
+    )
+
 def save_conversation(
     conversation_id: str,
     question: str,
@@ -87,43 +241,38 @@ def save_conversation(
     
     print(f"💾 Saving conversation with IST timestamp: {timestamp}")
     
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # FIXED: Removed COALESCE - use direct timestamp parameter
-            cur.execute(
-                """
-                INSERT INTO conversations
-                (id, question, answer, model_used, search_type, response_time, relevance,
-                 relevance_explanation, prompt_tokens, completion_tokens, total_tokens,
-                 eval_prompt_tokens, eval_completion_tokens, eval_total_tokens,
-                 openai_cost, search_results_count, timestamp)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    conversation_id,
-                    question,
-                    answer_data["answer"],
-                    answer_data["model_used"],
-                    answer_data["search_type"],
-                    answer_data["response_time"],
-                    answer_data["relevance"],
-                    answer_data["relevance_explanation"],
-                    answer_data["prompt_tokens"],
-                    answer_data["completion_tokens"],
-                    answer_data["total_tokens"],
-                    answer_data["eval_prompt_tokens"],
-                    answer_data["eval_completion_tokens"],
-                    answer_data["eval_total_tokens"],
-                    answer_data["openai_cost"],
-                    answer_data["search_results_count"],
-                    timestamp,  # Direct IST timestamp (PostgreSQL converts to UTC automatically)
+    with span("db_write", table="conversations"):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                # FIXED: Removed COALESCE - use direct timestamp parameter
+                cur.execute(
+                    f"INSERT INTO conversations ({', '.join(CONVERSATION_COLUMNS)}) "
+                    f"VALUES ({', '.join(['%s'] * len(CONVERSATION_COLUMNS))})",
+                    conversation_row(conversation_id, question, answer_data, timestamp)
                 )
-            )
-            conn.commit()
-            print(f"✅ Conversation saved successfully")
-    finally:
-        conn.close()
+                conn.commit()
+                print(f"✅ Conversation saved successfully")
+        finally:
+            conn.close()
+
+async def asave_conversation(
+    conversation_id: str,
+    question: str,
+    answer_data: Dict[str, Any],
+    timestamp: Optional[datetime] = None
+) -> None:
+    """save_conversation() through the async pool"""
+    if timestamp is None:
+        timestamp = datetime.now(tz)  # IST timezone
+
+    placeholders = ", ".join(f"${i}" for i in range(1, len(CONVERSATION_COLUMNS) + 1))
+    with span("db_write", table="conversations"):
+        pool = await get_async_pool()
+        await pool.execute(
+            f"INSERT INTO conversations ({', '.join(CONVERSATION_COLUMNS)}) VALUES ({placeholders})",
+            *conversation_row(conversation_id, question, answer_data, timestamp)
+        )
 
 def save_feedback(
     conversation_id: str,
@@ -144,16 +293,66 @@ def save_feedback(
     print(f"👍 Saving feedback with IST timestamp: {timestamp}")
     print(f"🔗 Conversation ID: {conversation_id}, Feedback: {feedback}")
     
+    with span("db_write", table="feedback"):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                # FIXED: Removed COALESCE - use direct timestamp parameter
+                cur.execute(
+                    "INSERT INTO feedback (conversation_id, feedback, timestamp) VALUES (%s, %s, %s)",
+                    (conversation_id, feedback, timestamp),
+                )
+                conn.commit()
+                print(f"✅ Feedback saved successfully")
+        finally:
+            conn.close()
+
+async def asave_feedback(
+    conversation_id: str,
+    feedback: int,
+    timestamp: Optional[datetime] = None
+) -> None:
+    """
+    save_feedback() through the async pool
+
+    Raises:
+        asyncpg.ForeignKeyViolationError: no conversation with this id
+    """
+    if timestamp is None:
+        timestamp = datetime.now(tz)  # IST timezone
+
+    with span("db_write", table="feedback"):
+        pool = await get_async_pool()
+        await pool.execute(
+            "INSERT INTO feedback (conversation_id, feedback, timestamp) VALUES ($1, $2, $3)",
+            conversation_id, feedback, timestamp
+        )
+
+def save_spans(spans: List[Dict[str, Any]]) -> None:
+    """
+    Write finished trace spans (tracing.Span.to_dict() rows) in one statement
+
+    Args:
+        spans: Rows with trace_id, span_id, parent_id, name, start_time
+            (epoch seconds), duration_ms, attributes and error
+    """
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            # FIXED: Removed COALESCE - use direct timestamp parameter
-            cur.execute(
-                "INSERT INTO feedback (conversation_id, feedback, timestamp) VALUES (%s, %s, %s)",
-                (conversation_id, feedback, timestamp),
+            execute_values(
+                cur,
+                """
+                INSERT INTO spans (span_id, trace_id, parent_id, name, start_time, duration_ms, attributes, error)
+                VALUES %s ON CONFLICT (span_id) DO NOTHING
+                """,
+                [
+                    (s["span_id"], s["trace_id"], s["parent_id"], s["name"],
+                     datetime.fromtimestamp(s["start_time"], tz), s["duration_ms"],
+                     Json(s["attributes"], dumps=lambda obj: json.dumps(obj, default=str)), s["error"])
+                    for s in spans
+                ],
             )
             conn.commit()
-            print(f"✅ Feedback saved successfully")
     finally:
         conn.close()
 
@@ -233,6 +432,7 @@ def get_model_usage_stats() -> List[Dict]:
                     COUNT(*) as usage_count,
                     AVG(response_time) as avg_response_time,
                     AVG(total_tokens) as avg_total_tokens,
+                    SUM(cached_tokens) * 1.0 / NULLIF(SUM(prompt_tokens), 0) as cached_token_ratio,
                     SUM(openai_cost) as total_cost
                 FROM conversations
                 WHERE timestamp >= NOW() - INTERVAL '24 hours'
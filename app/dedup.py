@@ -0,0 +1,165 @@
+# dedup.py - Near-Duplicate and Low-Information Chunk Elimination
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+# Tunables (override via environment)
+MIN_CHUNK_CHARS = int(os.getenv("DEDUP_MIN_CHARS", 40))
+SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16  # 16 bands x 8 rows -> candidate threshold ~0.71
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, _MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+BREADCRUMB_PATTERN = re.compile(r"^\s*[^>\n]+(\s>\s[^>\n]+){2,}\s*$", re.MULTILINE)
+
+def informative_text(content: str) -> str:
+    """Strip markdown images and breadcrumb trails ("Asia > South Asia > ...")"""
+    text = IMAGE_PATTERN.sub("", content)
+    return BREADCRUMB_PATTERN.sub("", text)
+
+def is_low_information(content: str, min_chars: int = MIN_CHUNK_CHARS) -> bool:
+    """Whether a chunk is image-only, breadcrumb-only or too short to be useful"""
+    return len(re.sub(r"\W+", "", informative_text(content))) < min_chars
+
+def shingles(content: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """Hashed word k-shingles of a chunk"""
+    words = re.findall(r"\w+", content.lower())
+    if len(words) < k:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+    return np.array([zlib.crc32(g.encode()) & _MERSENNE_PRIME for g in set(grams)], dtype=np.uint64)
+
+def minhash(content: str) -> np.ndarray:
+    """NUM_PERM-wide MinHash signature of a chunk's shingles"""
+    hashed = (np.outer(shingles(content), _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return hashed.min(axis=0)
+
+def find_duplicate_clusters(contents: List[str], threshold: float = SIMILARITY_THRESHOLD) -> List[List[int]]:
+    """
+    Group near-duplicate chunks using MinHash + LSH banding
+
+    Args:
+        contents: Chunk texts
+        threshold: Minimum estimated Jaccard similarity to merge two chunks
+
+    Returns:
+        Clusters (lists of indices) with more than one member
+    """
+    if not contents:
+        return []
+
+    signatures = np.vstack([minhash(c) for c in contents])
+    rows = NUM_PERM // BANDS
+
+    parent = list(range(len(contents)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        band_sig = signatures[:, band * rows:(band + 1) * rows]
+        for i, row in enumerate(band_sig):
+            buckets[row.tobytes()].append(i)
+
+        for members in buckets.values():
+            for other in members[1:]:
+                # Verify LSH candidates against the full signature
+                if find(members[0]) != find(other) and \
+                        np.mean(signatures[members[0]] == signatures[other]) >= threshold:
+                    parent[find(other)] = find(members[0])
+
+    clusters = defaultdict(list)
+    for i in range(len(contents)):
+        clusters[find(i)].append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+def _attach(canonical: Dict[str, Any], dropped: Dict[str, Any]) -> None:
+    merged = canonical.setdefault("merged_ids", [])
+    for doc_id in [dropped.get("id")] + dropped.get("merged_ids", []):
+        if doc_id and doc_id != canonical.get("id") and doc_id not in merged:
+            merged.append(doc_id)
+
+def deduplicate(documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Drop low-information and near-duplicate chunks before indexing
+
+    Dropped chunks keep pointing at a surviving chunk: their IDs are added
+    to the canonical chunk's "merged_ids" (near-duplicates go to the longest
+    chunk of their cluster, low-information chunks to their neighbour from
+    the same source), so ground-truth lookups still resolve. Only chunks of
+    the same location are merged, since searches can filter on it.
+
+    Args:
+        documents: Documents with content/location/doc_id/id
+
+    Returns:
+        Tuple of (kept documents, report dictionary)
+    """
+    documents = [dict(doc) for doc in documents]
+    dropped = [False] * len(documents)
+    low_info = [is_low_information(d["content"]) for d in documents]
+
+    # 1. Near-duplicates among informative chunks: keep the longest per cluster.
+    #    Clustered per location, so searches filtered by location still find the text
+    by_location = defaultdict(list)
+    for i in range(len(documents)):
+        if not low_info[i]:
+            by_location[documents[i].get("location")].append(i)
+    clusters = [
+        [informative[m] for m in members]
+        for informative in by_location.values()
+        for members in find_duplicate_clusters(
+            [informative_text(documents[i]["content"]) for i in informative]
+        )
+    ]
+    duplicates = 0
+    for members in clusters:
+        canonical = max(members, key=lambda i: len(documents[i]["content"]))
+        for i in members:
+            if i != canonical:
+                _attach(documents[canonical], documents[i])
+                dropped[i] = True
+                duplicates += 1
+
+    # 2. Low-information chunks: attribute to the nearest kept chunk of the same source
+    low_information = 0
+    for i, doc in enumerate(documents):
+        if not low_info[i]:
+            continue
+        neighbours = list(range(i + 1, len(documents))) + list(range(i - 1, -1, -1))
+        for j in neighbours:
+            if not dropped[j] and not low_info[j] and documents[j].get("location") == doc.get("location"):
+                _attach(documents[j], doc)
+                dropped[i] = True
+                low_information += 1
+                break
+
+    kept = [doc for doc, is_dropped in zip(documents, dropped) if not is_dropped]
+    bytes_before = sum(len(d["content"].encode()) for d in documents)
+    bytes_after = sum(len(d["content"].encode()) for d in kept)
+    report = {
+        "input_chunks": len(documents),
+        "kept_chunks": len(kept),
+        "dropped_duplicates": duplicates,
+        "dropped_low_information": low_information,
+        "duplicate_clusters": len(clusters),
+        "content_bytes_before": bytes_before,
+        "content_bytes_after": bytes_after,
+        "index_size_reduction": 1 - len(kept) / len(documents) if documents else 0.0,
+    }
+    return kept, report
@@ -0,0 +1,195 @@
+# ingest.py - Parallel PDF → Markdown → Chunks Ingestion CLI
+import os
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chunking import CHUNKERS, DEFAULT_CHUNKER, get_chunker
+
+# Project layout (works both locally and inside the Docker image)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RAW_DIR = Path(os.getenv("RAW_PDF_DIR", PROJECT_ROOT / "data" / "raw"))
+PROCESSED_DIR = Path(os.getenv("PROCESSED_DIR", PROJECT_ROOT / "data" / "processed"))
+CACHE_DIR = Path(os.getenv("INGEST_CACHE_DIR", PROCESSED_DIR / ".ingest_cache"))
+
+# JSONL consumed by setup.py (same record schema as documents-with-ids.json)
+OUTPUT_PATH = PROCESSED_DIR / "documents-with-ids.jsonl"
+
+class IngestFailed(RuntimeError):
+    """Some PDFs could not be converted; the previous output file was left in place"""
+
+    def __init__(self, failures: Dict[str, str], manifest_path: Path):
+        super().__init__(f"{len(failures)} PDF(s) failed to convert, see {manifest_path}")
+        self.failures = failures
+        self.manifest_path = manifest_path
+
+def failure_manifest_path(output_path: Path) -> Path:
+    """Where the list of PDFs that failed to convert is written, next to the output"""
+    return output_path.with_name(output_path.stem + ".failures.json")
+
+# Marker models, loaded once per worker process
+_worker_models = None
+
+def _init_worker():
+    """Load Marker models once when a worker process starts"""
+    global _worker_models
+    from marker.logger import configure_logging
+    from marker.models import load_all_models
+
+    configure_logging()
+    _worker_models = load_all_models()
+
+def file_hash(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file, read in blocks"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def convert_pdf(pdf_path: str) -> Dict[str, Any]:
+    """
+    Convert a single PDF to markdown inside a worker process
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+        Dictionary with pdf_name, markdown and conversion time
+    """
+    from marker.convert import convert_single_pdf
+
+    start_time = time.time()
+    full_text, _, _ = convert_single_pdf(pdf_path, _worker_models, batch_multiplier=1)
+
+    return {
+        "pdf_name": os.path.basename(pdf_path),
+        "markdown": full_text,
+        "convert_time": time.time() - start_time,
+    }
+
+def list_pdf_files(directory: Path) -> List[Path]:
+    """List all PDF files in a directory"""
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() == ".pdf")
+
+def ingest(
+    input_dir: Path = RAW_DIR,
+    output_path: Path = OUTPUT_PATH,
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+    chunker_name: str = DEFAULT_CHUNKER,
+    skip_failures: bool = False,
+) -> int:
+    """
+    Convert all PDFs on a process pool and stream their chunks to JSONL
+
+    Args:
+        input_dir: Folder containing the raw PDFs
+        output_path: JSONL file to write
+        workers: Number of worker processes (defaults to CPU count)
+        use_cache: Skip conversion of PDFs whose hash is already cached
+        chunker_name: Chunker used to split the markdown (see chunking.py)
+        skip_failures: Publish the output even if some PDFs failed to convert
+
+    Returns:
+        Number of chunks written
+
+    Raises:
+        IngestFailed: A PDF failed to convert and skip_failures is off
+    """
+    pdf_files = list_pdf_files(input_dir)
+    if not pdf_files:
+        print(f"⚠️  No PDF files found in {input_dir}")
+        return 0
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+    chunker = get_chunker(chunker_name)
+
+    print(f"📂 Found {len(pdf_files)} PDF(s) in {input_dir}")
+    start_time = time.time()
+    total_chunks = 0
+    failures = {}
+
+    with open(tmp_path, "w", encoding="utf-8") as out:
+
+        def write_chunks(pdf_name: str, markdown: str) -> int:
+            chunk_start = time.time()
+            documents = chunker.chunk(pdf_name, markdown)
+            for doc in documents:
+                out.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"   ✂️  {pdf_name}: {len(documents)} chunks in {time.time() - chunk_start:.2f}s")
+            return len(documents)
+
+        # Serve unchanged PDFs from the conversion cache
+        pending = {}
+        for pdf_path in pdf_files:
+            digest = file_hash(pdf_path)
+            cache_path = CACHE_DIR / f"{digest}.md"
+            if use_cache and cache_path.exists():
+                print(f"♻️  {pdf_path.name}: cached conversion ({digest[:12]})")
+                total_chunks += write_chunks(pdf_path.name, cache_path.read_text(encoding="utf-8"))
+            else:
+                pending[str(pdf_path)] = cache_path
+
+        # Convert the rest in parallel, streaming chunks as each PDF finishes
+        if pending:
+            max_workers = workers or min(len(pending), os.cpu_count() or 1)
+            print(f"🚀 Converting {len(pending)} PDF(s) on {max_workers} worker(s)...")
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(convert_pdf, path): path for path in pending}
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"❌ {os.path.basename(path)}: conversion failed: {e}")
+                        failures[os.path.basename(path)] = f"{type(e).__name__}: {e}"
+                        continue
+
+                    pending[path].write_text(result["markdown"], encoding="utf-8")
+                    print(f"⏱️  {result['pdf_name']}: converted in {result['convert_time']:.1f}s")
+                    total_chunks += write_chunks(result["pdf_name"], result["markdown"])
+
+    # Failed PDFs are listed next to the output; a clean run removes a stale list
+    manifest_path = failure_manifest_path(output_path)
+    if failures:
+        manifest_path.write_text(json.dumps(failures, indent=2, ensure_ascii=False), encoding="utf-8")
+        if not skip_failures:
+            # Keep the previous output: indexing it would silently drop those documents
+            os.remove(tmp_path)
+            raise IngestFailed(failures, manifest_path)
+        print(f"⚠️  Skipping {len(failures)} failed PDF(s), listed in {manifest_path}")
+    elif manifest_path.exists():
+        manifest_path.unlink()
+
+    os.replace(tmp_path, output_path)
+    print(f"\n✅ Wrote {total_chunks} chunks to {output_path} in {time.time() - start_time:.1f}s")
+    return total_chunks
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert raw PDFs into chunked JSONL for setup.py")
+    parser.add_argument("--input", type=Path, default=RAW_DIR, help="Folder with raw PDFs")
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH, help="Output JSONL path")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="Reconvert every PDF")
+    parser.add_argument("--chunker", default=DEFAULT_CHUNKER, choices=list(CHUNKERS))
+    parser.add_argument("--skip-failures", action="store_true",
+                        help="Write the output even if some PDFs fail to convert")
+    args = parser.parse_args()
+
+    try:
+        ingest(args.input, args.output, args.workers, use_cache=not args.no_cache,
+               chunker_name=args.chunker, skip_failures=args.skip_failures)
+    except IngestFailed as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# judge.py - Batch LLM-as-a-Judge Evaluator (concurrent, rate-paced, resumable)
+import os
+import json
+import math
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "results"
+ANSWERS_PATH = RESULTS_DIR / "multiple_examples_comparison.csv"
+OUTPUT_PATH = RESULTS_DIR / "llm_as_a_judge_evaluations_multiple.csv"
+CACHE_PATH = Path(os.getenv("JUDGE_CACHE_PATH", RESULTS_DIR / "judge_cache.jsonl"))
+
+JUDGE_MODEL = os.getenv("JUDGE_MODEL", "openai/gpt-4o-mini")
+JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", "8"))
+# Requests per minute allowed for the judge model (0 = unpaced)
+JUDGE_RPM = float(os.getenv("JUDGE_RPM", "300"))
+
+# LLM-as-a-Judge prompts from notebooks/offline-rag-evaluation.ipynb
+AQA_PROMPT_TEMPLATE = """
+You are an expert evaluator for a Retrieval-Augmented Generation (RAG) system.
+Your task is to analyze the relevance of the generated answer compared to the original answer provided.
+Based on the relevance and similarity of the generated answer to the original answer, you will classify
+it as "NON_RELEVANT", "PARTLY_RELEVANT", or "RELEVANT".
+
+Here is the data for evaluation:
+
+Original Answer: {answer_orig}
+Generated Question: {question}
+Generated Answer: {answer_llm}
+
+Please analyze the content and context of the generated answer in relation to the original
+answer and provide your evaluation in parsable JSON without using code blocks:
+
+{{
+  "Relevance": "NON_RELEVANT" | "PARTLY_RELEVANT" | "RELEVANT",
+  "Explanation": "[Provide a brief explanation for your evaluation]"
+}}
+""".strip()
+
+QA_PROMPT_TEMPLATE = """
+You are an expert evaluator for a Retrieval-Augmented Generation (RAG) system.
+Your task is to analyze the relevance of the generated answer to the given question.
+Based on the relevance of the generated answer, you will classify it
+as "NON_RELEVANT", "PARTLY_RELEVANT", or "RELEVANT".
+
+Here is the data for evaluation:
+
+Question: {question}
+Generated Answer: {answer_llm}
+
+Please analyze the content and context of the generated answer in relation to the question
+and provide your evaluation in parsable JSON without using code blocks:
+
+{{
+  "Relevance": "NON_RELEVANT" | "PARTLY_RELEVANT" | "RELEVANT",
+  "Explanation": "[Provide a brief explanation for your evaluation]"
+}}
+""".strip()
+
+EVALUATION_TYPES = {
+    "Answer-Question-Answer": AQA_PROMPT_TEMPLATE,
+    "Question-Answer": QA_PROMPT_TEMPLATE,
+}
+# Record fields that go into the prompts and the cache key
+TEXT_FIELDS = ("question", "answer_orig", "answer_llm")
+
+def field_text(value: Any) -> str:
+    """A CSV field as prompt text: missing values (NaN, None) become "", numbers their str()"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value)
+
+class RatePacer:
+    """Spaces calls evenly so at most `rpm` start per minute, across threads"""
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+class JudgeCache:
+    """Append-only JSONL cache of judgments, so interrupted runs resume where they stopped"""
+
+    def __init__(self, path: Path = CACHE_PATH):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            self._load()
+
+    def _load(self):
+        """Read the entries; a last line cut off by an interrupted append is truncated away"""
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    if i < len(lines) - 1:
+                        raise
+                    print(f"⚠️  Dropping a partly written judgment at the end of {self.path}")
+                    with open(self.path, "r+b") as f:
+                        f.truncate(valid_size)
+                    break
+                self.entries[entry["key"]] = entry
+            valid_size += len(line)
+        else:
+            if lines and not lines[-1].endswith(b"\n"):
+                # Complete entry without its newline; end it so the next append starts a line
+                with open(self.path, "ab") as f:
+                    f.write(b"\n")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        entry = {"key": key, **entry}
+        with self.lock:
+            self.entries[key] = entry
+            self.path.parent.mkdir(exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+def judge_key(judge_model: str, evaluation_type: str, record: Dict[str, Any]) -> str:
+    """Cache key: hash of the judge model, prompt type, question and answer(s)"""
+    parts = [judge_model, evaluation_type, field_text(record["question"]), field_text(record["answer_llm"])]
+    if evaluation_type == "Answer-Question-Answer":
+        parts.append(field_text(record["answer_orig"]))
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+def judge_one(prompt: str, judge_model: str, pacer: RatePacer) -> Dict[str, Any]:
+    """
+    Run one judge prompt (rag.complete retries rate limits and transient errors)
+
+    Returns:
+        Dictionary with Relevance, Explanation and token usage
+    """
+    from rag import complete
+
+    pacer.wait()
+    answer, tokens = complete(prompt, judge_model)
+    evaluation = json.loads(answer)
+    return {
+        "Relevance": evaluation["Relevance"],
+        "Explanation": evaluation["Explanation"],
+        "tokens": tokens,
+    }
+
+def run_judge(
+    records: List[Dict[str, Any]],
+    evaluation_types: List[str],
+    judge_model: str = JUDGE_MODEL,
+    concurrency: int = JUDGE_CONCURRENCY,
+    rpm: float = JUDGE_RPM,
+    cache: Optional[JudgeCache] = None,
+) -> pd.DataFrame:
+    """
+    Judge every (record, evaluation type) pair on a bounded thread pool
+
+    Args:
+        records: Rows with model, question_index, question, answer_orig, answer_llm
+        evaluation_types: Keys of EVALUATION_TYPES
+        judge_model: LLM used as the judge
+        concurrency: Judge calls in flight
+        rpm: Requests-per-minute pacing for the judge model
+        cache: Judgment cache (cached pairs are not sent again)
+
+    Returns:
+        DataFrame with Relevance, Explanation, model, question_index, evaluation_type
+    """
+    cache = cache or JudgeCache()
+    pacer = RatePacer(rpm)
+    # pandas reads empty answers as NaN and numeric ones as floats
+    records = [{**record, **{field: field_text(record.get(field)) for field in TEXT_FIELDS}} for record in records]
+
+    jobs, rows = [], {}
+    for evaluation_type in evaluation_types:
+        for record in records:
+            key = judge_key(judge_model, evaluation_type, record)
+            jobs.append((key, evaluation_type, record))
+            if cache.get(key):
+                rows[key] = cache.get(key)
+
+    pending = [(key, t, r) for key, t, r in jobs if key not in rows]
+    print(f"⚖️  {len(jobs)} judgments: {len(rows)} cached, {len(pending)} to run "
+          f"({concurrency} in flight, {rpm:g} rpm)")
+
+    failures = 0
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(judge_one, EVALUATION_TYPES[t].format(**r), judge_model, pacer): key
+            for key, t, r in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                rows[key] = future.result()
+                cache.put(key, rows[key])
+            except Exception as e:
+                failures += 1
+                print(f"❌ Judgment failed: {e}")
+            if done % 25 == 0 or done == len(futures):
+                print(f"   {done}/{len(futures)} done ({time.time() - start_time:.0f}s)")
+
+    if failures:
+        print(f"⚠️  {failures} judgment(s) failed; rerun to retry them")
+
+    return pd.DataFrame([
+        {
+            "Relevance": rows[key]["Relevance"],
+            "Explanation": rows[key]["Explanation"],
+            "model": record["model"],
+            "question_index": record["question_index"],
+            "evaluation_type": evaluation_type,
+        }
+        for key, evaluation_type, record in jobs if key in rows
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch LLM-as-a-Judge evaluation")
+    parser.add_argument("--answers", default=str(ANSWERS_PATH),
+                        help="CSV with model, question_index, question, answer_orig, answer_llm")
+    parser.add_argument("--output", default=str(OUTPUT_PATH))
+    parser.add_argument("--types", nargs="+", default=list(EVALUATION_TYPES), choices=list(EVALUATION_TYPES))
+    parser.add_argument("--sample", type=int, default=None, help="Judge only the first N questions per model")
+    parser.add_argument("--judge-model", default=JUDGE_MODEL)
+    parser.add_argument("--concurrency", type=int, default=JUDGE_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=JUDGE_RPM)
+    args = parser.parse_args()
+
+    answers = pd.read_csv(args.answers)
+    if args.sample:
+        answers = answers[answers["question_index"] < args.sample]
+
+    df = run_judge(answers.to_dict(orient="records"), args.types, args.judge_model,
+                   args.concurrency, args.rpm)
+    df.to_csv(args.output, index=False)
+
+    print(f"\n✅ Saved {len(df)} evaluations to: {args.output}")
+    print(df.groupby(["evaluation_type", "model", "Relevance"]).size().unstack(fill_value=0))
+
+if __name__ == "__main__":
+    main()
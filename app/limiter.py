@@ -0,0 +1,280 @@
+# limiter.py - Per-model Concurrency Limits, FIFO Request Queue and Ollama Keep-alive
+import os
+import time
+import asyncio
+import fnmatch
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager, asynccontextmanager
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Callable
+
+import httpx
+import numpy as np
+
+from metrics import record_queue_wait
+
+# Max requests in flight per model pattern, e.g. "ollama/*=2,openai/gpt-4o=8" (unlisted models are unlimited)
+LLM_MAX_INFLIGHT = os.getenv("LLM_MAX_INFLIGHT", "ollama/*=2")
+# Requests allowed to wait per model, and the longest a request may wait for a slot (seconds)
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434/v1/")
+# Ollama models to load at startup and keep loaded, e.g. "ollama/phi3"
+OLLAMA_WARM_MODELS = os.getenv("OLLAMA_WARM_MODELS", "")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Seconds between keep-alive pings (0 = warm up once only)
+OLLAMA_PING_INTERVAL = float(os.getenv("OLLAMA_PING_INTERVAL", "300"))
+
+class LimiterRejected(RuntimeError):
+    """A request was turned away instead of being sent to an overloaded model"""
+
+class QueueFullError(LimiterRejected):
+    """The model's queue is full, or the expected wait is already past the deadline"""
+
+class QueueTimeoutError(LimiterRejected):
+    """The request waited in the queue longer than its deadline"""
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Parse "pattern=N,..." into {pattern: N}"""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        pattern, _, value = entry.partition("=")
+        limits[pattern.strip()] = int(value)
+    return limits
+
+class _Waiter:
+    __slots__ = ("event", "granted", "wake")
+
+    def __init__(self, wake: Optional[Callable[[], None]] = None):
+        self.event = threading.Event()
+        self.granted = False
+        # Called (from the releasing thread) when the slot is handed over; used by async waiters
+        self.wake = wake
+
+class ModelLimiter:
+    """
+    At most `max_inflight` concurrent calls; the rest wait in a FIFO queue
+
+    A freed slot is handed straight to the oldest waiter. Requests are
+    rejected immediately when the queue is full or when the expected wait
+    (queue position x observed call time / slots) exceeds the deadline,
+    and rejected after waiting when the deadline passes.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int = LLM_QUEUE_SIZE,
+                 timeout: float = LLM_QUEUE_TIMEOUT, window: int = 200):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.inflight = 0
+        self.queue: "deque[_Waiter]" = deque()
+        self.service_time: Optional[float] = None
+        self.waits = deque(maxlen=window)
+        self.counters = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def expected_wait(self) -> float:
+        """Rough wait for a request joining the back of the queue now (caller holds the lock)"""
+        if self.service_time is None:
+            return 0.0
+        return (len(self.queue) + 1) * self.service_time / self.max_inflight
+
+    def _admit_or_enqueue(self, waiter: _Waiter, timeout: float) -> bool:
+        """Take a free slot (True) or join the queue (False); raises QueueFullError"""
+        with self.lock:
+            if self.inflight < self.max_inflight and not self.queue:
+                self.inflight += 1
+                self.counters["admitted"] += 1
+                self.waits.append(0.0)
+                return True
+            if len(self.queue) >= self.max_queue or self.expected_wait() > timeout:
+                self.counters["rejected_queue_full"] += 1
+                raise QueueFullError(f"queue full ({len(self.queue)} waiting, ~{self.expected_wait():.0f}s)")
+            self.queue.append(waiter)
+            self.counters["queued"] += 1
+            return False
+
+    def _finish_wait(self, waiter: _Waiter, waited: float) -> float:
+        """Leave the queue after waiting: count the admission, or raise QueueTimeoutError"""
+        with self.lock:
+            if not waiter.granted:
+                self.queue.remove(waiter)
+                self.counters["rejected_timeout"] += 1
+                raise QueueTimeoutError(f"no slot after {waited:.1f}s in the queue")
+            self.counters["admitted"] += 1
+            self.counters["queue_wait_seconds"] += waited
+            self.waits.append(waited)
+        return waited
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Take a slot, waiting in line if needed
+
+        Returns:
+            Seconds spent waiting in the queue
+
+        Raises:
+            QueueFullError: queue full or expected wait beyond the deadline (no wait)
+            QueueTimeoutError: no slot within the deadline
+        """
+        timeout = self.timeout if timeout is None else timeout
+        waiter = _Waiter()
+        if self._admit_or_enqueue(waiter, timeout):
+            return 0.0
+
+        start_time = time.time()
+        waiter.event.wait(timeout)
+        return self._finish_wait(waiter, time.time() - start_time)
+
+    async def aacquire(self, timeout: Optional[float] = None) -> float:
+        """acquire() for coroutines: waits in the same FIFO queue without blocking the event loop"""
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+            except RuntimeError:
+                pass  # Loop already closed; nobody is waiting any more
+
+        waiter = _Waiter(wake)
+        if self._admit_or_enqueue(waiter, timeout):
+            return 0.0
+
+        start_time = time.time()
+        try:
+            await asyncio.wait_for(granted, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Give up our place, or the slot if it was handed over meanwhile
+            with self.lock:
+                handed_over = waiter.granted
+                if not handed_over:
+                    self.queue.remove(waiter)
+            if handed_over:
+                self.release(time.time() - start_time)
+            raise
+        return self._finish_wait(waiter, time.time() - start_time)
+
+    def release(self, held: float):
+        """Free a slot (held = seconds the slot was used), handing it to the next waiter"""
+        with self.lock:
+            self.service_time = held if self.service_time is None else 0.8 * self.service_time + 0.2 * held
+            if self.queue:
+                waiter = self.queue.popleft()
+                waiter.granted = True
+                waiter.event.set()
+                if waiter.wake:
+                    waiter.wake()
+            else:
+                self.inflight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            waits = list(self.waits)
+            return {
+                "max_inflight": self.max_inflight,
+                "inflight": self.inflight,
+                "queue_depth": len(self.queue),
+                "service_time": self.service_time,
+                "p50_queue_wait": float(np.percentile(waits, 50)) if waits else None,
+                "p95_queue_wait": float(np.percentile(waits, 95)) if waits else None,
+                **self.counters,
+            }
+
+# One limiter per model, created on first use from LLM_MAX_INFLIGHT
+_limits = parse_limits(LLM_MAX_INFLIGHT)
+_limiters: Dict[str, Optional[ModelLimiter]] = {}
+_lock = threading.Lock()
+
+def limiter_for(model: str) -> Optional[ModelLimiter]:
+    """The model's limiter, or None when the model has no in-flight limit"""
+    with _lock:
+        if model not in _limiters:
+            limit = next((n for pattern, n in _limits.items() if fnmatch.fnmatch(model, pattern)), 0)
+            _limiters[model] = ModelLimiter(limit) if limit > 0 else None
+        return _limiters[model]
+
+@contextmanager
+def model_slot(model: str) -> Iterator[float]:
+    """Hold one of the model's in-flight slots; yields the seconds spent queueing"""
+    limiter = limiter_for(model)
+    if limiter is None:
+        yield 0.0
+        return
+    waited = limiter.acquire()
+    record_queue_wait(model, waited)
+    start_time = time.time()
+    try:
+        yield waited
+    finally:
+        limiter.release(time.time() - start_time)
+
+@asynccontextmanager
+async def amodel_slot(model: str) -> AsyncIterator[float]:
+    """model_slot() for coroutines; async and threaded callers share the model's slots"""
+    limiter = limiter_for(model)
+    if limiter is None:
+        yield 0.0
+        return
+    waited = await limiter.aacquire()
+    record_queue_wait(model, waited)
+    start_time = time.time()
+    try:
+        yield waited
+    finally:
+        limiter.release(time.time() - start_time)
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Queue depth, queue wait percentiles and admit/reject counters per limited model"""
+    with _lock:
+        limiters = {model: limiter for model, limiter in _limiters.items() if limiter}
+    return {model: limiter.stats() for model, limiter in sorted(limiters.items())}
+
+def ollama_api_url(base_url: str = OLLAMA_URL) -> str:
+    """Native Ollama API root from the OpenAI-compatible /v1/ URL"""
+    base_url = base_url.rstrip("/")
+    return base_url[:-len("/v1")] if base_url.endswith("/v1") else base_url
+
+def warm_up(model: str, keep_alive: str = OLLAMA_KEEP_ALIVE, base_url: str = OLLAMA_URL) -> bool:
+    """
+    Load an Ollama model and (re)set how long it stays loaded
+
+    An empty /api/generate request loads the model without generating.
+
+    Returns:
+        True if Ollama accepted the request
+    """
+    name = model.split("/", 1)[-1]
+    try:
+        response = httpx.post(f"{ollama_api_url(base_url)}/api/generate",
+                              json={"model": name, "prompt": "", "keep_alive": keep_alive}, timeout=120)
+        return response.status_code == 200
+    except httpx.HTTPError as e:
+        print(f"⚠️  Ollama warm-up for {model} failed: {e}")
+        return False
+
+def start_keepalive(models: List[str], interval: float = OLLAMA_PING_INTERVAL) -> Optional[threading.Thread]:
+    """
+    Warm up Ollama models in the background, then ping them every `interval` seconds
+
+    Returns:
+        The pinging thread, or None when there is nothing to warm
+    """
+    if not models:
+        return None
+
+    def run():
+        while True:
+            for model in models:
+                warm_up(model)
+            if interval <= 0:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="ollama-keepalive", daemon=True)
+    thread.start()
+    return thread
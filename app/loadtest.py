@@ -0,0 +1,430 @@
+# loadtest.py - Load Generator and Latency Benchmark for the RAG Pipeline
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import resource
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from itertools import cycle, islice
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "results"
+
+# Stages reported in the summary, in pipeline order
+STAGES = ["queue", "search", "rerank", "llm", "evaluation", "db_write", "total"]
+
+def load_questions(n: int, seed: int = 42) -> List[str]:
+    """Ground-truth questions in a shuffled order, repeated until there are n of them"""
+    from retrieval_eval import load_ground_truth
+
+    questions = load_ground_truth()["question"].tolist()
+    random.Random(seed).shuffle(questions)
+    return list(islice(cycle(questions), n))
+
+def run_request(
+    question: str,
+    model_choice: str,
+    search_type: str,
+    target: str,
+    scheduled_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Send one question through the pipeline and time each stage
+
+    Args:
+        question: User question
+        model_choice: LLM model to use
+        search_type: "semantic" or "hybrid"
+        target: "rag" (get_answer only) or "app" (get_answer + save_conversation)
+        scheduled_at: When an open-loop request was due; the wait until it
+            actually started is reported as the "queue" stage
+
+    Returns:
+        Record with per-stage timings (seconds) and the error, if any
+    """
+    import rag
+    from tracing import span
+
+    start_time = time.time()
+    record = {"question": question, "error": None}
+    if scheduled_at is not None:
+        record["queue"] = start_time - scheduled_at
+
+    try:
+        with span("question", question=question, model=model_choice, search_type=search_type, loadtest=True):
+            answer_data = rag.get_answer(question, model_choice, search_type)
+            record_answer(record, answer_data)
+
+            if target == "app":
+                from db import save_conversation
+
+                db_start = time.time()
+                save_conversation(str(uuid.uuid4()), question, answer_data)
+                record["db_write"] = time.time() - db_start
+    except Exception as e:
+        record["error"] = type(e).__name__
+
+    record["total"] = time.time() - (scheduled_at if scheduled_at is not None else start_time)
+    return record
+
+async def arun_request(
+    question: str,
+    model_choice: str,
+    search_type: str,
+    target: str,
+    scheduled_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """run_request through the async pipeline (aget_answer + asave_conversation)"""
+    import rag
+    from tracing import span
+
+    start_time = time.time()
+    record = {"question": question, "error": None}
+    if scheduled_at is not None:
+        record["queue"] = start_time - scheduled_at
+
+    try:
+        with span("question", question=question, model=model_choice, search_type=search_type, loadtest=True):
+            answer_data = await rag.aget_answer(question, model_choice, search_type)
+            record_answer(record, answer_data)
+
+            if target == "app":
+                from db import asave_conversation
+
+                db_start = time.time()
+                await asave_conversation(str(uuid.uuid4()), question, answer_data)
+                record["db_write"] = time.time() - db_start
+    except Exception as e:
+        record["error"] = type(e).__name__
+
+    record["total"] = time.time() - (scheduled_at if scheduled_at is not None else start_time)
+    return record
+
+def record_answer(record: Dict[str, Any], answer_data: Dict[str, Any]):
+    """Copy stage timings and token usage into a record and classify failed answers"""
+    record.update(answer_data.get("stage_timings", {}))
+    record["prompt_tokens"] = answer_data["prompt_tokens"]
+    record["cached_tokens"] = answer_data.get("cached_tokens", 0)
+    if answer_data["answer"].startswith("Sorry, I encountered an error"):
+        record["error"] = "llm_error"
+    elif answer_data["answer"].startswith("Sorry, the model is busy"):
+        record["error"] = "llm_busy"
+    elif answer_data["relevance"] == "UNKNOWN":
+        record["error"] = "evaluation_error"
+
+def run_closed_loop(questions: List[str], concurrency: int, **kwargs) -> List[Dict[str, Any]]:
+    """Closed loop: `concurrency` users, each sending its next question as soon as the last returns"""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda q: run_request(q, **kwargs), questions))
+
+async def arun_closed_loop(questions: List[str], concurrency: int, **kwargs) -> List[Dict[str, Any]]:
+    """run_closed_loop with one coroutine per user instead of one thread"""
+    users = asyncio.Semaphore(concurrency)
+
+    async def send(question: str) -> Dict[str, Any]:
+        async with users:
+            return await arun_request(question, **kwargs)
+
+    return list(await asyncio.gather(*(send(q) for q in questions)))
+
+def run_open_loop(questions: List[str], rps: float, max_in_flight: int, **kwargs) -> List[Dict[str, Any]]:
+    """
+    Open loop: start requests at a fixed rate regardless of how fast they finish
+
+    Latency is measured from each request's scheduled start, so time spent
+    waiting for a free worker counts against the pipeline.
+    """
+    start_time = time.time()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i, question in enumerate(questions):
+            scheduled_at = start_time + i / rps
+            delay = scheduled_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(run_request, question, scheduled_at=scheduled_at, **kwargs))
+        return [future.result() for future in futures]
+
+async def arun_open_loop(questions: List[str], rps: float, max_in_flight: int, **kwargs) -> List[Dict[str, Any]]:
+    """run_open_loop with coroutines; at most max_in_flight requests run at once"""
+    start_time = time.time()
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def send(i: int, question: str) -> Dict[str, Any]:
+        scheduled_at = start_time + i / rps
+        await asyncio.sleep(max(0.0, scheduled_at - time.time()))
+        async with in_flight:
+            return await arun_request(question, scheduled_at=scheduled_at, **kwargs)
+
+    return list(await asyncio.gather(*(send(i, q) for i, q in enumerate(questions))))
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max in milliseconds"""
+    arr = np.asarray(values) * 1000
+    return {
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "mean": float(arr.mean()),
+        "max": float(arr.max()),
+    }
+
+def summarize(records: List[Dict[str, Any]], wall_time: float, usage_before, usage_after,
+              peak_threads: int) -> Dict[str, Any]:
+    """Throughput, error rates, per-stage latency percentiles and resource usage"""
+    df = pd.DataFrame(records)
+    ok = df["error"].isna()
+    errors = df.loc[~ok, "error"].value_counts().to_dict()
+
+    cpu_time = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        "requests": len(df),
+        "successful": int(ok.sum()),
+        "error_rate": float(1 - ok.mean()),
+        "errors": {str(k): int(v) for k, v in errors.items()},
+        "wall_time": wall_time,
+        "throughput_rps": len(df) / wall_time if wall_time > 0 else 0.0,
+        "successful_rps": float(ok.sum()) / wall_time if wall_time > 0 else 0.0,
+        # Latency of successful requests only; failures are often fast and skew the tail
+        "latency_ms": {
+            stage: percentiles(df.loc[ok, stage].dropna().tolist())
+            for stage in STAGES if stage in df and df.loc[ok, stage].notna().any()
+        },
+        # Share of prompt tokens the provider served from its prefix cache
+        "cached_token_ratio": (
+            float(df["cached_tokens"].sum() / df["prompt_tokens"].sum())
+            if "prompt_tokens" in df and df["prompt_tokens"].sum() > 0 else 0.0
+        ),
+        "resources": {
+            "cpu_seconds": cpu_time,
+            "cpu_utilization": cpu_time / wall_time if wall_time > 0 else 0.0,
+            "peak_rss_mb": usage_after.ru_maxrss / 1024,
+            "peak_threads": peak_threads,
+        },
+    }
+
+def load_test(
+    requests: int = 100,
+    concurrency: Optional[int] = 4,
+    rps: Optional[float] = None,
+    max_in_flight: int = 64,
+    target: str = "rag",
+    model_choice: str = "openai/gpt-4o-mini",
+    search_type: str = "semantic",
+    warmup: int = 2,
+    pipeline: str = "sync",
+) -> Dict[str, Any]:
+    """
+    Replay ground-truth questions through the pipeline and report latency
+
+    Args:
+        requests: Number of measured requests
+        concurrency: Closed-loop concurrent users (ignored when rps is set)
+        rps: Open-loop arrival rate in requests per second
+        max_in_flight: Worker cap for open-loop runs
+        target: "rag" or "app" (also writes each conversation to PostgreSQL)
+        model_choice: LLM model to use
+        search_type: "semantic" or "hybrid"
+        warmup: Unmeasured requests sent first (model loading, connections)
+        pipeline: "sync" (get_answer on threads) or "async" (aget_answer on one event loop)
+
+    Returns:
+        Summary dictionary (also written to results/loadtest_<timestamp>.json)
+    """
+    questions = load_questions(requests + warmup)
+    kwargs = {"model_choice": model_choice, "search_type": search_type, "target": target}
+    mode = f"open loop at {rps} rps" if rps else f"closed loop with {concurrency} users"
+    print(f"🔥 Load test: {requests} requests, {mode}, target={target}, "
+          f"model={model_choice}, search={search_type}, pipeline={pipeline}")
+
+    def measure_sync():
+        for question in questions[:warmup]:
+            run_request(question, **kwargs)
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        start_time = time.time()
+        if rps:
+            records = run_open_loop(questions[warmup:], rps, max_in_flight, **kwargs)
+        else:
+            records = run_closed_loop(questions[warmup:], concurrency, **kwargs)
+        return records, time.time() - start_time, usage_before, resource.getrusage(resource.RUSAGE_SELF)
+
+    async def measure_async():
+        # Warm-up and measurement share one event loop, which the async clients are bound to
+        for question in questions[:warmup]:
+            await arun_request(question, **kwargs)
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        start_time = time.time()
+        if rps:
+            records = await arun_open_loop(questions[warmup:], rps, max_in_flight, **kwargs)
+        else:
+            records = await arun_closed_loop(questions[warmup:], concurrency, **kwargs)
+        wall_time = time.time() - start_time
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        if target == "app":
+            from db import close_async_pool
+
+            await close_async_pool()
+        return records, wall_time, usage_before, usage_after
+
+    # Sample the thread count while the test runs
+    peak_threads = threading.active_count()
+    done = threading.Event()
+
+    def sample_threads():
+        nonlocal peak_threads
+        while not done.wait(0.1):
+            peak_threads = max(peak_threads, threading.active_count())
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+
+    if pipeline == "async":
+        records, wall_time, usage_before, usage_after = asyncio.run(measure_async())
+    else:
+        records, wall_time, usage_before, usage_after = measure_sync()
+    done.set()
+    sampler.join()
+
+    import rag
+    import limiter
+    import tracing
+
+    summary = {
+        "target": target,
+        "pipeline": pipeline,
+        "mode": "open" if rps else "closed",
+        "rps": rps,
+        "concurrency": None if rps else concurrency,
+        "model": model_choice,
+        "search_type": search_type,
+        "offline": os.getenv("QDRANT_URL") == ":memory:",
+        "cassette_mode": os.getenv("LLM_CASSETTE_MODE", "off"),
+        **summarize(records, wall_time, usage_before, usage_after, peak_threads),
+        "llm_queues": limiter.stats(),
+        "singleflight": rag.answer_flight.stats(),
+        "retrieval_cache_enabled": rag.retrieval_cache is not None,
+        "retrieval_cache": rag.retrieval_cache.stats() if rag.retrieval_cache else None,
+        "tracing": tracing.stats(),
+        "timestamp": datetime.now().isoformat(),
+    }
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    stem = f"loadtest_{pipeline}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    with open(RESULTS_DIR / f"{stem}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    pd.DataFrame(records).to_csv(RESULTS_DIR / f"{stem}.csv", index=False)
+
+    print(f"   Throughput: {summary['throughput_rps']:.2f} req/s "
+          f"({summary['successful_rps']:.2f} successful), error rate {summary['error_rate']:.1%}")
+    print(f"   Cached prompt tokens: {summary['cached_token_ratio']:.1%}, "
+          f"coalesced requests: {summary['singleflight']['coalesced_ratio']:.1%}")
+    for stage, stats in summary["latency_ms"].items():
+        print(f"   {stage:<11} p50 {stats['p50']:8.1f} | p95 {stats['p95']:8.1f} | p99 {stats['p99']:8.1f} ms")
+    resources = summary["resources"]
+    print(f"   CPU {resources['cpu_seconds']:.1f}s ({resources['cpu_utilization']:.0%}), "
+          f"peak RSS {resources['peak_rss_mb']:.0f} MB, peak threads {resources['peak_threads']}")
+    for model, queue in summary["llm_queues"].items():
+        p95_wait = "-" if queue["p95_queue_wait"] is None else f"{queue['p95_queue_wait'] * 1000:.0f} ms"
+        print(f"   {model} queue: p95 wait {p95_wait}, {queue.get('rejected_queue_full', 0):.0f} rejected full, "
+              f"{queue.get('rejected_timeout', 0):.0f} timed out")
+    print(f"✅ Results saved to: {RESULTS_DIR / stem}.json / .csv")
+    return summary
+
+def compare_pipelines(**kwargs) -> Dict[str, Any]:
+    """
+    Run the same load through the sync and the async pipeline
+
+    Returns:
+        Both summaries and the async/sync ratios (also written to
+        results/loadtest_compare_<timestamp>.json)
+    """
+    sync_summary = load_test(pipeline="sync", **kwargs)
+    async_summary = load_test(pipeline="async", **kwargs)
+
+    def ratio(key: str) -> Optional[float]:
+        return async_summary[key] / sync_summary[key] if sync_summary[key] else None
+
+    comparison = {
+        "throughput_gain": ratio("successful_rps"),
+        "p95_latency_ratio": (
+            async_summary["latency_ms"]["total"]["p95"] / sync_summary["latency_ms"]["total"]["p95"]
+            if "total" in sync_summary["latency_ms"] and "total" in async_summary["latency_ms"] else None
+        ),
+        "peak_threads": {"sync": sync_summary["resources"]["peak_threads"],
+                         "async": async_summary["resources"]["peak_threads"]},
+        "sync": sync_summary,
+        "async": async_summary,
+    }
+
+    path = RESULTS_DIR / f"loadtest_compare_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(comparison, f, indent=2)
+    gain = "-" if comparison["throughput_gain"] is None else f"{comparison['throughput_gain']:.2f}x"
+    print(f"⚖️  Async vs sync: throughput {gain}, peak threads "
+          f"{comparison['peak_threads']['async']} vs {comparison['peak_threads']['sync']}")
+    print(f"✅ Comparison saved to: {path}")
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the RAG pipeline")
+    parser.add_argument("--requests", type=int, default=100)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="Closed-loop concurrent users")
+    load.add_argument("--rps", type=float, default=None, help="Open-loop target requests per second")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--target", choices=["rag", "app"], default="rag",
+                        help="rag: get_answer only; app: get_answer + PostgreSQL write")
+    parser.add_argument("--model", default="openai/gpt-4o-mini")
+    parser.add_argument("--search-type", choices=["semantic", "hybrid"], default="semantic")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--pipeline", choices=["sync", "async", "both"], default="sync",
+                        help="sync: get_answer on threads; async: aget_answer on an event loop; both: compare them")
+    parser.add_argument("--offline", action="store_true",
+                        help="Use the stand-in LLM and an in-memory Qdrant (see standins.py)")
+    parser.add_argument("--llm-latency", type=float, default=None, help="Stand-in LLM mean latency (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=None, help="Stand-in LLM failure rate")
+    parser.add_argument("--retrieval-cache", action="store_true",
+                        help="Serve repeated searches from the retrieval cache (off so searches are measured)")
+    args = parser.parse_args()
+
+    if not args.retrieval_cache:
+        # Cache hits would stand in for the Qdrant searches being measured; set before
+        # anything imports rag (use_offline_services() requires that too)
+        os.environ["RETRIEVAL_CACHE"] = "off"
+
+    if args.offline:
+        import standins
+
+        standins.use_offline_services(
+            latency=args.llm_latency if args.llm_latency is not None else standins.STUB_LATENCY,
+            error_rate=args.llm_error_rate if args.llm_error_rate is not None else standins.STUB_ERROR_RATE,
+        )
+        print(f"📄 Indexed {standins.index_local_qdrant()} documents into the in-memory collection")
+
+    kwargs = dict(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        rps=args.rps,
+        max_in_flight=args.max_in_flight,
+        target=args.target,
+        model_choice=args.model,
+        search_type=args.search_type,
+        warmup=args.warmup,
+    )
+    if args.pipeline == "both":
+        compare_pipelines(**kwargs)
+    else:
+        load_test(pipeline=args.pipeline, **kwargs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# metrics.py - In-process Prometheus Metrics (stage latency histograms, token/cost/error counters, gauges)
+import os
+import json
+import math
+import time
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Callable, Optional, Iterable
+
+# Directory shared by the API workers: each one publishes its metrics there so that
+# whichever worker answers a scrape returns all of them (empty = this process only)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+
+# Seconds; covers a cache hit (a few ms) up to a slow local LLM
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], Any] = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def set(self, value: float, **labels):
+        """Set the value (counters: to a cumulative count kept elsewhere, e.g. a stats() dict)"""
+        with self.lock:
+            self.values[self._key(labels)] = float(value)
+
+    def samples(self) -> List[Sample]:
+        with self.lock:
+            return [(self.name, self._labels(key), value) for key, value in self.values.items()]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, value: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, value: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def dec(self, value: float = 1.0, **labels):
+        self.inc(-value, **labels)
+
+    def clear(self):
+        """Forget all label sets (collectors refill them on every scrape)"""
+        with self.lock:
+            self.values.clear()
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def set(self, value: float, **labels):
+        raise TypeError("Histograms are observed, not set")
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self.lock:
+            for key, (counts, total) in self.values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+_registry: Dict[str, _Metric] = {}
+_collectors: List[Callable[[], None]] = []
+_registry_lock = threading.Lock()
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        if metric.name in _registry:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        _registry[metric.name] = metric
+    return metric
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return _register(Gauge(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+def register_collector(collect: Callable[[], None]):
+    """Run `collect` before every scrape/publish, e.g. to copy stats() values into gauges"""
+    with _registry_lock:
+        _collectors.append(collect)
+
+# Pipeline metrics; stages are the tracing span names (question, embed, qdrant_query, llm, judge, db_write...)
+STAGE_SECONDS = histogram("rag_stage_duration_seconds", "Time spent per pipeline stage", ["stage"])
+STAGE_ERRORS = counter("rag_stage_errors_total", "Pipeline stages that failed (raised or recorded an error)", ["stage"])
+LLM_REQUESTS = counter("rag_llm_requests_total", "LLM calls by the model that answered", ["model"])
+LLM_TOKENS = counter("rag_llm_tokens_total", "LLM tokens by kind (prompt, completion, cached)", ["model", "kind"])
+LLM_COST = counter("rag_llm_cost_usd_total", "Estimated LLM cost in USD", ["model"])
+LLM_ERRORS = counter("rag_llm_errors_total", "Failed LLM calls by exception type", ["model", "error"])
+CACHE_REQUESTS = counter("rag_cache_requests_total", "Cache lookups by result (hit, miss)", ["cache", "result"])
+LIMITER_QUEUE_WAIT = histogram("rag_limiter_queue_wait_seconds",
+                               "Time LLM calls waited for one of the model's in-flight slots", ["model"])
+
+def observe_stage(stage: str, seconds: float, error: bool = False):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if error:
+        STAGE_ERRORS.inc(stage=stage)
+
+def record_llm(model: str, tokens: Dict[str, int], cost: float, error: Optional[BaseException] = None):
+    """Count one LLM call: tokens and cost, or the error it failed with"""
+    LLM_REQUESTS.inc(model=model)
+    if error is not None:
+        LLM_ERRORS.inc(model=model, error=type(error).__name__)
+    for kind in ("prompt", "completion", "cached"):
+        if tokens.get(f"{kind}_tokens"):
+            LLM_TOKENS.inc(tokens[f"{kind}_tokens"], model=model, kind=kind)
+    if cost:
+        LLM_COST.inc(cost, model=model)
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def record_queue_wait(model: str, seconds: float):
+    LIMITER_QUEUE_WAIT.observe(seconds, model=model)
+
+def collect() -> List[Dict[str, Any]]:
+    """This process's metric families, after running the collectors"""
+    with _registry_lock:
+        collectors, metrics = list(_collectors), list(_registry.values())
+    for collect_fn in collectors:
+        try:
+            collect_fn()
+        except Exception as e:
+            print(f"⚠️  Metrics collector {getattr(collect_fn, '__name__', collect_fn)} failed: {e}")
+    return [
+        {"name": m.name, "type": m.type, "help": m.documentation, "samples": m.samples()}
+        for m in metrics
+    ]
+
+def _publish_path(pid: int) -> Path:
+    return Path(METRICS_DIR) / f"worker_{pid}.json"
+
+def publish():
+    """Write this worker's metrics to METRICS_DIR for the other workers' scrapes"""
+    path = _publish_path(os.getpid())
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"time": time.time(), "families": collect()}))
+    tmp_path.replace(path)
+
+def _published_families(max_age: float) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Other live workers' metrics from METRICS_DIR, with their worker (pid) label"""
+    workers = []
+    for path in Path(METRICS_DIR).glob("worker_*.json"):
+        pid = path.stem.split("_", 1)[1]
+        if pid == str(os.getpid()):
+            continue
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if time.time() - snapshot["time"] > max_age:
+            continue  # Worker exited (or stalled); drop its series
+        workers.append((pid, snapshot["families"]))
+    return workers
+
+def render() -> str:
+    """
+    Metrics in the Prometheus text format
+
+    With METRICS_DIR set, every sample gets a worker label and the other
+    workers' last published metrics are included, so sum() over worker
+    gives the service total whichever worker was scraped.
+    """
+    if not METRICS_DIR:
+        workers = [(None, collect())]
+    else:
+        workers = [(str(os.getpid()), collect())] + _published_families(max_age=4 * METRICS_PUBLISH_INTERVAL)
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for worker, families in workers:
+        for family in families:
+            entry = merged.setdefault(family["name"], {**family, "samples": []})
+            for name, labels, value in family["samples"]:
+                if worker is not None:
+                    labels = {"worker": worker, **labels}
+                entry["samples"].append((name, labels, value))
+
+    lines = []
+    for family in merged.values():
+        lines.append(f"# HELP {family['name']} {family['help']}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        for name, labels, value in family["samples"]:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+_publisher: Optional[threading.Thread] = None
+
+def start_publisher(interval: float = METRICS_PUBLISH_INTERVAL) -> Optional[threading.Thread]:
+    """
+    Publish this worker's metrics every `interval` seconds (no-op without METRICS_DIR)
+
+    Returns:
+        The publishing thread, or None when METRICS_DIR is not set
+    """
+    global _publisher
+    if not METRICS_DIR:
+        return None
+    if _publisher is not None:
+        return _publisher
+    Path(METRICS_DIR).mkdir(parents=True, exist_ok=True)
+
+    def run():
+        while True:
+            try:
+                publish()
+            except OSError as e:
+                print(f"⚠️  Publishing metrics to {METRICS_DIR} failed: {e}")
+            time.sleep(interval)
+
+    _publisher = threading.Thread(target=run, name="metrics-publisher", daemon=True)
+    _publisher.start()
+    return _publisher
+
+def stop_publisher():
+    """Remove this worker's published metrics (on shutdown)"""
+    if METRICS_DIR:
+        _publish_path(os.getpid()).unlink(missing_ok=True)
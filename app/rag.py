@@ -1,121 +1,374 @@
 # rag.py - RAG Logic Module (FIXED VERSION)
 
 import os
+import re
 import time
 import json
-from typing import List, Dict, Any
-from openai import OpenAI
-from qdrant_client import QdrantClient, models
+import random
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, AsyncExitStack, contextmanager, asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterator, AsyncIterator
+from openai import OpenAI, AsyncOpenAI
+from qdrant_client import QdrantClient, AsyncQdrantClient, models
+from fastembed import TextEmbedding, SparseTextEmbedding
 from sentence_transformers import SentenceTransformer
 
+from cassette import Cassette
+from router import Router
+from resilience import call_with_resilience, acall_with_resilience
+from limiter import model_slot, amodel_slot, start_keepalive, LimiterRejected, OLLAMA_WARM_MODELS
+from singleflight import SingleFlight, LeaderAborted, normalize_query
+from tracing import span
+from metrics import record_llm, record_cache
+from relevance_scorer import RelevanceScorer, context_text
+from reranker import Reranker, RERANK_CANDIDATES, RERANK_TOP_N
+from retrieval_cache import RetrievalCache
+
 # Environment variables
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-api-key-here")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434/v1/")
 
-# Initialize clients
+# Per-request LLM timeout in seconds
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Initialize clients (retries are handled by resilience.call_with_resilience)
 qdrant_client = QdrantClient(QDRANT_URL)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-ollama_client = OpenAI(base_url=OLLAMA_URL, api_key="ollama")
+openai_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0, timeout=LLM_TIMEOUT)
+ollama_client = OpenAI(base_url=OLLAMA_URL, api_key="ollama", max_retries=0, timeout=LLM_TIMEOUT)
+
+# Async clients for the a*-prefixed pipeline (aget_answer etc.); their connection
+# pools belong to the event loop that first uses them, so use one loop per process
+async_qdrant_client = AsyncQdrantClient(QDRANT_URL)
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0, timeout=LLM_TIMEOUT)
+async_ollama_client = AsyncOpenAI(base_url=OLLAMA_URL, api_key="ollama", max_retries=0, timeout=LLM_TIMEOUT)
+
+# Load local models before the first request and keep them loaded (OLLAMA_WARM_MODELS)
+start_keepalive([m.strip() for m in OLLAMA_WARM_MODELS.split(",") if m.strip()])
+
+# Record/replay store for LLM calls (None unless LLM_CASSETTE_MODE is record or replay)
+llm_cassette = Cassette.from_env()
+
+# Hedging/fallback across models (None unless LLM_FALLBACKS is set); losing hedges that
+# still ran to completion are counted with their tokens and cost
+llm_router = Router.from_env(
+    lambda prompt, model_choice, system_prompt=None: complete(prompt, model_choice, system_prompt),
+    on_abandoned=lambda model, tokens: record_llm(model, tokens, calculate_openai_cost(model, tokens))
+)
 
 # Initialize embedding model (matching your notebooks)
 embedding_model = SentenceTransformer("jinaai/jina-embeddings-v2-small-en")
 
+# Cross-encoder rerank stage (None unless RERANK_ENABLED is set)
+reranker = Reranker.from_env()
+
+# Search results shared by the processes using the same store (None when RETRIEVAL_CACHE=off)
+retrieval_cache = RetrievalCache.from_env()
+
+# Results passed to the prompt without reranking
+SEARCH_LIMIT = 5
+
 # Collection name for documents
 COLLECTION_NAME = "travel-docs"
 
-def qdrant_search(query: str, search_type: str = "semantic", limit: int = 5) -> List[Dict]:
+# Query models of the "jina-small" and "bm25" named vectors
+DENSE_MODEL = "jinaai/jina-embeddings-v2-small-en"
+SPARSE_MODEL = "Qdrant/bm25"
+
+# Known values of the "location" payload (one per source PDF in data/raw)
+KNOWN_LOCATIONS = [
+    "Andhra_Pradesh",
+    "Karnataka",
+    "Forts_and_palaces",
+    "Hill_stations",
+    "Indian_national_parks_and_wildlife_sanctuaries",
+    "Indian_zoos_and_botanical_gardens",
+    "Natural_wonders",
+    "Sacred_sites",
+    "UNESCO_World_Heritage_List",
+]
+
+# Extra spellings users type; "India" is left out since every document matches it
+LOCATION_ALIASES = {
+    "Andhra_Pradesh": ["andhra", "andra pradesh"],
+    "Indian_national_parks_and_wildlife_sanctuaries": ["national parks", "wildlife sanctuaries"],
+    "Indian_zoos_and_botanical_gardens": ["zoos", "botanical gardens"],
+    "UNESCO_World_Heritage_List": ["unesco", "world heritage"],
+}
+
+# Apply a location filter automatically when the question names a known location
+AUTO_LOCATION_FILTER = os.getenv("AUTO_LOCATION_FILTER", "true").lower() == "true"
+
+def detect_locations(query: str) -> List[str]:
     """
-    Perform search using Qdrant vector database
+    Detect known locations mentioned in a question
+
+    Args:
+        query: User question
+
+    Returns:
+        Matching "location" payload values (empty if none)
+    """
+    text = query.lower()
+    matches = []
+    for location in KNOWN_LOCATIONS:
+        names = [location.replace("_", " ").lower()] + LOCATION_ALIASES.get(location, [])
+        if any(re.search(rf"\b{re.escape(name)}\b", text) for name in names):
+            matches.append(location)
+    return matches
+
+def location_filter(location: Optional[Union[str, List[str]]]) -> Optional[models.Filter]:
+    """Build a Qdrant payload filter for one or more locations"""
+    if not location:
+        return None
+    if isinstance(location, str):
+        match = models.MatchValue(value=location)
+    else:
+        match = models.MatchAny(any=list(location))
+    return models.Filter(must=[models.FieldCondition(key="location", match=match)])
+
+def build_search_request(
+    query: str,
+    search_type: str = "semantic",
+    limit: int = 5,
+    location: Optional[Union[str, List[str]]] = None,
+    vectors: Optional[Dict[str, Any]] = None
+) -> models.QueryRequest:
+    """
+    Build the Qdrant query for a search (shared by single and batched search)
 
     Args:
         query: Search query
         search_type: "semantic" or "hybrid"
         limit: Number of results to return
+        location: Optional location (or list of locations) to restrict the search to
+        vectors: Query embeddings already computed, keyed by model name; other
+            models are embedded by the Qdrant client from the query text
 
     Returns:
-        List of search results
+        Qdrant QueryRequest
     """
-    try:
-        if search_type == "semantic":
-            # Dense vector search (semantic) - FIXED: Added using parameter
-            results = qdrant_client.query_points(
-                collection_name=COLLECTION_NAME,
-                query=models.Document(
-                    text=query,
-                    model="jinaai/jina-embeddings-v2-small-en"
+    query_filter = location_filter(location)
+    vectors = vectors or {}
+
+    def query_input(model_name: str):
+        return vectors.get(model_name) or models.Document(text=query, model=model_name)
+
+    if search_type == "semantic":
+        # Dense vector search (semantic) - FIXED: Added using parameter
+        return models.QueryRequest(
+            query=query_input(DENSE_MODEL),
+            using="jina-small",  # FIXED: Specify the named vector to use
+            filter=query_filter,
+            limit=limit,
+            with_payload=True
+        )
+
+    elif search_type == "hybrid":
+        # Hybrid search using RRF (Reciprocal Rank Fusion) - FIXED
+        return models.QueryRequest(
+            prefetch=[
+                # Dense vector prefetch
+                models.Prefetch(
+                    query=query_input(DENSE_MODEL),
+                    using="jina-small",  # FIXED: Specify named vector
+                    filter=query_filter,
+                    limit=(5 * limit)
                 ),
-                using="jina-small",  # FIXED: Specify the named vector to use
-                limit=limit,
-                with_payload=True
-            )
+                # Sparse vector prefetch
+                models.Prefetch(
+                    query=query_input(SPARSE_MODEL),
+                    using="bm25",  # FIXED: Specify named vector
+                    filter=query_filter,
+                    limit=(5 * limit)
+                )
+            ],
+            # Apply RRF fusion
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            filter=query_filter,
+            limit=limit,
+            with_payload=True
+        )
 
-            search_results = []
-            for point in results.points:
-                search_results.append({
-                    "content": point.payload.get("content", ""),
-                    "location": point.payload.get("location", ""),
-                    "doc_id": point.payload.get("doc_id", ""),
-                    "score": point.score
-                })
-
-        elif search_type == "hybrid":
-            # Hybrid search using RRF (Reciprocal Rank Fusion) - FIXED
-            results = qdrant_client.query_points(
-                collection_name=COLLECTION_NAME,
-                prefetch=[
-                    # Dense vector prefetch
-                    models.Prefetch(
-                        query=models.Document(
-                            text=query,
-                            model="jinaai/jina-embeddings-v2-small-en"
-                        ),
-                        using="jina-small",  # FIXED: Specify named vector
-                        limit=(5 * limit)
-                    ),
-                    # Sparse vector prefetch
-                    models.Prefetch(
-                        query=models.Document(
-                            text=query,
-                            model="Qdrant/bm25"
-                        ),
-                        using="bm25",  # FIXED: Specify named vector
-                        limit=(5 * limit)
-                    )
-                ],
-                # Apply RRF fusion
-                query=models.FusionQuery(fusion=models.Fusion.RRF),
-                limit=limit,
-                with_payload=True
-            )
+    raise ValueError(f"Unknown search type: {search_type}")
 
-            search_results = []
-            for point in results.points:
-                search_results.append({
-                    "content": point.payload.get("content", ""),
-                    "location": point.payload.get("location", ""),
-                    "doc_id": point.payload.get("doc_id", ""),
-                    "score": point.score
-                })
+def _to_search_results(points) -> List[Dict]:
+    """Convert scored Qdrant points into result dictionaries"""
+    search_results = []
+    for point in points:
+        search_results.append({
+            "content": point.payload.get("content", ""),
+            "location": point.payload.get("location", ""),
+            "doc_id": point.payload.get("doc_id", ""),
+            "id": point.payload.get("id", ""),
+            "merged_ids": point.payload.get("merged_ids", []),
+            "score": point.score
+        })
+    return search_results
 
-        return search_results
+def _search_models(search_type: str) -> List[str]:
+    """Models a search embeds the query with: dense, plus sparse for hybrid"""
+    return [DENSE_MODEL, SPARSE_MODEL] if search_type == "hybrid" else [DENSE_MODEL]
+
+def _query_span(search_type: str, limit: int, location: Optional[Union[str, List[str]]]):
+    return span("qdrant_query", search_type=search_type, limit=limit, location=json.dumps(location))
+
+def _query_points_args(request: models.QueryRequest) -> Dict[str, Any]:
+    """query_points() arguments for a search request (same for the sync and async clients)"""
+    return {
+        "collection_name": COLLECTION_NAME,
+        "query": request.query,
+        "using": request.using,
+        "prefetch": request.prefetch,
+        "query_filter": request.filter,
+        "limit": request.limit,
+        "with_payload": True,
+    }
+
+def qdrant_search(
+    query: str,
+    search_type: str = "semantic",
+    limit: int = 5,
+    location: Optional[Union[str, List[str]]] = None
+) -> List[Dict]:
+    """
+    Perform search using Qdrant vector database
+
+    Args:
+        query: Search query
+        search_type: "semantic" or "hybrid"
+        limit: Number of results to return
+        location: Optional location (or list of locations) to restrict the search to
+
+    Returns:
+        List of search results
+    """
+    if retrieval_cache:
+        with span("retrieval_cache", search_type=search_type) as cache_span:
+            cached = retrieval_cache.get(COLLECTION_NAME, query, search_type, limit, location)
+            cache_span.set(hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    try:
+        # Embedded here rather than by the Qdrant client, so embedding shows up as its own span
+        vectors = {name: encode_query(name, query) for name in _search_models(search_type)}
+        with _query_span(search_type, limit, location) as query_span:
+            request = build_search_request(query, search_type, limit, location, vectors)
+            results = qdrant_client.query_points(**_query_points_args(request))
+            query_span.set(results=len(results.points))
+        search_results = _to_search_results(results.points)
 
     except Exception as e:
         print(f"Search error: {e}")
         return []
 
-def build_prompt(query: str, search_results: List[Dict]) -> str:
+    # Failed searches (above) are not cached
+    if retrieval_cache:
+        retrieval_cache.set(COLLECTION_NAME, query, search_type, limit, location, search_results)
+    return search_results
+
+def qdrant_search_batch(
+    queries: List[str],
+    search_type: str = "semantic",
+    limit: int = 5,
+    location: Optional[Union[str, List[str]]] = None
+) -> List[List[Dict]]:
     """
-    Build prompt for LLM using search results
+    Run several searches in one Qdrant round trip
 
     Args:
-        query: User question
-        search_results: Retrieved documents
+        queries: Search queries
+        search_type: "semantic" or "hybrid"
+        limit: Number of results per query
+        location: Optional location filter applied to every query
 
     Returns:
-        Formatted prompt string
+        One list of search results per query (errors propagate to the caller)
     """
-    prompt_template = """
+    requests = [build_search_request(q, search_type, limit, location) for q in queries]
+    responses = qdrant_client.query_batch_points(collection_name=COLLECTION_NAME, requests=requests)
+    return [_to_search_results(response.points) for response in responses]
+
+# fastembed query encoders for the async search, loaded on first use
+_query_encoders: Dict[str, Any] = {}
+_query_encoders_lock = threading.Lock()
+
+def encode_query(model_name: str, query: str) -> Union[List[float], models.SparseVector]:
+    """
+    Embed a search query the way the Qdrant client does for models.Document queries
+
+    Args:
+        model_name: DENSE_MODEL or SPARSE_MODEL
+        query: Search query
+
+    Returns:
+        Dense vector, or a SparseVector for SPARSE_MODEL
+    """
+    with _query_encoders_lock:
+        if model_name not in _query_encoders:
+            encoder_class = SparseTextEmbedding if model_name == SPARSE_MODEL else TextEmbedding
+            _query_encoders[model_name] = encoder_class(model_name)
+        encoder = _query_encoders[model_name]
+
+    with span("embed", model=model_name):
+        embedding = next(iter(encoder.query_embed(query)))
+    if model_name == SPARSE_MODEL:
+        return models.SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+    return embedding.tolist()
+
+async def aqdrant_search(
+    query: str,
+    search_type: str = "semantic",
+    limit: int = 5,
+    location: Optional[Union[str, List[str]]] = None
+) -> List[Dict]:
+    """
+    qdrant_search without blocking the event loop
+
+    The query embeddings (dense, plus sparse for hybrid) are computed in
+    parallel on worker threads, then sent with AsyncQdrantClient.
+
+    Args:
+        query: Search query
+        search_type: "semantic" or "hybrid"
+        limit: Number of results to return
+        location: Optional location (or list of locations) to restrict the search to
+
+    Returns:
+        List of search results
+    """
+    if retrieval_cache:
+        with span("retrieval_cache", search_type=search_type) as cache_span:
+            cached = await retrieval_cache.aget(COLLECTION_NAME, query, search_type, limit, location)
+            cache_span.set(hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    try:
+        model_names = _search_models(search_type)
+        encoded = await asyncio.gather(*(asyncio.to_thread(encode_query, name, query) for name in model_names))
+        with _query_span(search_type, limit, location) as query_span:
+            request = build_search_request(query, search_type, limit, location, dict(zip(model_names, encoded)))
+            results = await async_qdrant_client.query_points(**_query_points_args(request))
+            query_span.set(results=len(results.points))
+        search_results = _to_search_results(results.points)
+
+    except Exception as e:
+        print(f"Search error: {e}")
+        return []
+
+    if retrieval_cache:
+        await retrieval_cache.aset(COLLECTION_NAME, query, search_type, limit, location, search_results)
+    return search_results
+
+# Static instructions sent as the system message. They come first and never
+# change, so providers can serve them from their prompt prefix cache
+# (OpenAI caches prefixes of 1024+ tokens) and Ollama can reuse its KV cache.
+SYSTEM_PROMPT = """
 You're a travel assistant bot that helps users plan their itinerary and discover amazing places to visit.
 Answer the QUESTION based on the CONTEXT from the travel database.
 Use only the facts from the CONTEXT when answering the QUESTION.
@@ -127,11 +380,27 @@ When answering, consider:
 - Best times to visit and travel tips
 - Local cuisine and specialties (if mentioned in context)
 - Transportation and accessibility information (if available)
+""".strip()
 
-QUESTION: {question}
+def build_prompt(query: str, search_results: List[Dict]) -> str:
+    """
+    Build the user message for the LLM from search results
+
+    The instructions live in SYSTEM_PROMPT; this message holds only the
+    per-request CONTEXT followed by the QUESTION.
+
+    Args:
+        query: User question
+        search_results: Retrieved documents
 
+    Returns:
+        Formatted prompt string
+    """
+    prompt_template = """
 CONTEXT:
 {context}
+
+QUESTION: {question}
 """.strip()
 
     context = ""
@@ -140,120 +409,529 @@ CONTEXT:
         content = doc.get('content', doc.get('text', '')) # Handle both content and text fields
         context = context + f"location: {location}\ncontent: {content}\n\n"
 
-    return prompt_template.format(question=query, context=context).strip()
+    return prompt_template.format(question=query, context=context.strip()).strip()
+
+def _traced_prompt(query: str, search_results: List[Dict]) -> str:
+    """build_prompt() inside its "prompt_build" span"""
+    with span("prompt_build", documents=len(search_results)) as prompt_span:
+        prompt = build_prompt(query, search_results)
+        prompt_span.set(prompt_chars=len(prompt))
+    return prompt
+
+def _client_for(model_choice: str) -> OpenAI:
+    """OpenAI-compatible client serving a model"""
+    if model_choice.startswith('ollama/'):
+        return ollama_client
+    elif model_choice.startswith('openai/'):
+        return openai_client
+    raise ValueError(f"Unknown model choice: {model_choice}")
 
-def llm(prompt: str, model_choice: str) -> Dict[str, Any]:
+def _async_client_for(model_choice: str) -> AsyncOpenAI:
+    """Async OpenAI-compatible client serving a model"""
+    if model_choice.startswith('ollama/'):
+        return async_ollama_client
+    elif model_choice.startswith('openai/'):
+        return async_openai_client
+    raise ValueError(f"Unknown model choice: {model_choice}")
+
+def _messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    return messages
+
+def _chat_args(prompt: str, model_choice: str, system_prompt: Optional[str] = None,
+               stream: bool = False) -> Dict[str, Any]:
+    """chat.completions.create() arguments (same for the sync and async clients)"""
+    args = {"model": model_choice.split('/')[-1], "messages": _messages(prompt, system_prompt)}
+    if stream:
+        args.update(stream=True, stream_options={"include_usage": True})
+    return args
+
+def _no_tokens() -> Dict[str, int]:
+    """Token usage of a call that spent nothing (failed, cached, skipped)"""
+    return {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0, 'cached_tokens': 0}
+
+def _usage_tokens(usage) -> Dict[str, int]:
+    """Token usage dictionary from a response's usage block"""
+    # Prompt tokens served from the provider's prefix cache (absent for Ollama)
+    prompt_details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': usage.prompt_tokens,
+        'completion_tokens': usage.completion_tokens,
+        'total_tokens': usage.total_tokens,
+        'cached_tokens': getattr(prompt_details, 'cached_tokens', None) or 0
+    }
+
+def _stream_events(chunk) -> List[Tuple[Optional[str], Optional[Dict[str, int]]]]:
+    """(text delta, None) and (None, token usage) pairs carried by one streamed chunk"""
+    events = []
+    if chunk.choices and chunk.choices[0].delta.content:
+        events.append((chunk.choices[0].delta.content, None))
+    if chunk.usage:
+        events.append((None, _usage_tokens(chunk.usage)))
+    return events
+
+def _complete(prompt: str, model_choice: str, system_prompt: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
     """
-    Get response from LLM
+    Call the LLM provider for a model
 
     Args:
-        prompt: Input prompt
+        prompt: Input prompt (user message)
         model_choice: Model to use (ollama/phi3, openai/gpt-3.5-turbo, etc.)
+        system_prompt: Optional static system message sent ahead of the prompt
 
     Returns:
-        Dictionary with answer, tokens, and response_time
+        Tuple of (answer, token usage)
     """
-    start_time = time.time()
+    client = _client_for(model_choice)
 
-    try:
-        if model_choice.startswith('ollama/'):
-            response = ollama_client.chat.completions.create(
-                model=model_choice.split('/')[-1],
-                messages=[{"role": "user", "content": prompt}]
-            )
+    # Call with retries, failing fast while the provider's circuit breaker is open; each
+    # attempt waits for one of the model's in-flight slots (LLM_MAX_INFLIGHT), which is
+    # given back while backing off
+    response = call_with_resilience(
+        model_choice.split('/')[0],
+        lambda: client.chat.completions.create(**_chat_args(prompt, model_choice, system_prompt)),
+        slot=lambda: model_slot(model_choice)
+    )
 
-            answer = response.choices[0].message.content
-            tokens = {
-                'prompt_tokens': response.usage.prompt_tokens,
-                'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens
-            }
-
-        elif model_choice.startswith('openai/'):
-            response = openai_client.chat.completions.create(
-                model=model_choice.split('/')[-1],
-                messages=[{"role": "user", "content": prompt}]
-            )
+    return response.choices[0].message.content, _usage_tokens(response.usage)
 
-            answer = response.choices[0].message.content
-            tokens = {
-                'prompt_tokens': response.usage.prompt_tokens,
-                'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens
-            }
+async def _acomplete(prompt: str, model_choice: str, system_prompt: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+    """_complete with the async client; shares the model's in-flight slots and the provider's breaker"""
+    client = _async_client_for(model_choice)
 
-        else:
-            raise ValueError(f"Unknown model choice: {model_choice}")
+    response = await acall_with_resilience(
+        model_choice.split('/')[0],
+        lambda: client.chat.completions.create(**_chat_args(prompt, model_choice, system_prompt)),
+        slot=lambda: amodel_slot(model_choice)
+    )
 
-    except Exception as e:
-        print(f"LLM error: {e}")
-        answer = f"Sorry, I encountered an error: {str(e)}"
-        tokens = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+    return response.choices[0].message.content, _usage_tokens(response.usage)
 
-    end_time = time.time()
-    response_time = end_time - start_time
+def stream_complete(
+    prompt: str,
+    model_choice: str,
+    system_prompt: Optional[str] = None
+) -> Iterator[Tuple[Optional[str], Optional[Dict[str, int]]]]:
+    """
+    Stream an LLM answer as it is generated
+
+    Goes through the model's in-flight limit and the retry/circuit-breaker
+    layer (retries cover opening the stream only); the router and the
+    cassette are not used.
+
+    Args:
+        prompt: Input prompt (user message)
+        model_choice: Model to use (ollama/phi3, openai/gpt-3.5-turbo, etc.)
+        system_prompt: Optional static system message sent ahead of the prompt
+
+    Yields:
+        (text delta, None) while generating, then (None, token usage) once
+        the provider reports usage
+    """
+    client = _client_for(model_choice)
+
+    with ExitStack() as held:
+        @contextmanager
+        def slot():
+            # Per attempt like _complete, but the slot of the attempt that opened
+            # the stream is kept until the stream has been read
+            with ExitStack() as attempt_slot:
+                attempt_slot.enter_context(model_slot(model_choice))
+                yield
+                held.enter_context(attempt_slot.pop_all())
+
+        stream = call_with_resilience(
+            model_choice.split('/')[0],
+            lambda: client.chat.completions.create(**_chat_args(prompt, model_choice, system_prompt, stream=True)),
+            slot=slot
+        )
+        for chunk in stream:
+            yield from _stream_events(chunk)
+
+async def astream_complete(
+    prompt: str,
+    model_choice: str,
+    system_prompt: Optional[str] = None
+) -> AsyncIterator[Tuple[Optional[str], Optional[Dict[str, int]]]]:
+    """stream_complete with the async client (yields the same pairs)"""
+    client = _async_client_for(model_choice)
+
+    async with AsyncExitStack() as held:
+        @asynccontextmanager
+        async def slot():
+            async with AsyncExitStack() as attempt_slot:
+                await attempt_slot.enter_async_context(amodel_slot(model_choice))
+                yield
+                await held.enter_async_context(attempt_slot.pop_all())
+
+        stream = await acall_with_resilience(
+            model_choice.split('/')[0],
+            lambda: client.chat.completions.create(**_chat_args(prompt, model_choice, system_prompt, stream=True)),
+            slot=slot
+        )
+        async for chunk in stream:
+            for event in _stream_events(chunk):
+                yield event
+
+def _cassette_prompt(prompt: str, system_prompt: Optional[str] = None) -> str:
+    """What the cassette keys a call on: everything the model sees"""
+    return f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+
+def _replayed(model_choice: str, recorded_prompt: str) -> Optional[Tuple[Dict[str, Any], float]]:
+    """The recorded call and the seconds to wait before returning it, or None unless replaying"""
+    if not (llm_cassette and llm_cassette.replaying):
+        return None
+    recorded = llm_cassette.replay(model_choice, recorded_prompt)
+    return recorded, recorded['latency'] * llm_cassette.latency_scale
+
+def _record(model_choice: str, recorded_prompt: str, answer: str, tokens: Dict[str, int], start_time: float):
+    if llm_cassette and llm_cassette.recording:
+        llm_cassette.record(model_choice, recorded_prompt, answer, tokens, time.time() - start_time)
+
+def complete(prompt: str, model_choice: str, system_prompt: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+    """
+    LLM call through the cassette; errors propagate to the caller
+
+    With LLM_CASSETTE_MODE=record every call is also stored in the cassette;
+    with LLM_CASSETTE_MODE=replay calls are served from it without network access.
+
+    Args:
+        prompt: Input prompt (user message)
+        model_choice: Model to use (ollama/phi3, openai/gpt-3.5-turbo, etc.)
+        system_prompt: Optional static system message sent ahead of the prompt
+
+    Returns:
+        Tuple of (answer, token usage)
+    """
+    recorded_prompt = _cassette_prompt(prompt, system_prompt)
+    replayed = _replayed(model_choice, recorded_prompt)
+    if replayed:
+        recorded, delay = replayed
+        if delay > 0:
+            time.sleep(delay)
+        return recorded['answer'], recorded['tokens']
+
+    start_time = time.time()
+    answer, tokens = _complete(prompt, model_choice, system_prompt)
+    _record(model_choice, recorded_prompt, answer, tokens, start_time)
+    return answer, tokens
+
+async def acomplete(prompt: str, model_choice: str, system_prompt: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+    """complete() for coroutines, through the same cassette"""
+    recorded_prompt = _cassette_prompt(prompt, system_prompt)
+    replayed = _replayed(model_choice, recorded_prompt)
+    if replayed:
+        recorded, delay = replayed
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return recorded['answer'], recorded['tokens']
+
+    start_time = time.time()
+    answer, tokens = await _acomplete(prompt, model_choice, system_prompt)
+    _record(model_choice, recorded_prompt, answer, tokens, start_time)
+    return answer, tokens
 
+def _failed_answer(error: Exception) -> str:
+    """Answer returned in place of a failed LLM call"""
+    if isinstance(error, LimiterRejected):
+        # Overloaded model: answer right away instead of queueing indefinitely
+        print(f"LLM busy: {error}")
+        return "Sorry, the model is busy right now. Please try again in a moment."
+    print(f"LLM error: {error}")
+    return f"Sorry, I encountered an error: {str(error)}"
+
+def _llm_result(answer: str, tokens: Dict[str, int], model_used: str, start_time: float,
+                error: Optional[Exception] = None) -> Dict[str, Any]:
+    """llm() result dictionary; counts the call's tokens and cost (or its error) in the metrics"""
+    record_llm(model_used, tokens, calculate_openai_cost(model_used, tokens), error)
     return {
         'answer': answer,
         'tokens': tokens,
-        'response_time': response_time
+        'response_time': time.time() - start_time,
+        'model_used': model_used
     }
 
-def evaluate_relevance(question: str, answer: str) -> Dict[str, Any]:
+def llm(prompt: str, model_choice: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
     """
-    Evaluate relevance of the generated answer
+    Get response from LLM
 
     Args:
-        question: Original question
-        answer: Generated answer
+        prompt: Input prompt (user message)
+        model_choice: Model to use (ollama/phi3, openai/gpt-3.5-turbo, etc.)
+        system_prompt: Optional static system message sent ahead of the prompt
 
     Returns:
-        Dictionary with relevance score and explanation
+        Dictionary with answer, tokens, response_time and model_used (which
+        differs from model_choice when the router hedged or fell back)
     """
-    prompt_template = """
+    start_time = time.time()
+    model_used = model_choice
+
+    error = None
+    with span("llm", model=model_choice) as llm_span:
+        try:
+            if llm_router:
+                answer, tokens, model_used = llm_router.complete(prompt, model_choice, system_prompt=system_prompt)
+            else:
+                answer, tokens = complete(prompt, model_choice, system_prompt)
+
+        except Exception as e:
+            error = e
+            llm_span.record_error(e)
+            answer, tokens = _failed_answer(e), _no_tokens()
+        llm_span.set(model_used=model_used, **tokens)
+
+    return _llm_result(answer, tokens, model_used, start_time, error)
+
+async def allm(prompt: str, model_choice: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    llm() for coroutines (same result dictionary)
+
+    The router hedges and falls back with threads, so with LLM_FALLBACKS set
+    the call runs llm() on a worker thread instead.
+    """
+    if llm_router:
+        return await asyncio.to_thread(llm, prompt, model_choice, system_prompt)
+
+    start_time = time.time()
+    error = None
+    with span("llm", model=model_choice) as llm_span:
+        try:
+            answer, tokens = await acomplete(prompt, model_choice, system_prompt)
+        except Exception as e:
+            error = e
+            llm_span.record_error(e)
+            answer, tokens = _failed_answer(e), _no_tokens()
+        llm_span.set(model_used=model_choice, **tokens)
+
+    return _llm_result(answer, tokens, model_choice, start_time, error)
+
+# Judge model for evaluate_relevance
+JUDGE_MODEL = 'openai/gpt-4o-mini'
+
+# Judge instructions, sent as a stable system message ahead of the question/answer pair
+JUDGE_SYSTEM_PROMPT = """
 You are an expert evaluator for a Retrieval-Augmented Generation (RAG) system.
 Your task is to analyze the relevance of the generated answer to the given question.
 Based on the relevance of the generated answer, you will classify it
 as "NON_RELEVANT", "PARTLY_RELEVANT", or "RELEVANT".
 
-Here is the data for evaluation:
+You will be given the Question and the Generated Answer. Analyze the content and
+context of the generated answer in relation to the question and provide your
+evaluation in parsable JSON without using code blocks:
 
-Question: {question}
+{
+    "Relevance": "NON_RELEVANT" | "PARTLY_RELEVANT" | "RELEVANT",
+    "Explanation": "[Provide a brief explanation for your evaluation]"
+}
+""".strip()
 
-Generated Answer: {answer}
+# Recent judgments keyed by hash(judge model, question, answer), least recently used evicted first
+RELEVANCE_CACHE_SIZE = int(os.getenv("RELEVANCE_CACHE_SIZE", "1024"))
+_relevance_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_relevance_cache_lock = threading.Lock()
 
-Please analyze the content and context of the generated answer in relation to the question
-and provide your evaluation in parsable JSON without using code blocks:
+# Share of answers still sent to the LLM judge when the local scorer is confident
+RELEVANCE_JUDGE_SAMPLE_RATE = float(os.getenv("RELEVANCE_JUDGE_SAMPLE_RATE", "0.1"))
+# Local verdicts below this confidence are sent to the LLM judge
+RELEVANCE_MIN_CONFIDENCE = float(os.getenv("RELEVANCE_MIN_CONFIDENCE", "0.8"))
 
-{{
-    "Relevance": "NON_RELEVANT" | "PARTLY_RELEVANT" | "RELEVANT",
-    "Explanation": "[Provide a brief explanation for your evaluation]"
-}}
+# Local scorer calibrated by relevance_scorer.py (None until then: every answer goes to the judge)
+relevance_scorer = RelevanceScorer.load()
+
+# Question/answer pair sent to the judge after JUDGE_SYSTEM_PROMPT
+JUDGE_PROMPT_TEMPLATE = """
+Question: {question}
+
+Generated Answer: {answer}
 """.strip()
 
-    prompt = prompt_template.format(question=question, answer=answer)
+def _judge_cache_key(question: str, answer: str) -> str:
+    return hashlib.sha256(f"{JUDGE_MODEL}\0{question}\0{answer}".encode()).hexdigest()
 
+def _cached_judgment(cache_key: str) -> Optional[Dict[str, Any]]:
+    with _relevance_cache_lock:
+        hit = cache_key in _relevance_cache
+        record_cache("relevance", hit)
+        if hit:
+            _relevance_cache.move_to_end(cache_key)
+            # Served from cache, so no judge tokens are spent
+            return {**_relevance_cache[cache_key],
+                    'eval_tokens': _no_tokens()}
+    return None
+
+def _parse_judgment(cache_key: str, eval_response: Dict[str, Any]) -> Dict[str, Any]:
+    """Judgment from the judge's llm() response, cached when it parses"""
     try:
-        eval_response = llm(prompt, 'openai/gpt-4o-mini')
         json_eval = json.loads(eval_response['answer'])
 
-        return {
+        result = {
             'relevance': json_eval['Relevance'],
             'explanation': json_eval['Explanation'],
             'eval_tokens': eval_response['tokens']
         }
+        if RELEVANCE_CACHE_SIZE > 0:
+            with _relevance_cache_lock:
+                _relevance_cache[cache_key] = result
+                if len(_relevance_cache) > RELEVANCE_CACHE_SIZE:
+                    _relevance_cache.popitem(last=False)
+        return result
 
-    except:
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        # llm() reports call failures as an error answer, which fails to parse here
+        print(f"Relevance evaluation error: {e}")
         return {
             'relevance': "UNKNOWN",
             'explanation': "Failed to parse evaluation",
-            'eval_tokens': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+            'eval_tokens': _no_tokens()
         }
 
+def judge_relevance(question: str, answer: str) -> Dict[str, Any]:
+    """
+    Evaluate relevance of the generated answer with the LLM judge
+
+    Args:
+        question: Original question
+        answer: Generated answer
+
+    Returns:
+        Dictionary with relevance score and explanation
+    """
+    with span("judge", model=JUDGE_MODEL) as judge_span:
+        cache_key = _judge_cache_key(question, answer)
+        judgment = _cached_judgment(cache_key)
+        judge_span.set(cached=judgment is not None)
+        if judgment is None:
+            prompt = JUDGE_PROMPT_TEMPLATE.format(question=question, answer=answer)
+            judgment = _parse_judgment(cache_key, llm(prompt, JUDGE_MODEL, JUDGE_SYSTEM_PROMPT))
+        judge_span.set(relevance=judgment['relevance'])
+        return judgment
+
+async def ajudge_relevance(question: str, answer: str) -> Dict[str, Any]:
+    """judge_relevance() for coroutines (same judgment cache)"""
+    with span("judge", model=JUDGE_MODEL) as judge_span:
+        cache_key = _judge_cache_key(question, answer)
+        judgment = _cached_judgment(cache_key)
+        judge_span.set(cached=judgment is not None)
+        if judgment is None:
+            prompt = JUDGE_PROMPT_TEMPLATE.format(question=question, answer=answer)
+            judgment = _parse_judgment(cache_key, await allm(prompt, JUDGE_MODEL, JUDGE_SYSTEM_PROMPT))
+        judge_span.set(relevance=judgment['relevance'])
+        return judgment
+
+def _local_relevance(question: str, answer: str, search_results: Optional[List[Dict]]) -> Dict[str, Any]:
+    """The local scorer's verdict and confidence (both None without a calibrated scorer)"""
+    if relevance_scorer is None:
+        return {'local_relevance': None, 'confidence': None}
+    local_relevance, confidence = relevance_scorer.score(
+        embedding_model.encode, question, answer, context_text(search_results or [])
+    )
+    return {'local_relevance': local_relevance, 'confidence': confidence}
+
+def _relevance_method(local: Dict[str, Any]) -> str:
+    """Who decides: "local", or the LLM judge ("llm", "llm_low_confidence", "llm_sample")"""
+    if local['confidence'] is None:
+        return 'llm'
+    if local['confidence'] < RELEVANCE_MIN_CONFIDENCE:
+        return 'llm_low_confidence'
+    if random.random() < RELEVANCE_JUDGE_SAMPLE_RATE:
+        return 'llm_sample'
+    return 'local'
+
+def _unjudged(local: Dict[str, Any]) -> Dict[str, Any]:
+    """Judgment for an answer nobody evaluated (judge skipped under load, no local scorer)"""
+    return {
+        'relevance': "UNKNOWN",
+        'explanation': "Not evaluated: the judge was skipped under load",
+        'eval_tokens': _no_tokens(),
+        'method': 'skipped',
+        **local
+    }
+
+def _local_judgment(local: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'relevance': local['local_relevance'],
+        'explanation': f"Local relevance scorer ({local['confidence']:.0%} confidence)",
+        'eval_tokens': _no_tokens(),
+        'method': 'local',
+        **local
+    }
+
+def _judgment_without_judge(local: Dict[str, Any], skip_judge: bool) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Settle relevance without the LLM judge when possible
+
+    Returns:
+        (judgment, "") when no judge call is needed, else (None, method) where
+        method says why the judge runs ("llm", "llm_low_confidence", "llm_sample")
+    """
+    if skip_judge:
+        return (_unjudged(local) if local['confidence'] is None else _local_judgment(local)), ""
+    method = _relevance_method(local)
+    if method == 'local':
+        return _local_judgment(local), ""
+    return None, method
+
+def evaluate_relevance(
+    question: str,
+    answer: str,
+    search_results: Optional[List[Dict]] = None,
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """
+    Evaluate relevance of the generated answer
+
+    The local scorer answers when it is confident; the LLM judge runs on a
+    RELEVANCE_JUDGE_SAMPLE_RATE sample of those answers (to keep checking
+    the scorer) and on every low-confidence one.
+
+    Args:
+        question: Original question
+        answer: Generated answer
+        search_results: Retrieved documents the answer was based on
+        skip_judge: Never call the LLM judge (under load); the local verdict is used whatever its confidence
+
+    Returns:
+        Dictionary with relevance score and explanation, the method that
+        produced it ("local", "llm_sample", "llm_low_confidence", "llm" or
+        "skipped"), and the local scorer's verdict and confidence when it ran
+    """
+    local = _local_relevance(question, answer, search_results)
+    judgment, method = _judgment_without_judge(local, skip_judge)
+    if judgment is not None:
+        return judgment
+    return {**judge_relevance(question, answer), 'method': method, **local}
+
+async def aevaluate_relevance(
+    question: str,
+    answer: str,
+    search_results: Optional[List[Dict]] = None,
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """evaluate_relevance() for coroutines; the local scorer's embedding runs on a worker thread"""
+    local = await asyncio.to_thread(_local_relevance, question, answer, search_results)
+    judgment, method = _judgment_without_judge(local, skip_judge)
+    if judgment is not None:
+        return judgment
+    return {**await ajudge_relevance(question, answer), 'method': method, **local}
+
+# OpenAI prices in USD per 1K tokens; cached_input applies to prompt tokens
+# served from the prefix cache (gpt-3.5-turbo has no prompt caching)
+OPENAI_PRICING = {
+    'openai/gpt-3.5-turbo': {'input': 0.0005, 'cached_input': 0.0005, 'output': 0.0015},
+    'openai/gpt-4o': {'input': 0.0025, 'cached_input': 0.00125, 'output': 0.01},
+    'openai/gpt-4o-mini': {'input': 0.00015, 'cached_input': 0.000075, 'output': 0.0006},
+}
+
 def calculate_openai_cost(model_choice: str, tokens: Dict) -> float:
     """
     Calculate OpenAI API costs
 
+    Cached prompt tokens (tokens['cached_tokens']) are billed at the cached
+    input price, the rest of the prompt at the regular input price.
+
     Args:
         model_choice: Model used
         tokens: Token usage dictionary
@@ -261,55 +939,467 @@ def calculate_openai_cost(model_choice: str, tokens: Dict) -> float:
     Returns:
         Cost in USD
     """
-    openai_cost = 0
+    pricing = OPENAI_PRICING.get(model_choice)
+    if pricing is None:
+        return 0
 
-    if model_choice == 'openai/gpt-3.5-turbo':
-        openai_cost = (tokens['prompt_tokens'] * 0.0015 + tokens['completion_tokens'] * 0.002) / 1000
-    elif model_choice in ['openai/gpt-4o', 'openai/gpt-4o-mini']:
-        openai_cost = (tokens['prompt_tokens'] * 0.03 + tokens['completion_tokens'] * 0.06) / 1000
+    cached_tokens = min(tokens.get('cached_tokens', 0), tokens['prompt_tokens'])
+    openai_cost = (
+        (tokens['prompt_tokens'] - cached_tokens) * pricing['input']
+        + cached_tokens * pricing['cached_input']
+        + tokens['completion_tokens'] * pricing['output']
+    ) / 1000
 
     return openai_cost
 
-def get_answer(query: str, model_choice: str, search_type: str = "semantic") -> Dict[str, Any]:
+# Coalesce identical questions asked concurrently into one pipeline run
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+answer_flight = SingleFlight()
+
+# Usage fields zeroed for coalesced answers, which spent no tokens of their own
+USAGE_FIELDS = [
+    'prompt_tokens', 'completion_tokens', 'total_tokens', 'cached_tokens',
+    'eval_prompt_tokens', 'eval_completion_tokens', 'eval_total_tokens', 'eval_cached_tokens',
+    'openai_cost',
+]
+
+def _flight_key(query: str, model_choice: str, search_type: str,
+                location: Optional[Union[str, List[str]]], skip_judge: bool = False) -> Tuple[str, str, str, str, bool]:
+    return (normalize_query(query), model_choice, search_type, json.dumps(location), skip_judge)
+
+def _coalesced(answer_data: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+    """Copy of a shared answer for a caller that joined another caller's run"""
+    return {
+        **answer_data,
+        **{field: 0 for field in USAGE_FIELDS},
+        'coalesced': True,
+        'stage_timings': {'coalesced_wait': time.time() - start_time}
+    }
+
+def get_answer(
+    query: str,
+    model_choice: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None,
+    skip_judge: bool = False
+) -> Dict[str, Any]:
     """
     Main RAG function to get answer for a query
 
+    Concurrent calls with the same normalized question, model, search type
+    and location share one pipeline run. The callers that joined get a copy
+    of its answer with 'coalesced' set and zero token usage and cost, so
+    spend is counted once when each caller saves its own conversation.
+
     Args:
         query: User question
         model_choice: LLM model to use
         search_type: "semantic" or "hybrid"
+        location: Optional location filter; detected from the question when omitted
+        skip_judge: Evaluate with the local scorer only (admission control sets it under load)
 
     Returns:
         Dictionary with answer and metadata
     """
+    with span("get_answer", model=model_choice, search_type=search_type, skip_judge=skip_judge) as answer_span:
+        if not SINGLEFLIGHT_ENABLED:
+            return _get_answer(query, model_choice, search_type, location, skip_judge)
+
+        start_time = time.time()
+        key = _flight_key(query, model_choice, search_type, location, skip_judge)
+        run = lambda: _get_answer(query, model_choice, search_type, location, skip_judge)
+        try:
+            answer_data, shared = answer_flight.do(key, run)
+        except LeaderAborted:
+            # The run we joined was stopped by its own caller; start (or join) a fresh one
+            answer_data, shared = answer_flight.do(key, run)
+        answer_span.set(coalesced=shared)
+        return _coalesced(answer_data, start_time) if shared else answer_data
+
+async def aget_answer(
+    query: str,
+    model_choice: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None,
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """
+    get_answer() for coroutines: same result, without holding a thread while waiting on I/O
+
+    Search, LLM and judge calls use the async clients; embedding, reranking
+    and local scoring run on worker threads. Identical concurrent questions
+    are coalesced as in get_answer.
+    """
+    with span("get_answer", model=model_choice, search_type=search_type, skip_judge=skip_judge) as answer_span:
+        if not SINGLEFLIGHT_ENABLED:
+            return await _aget_answer(query, model_choice, search_type, location, skip_judge)
+
+        start_time = time.time()
+        key = _flight_key(query, model_choice, search_type, location, skip_judge)
+        run = lambda: _aget_answer(query, model_choice, search_type, location, skip_judge)
+        try:
+            answer_data, shared = await answer_flight.ado(key, run)
+        except LeaderAborted:
+            # A disconnected client cancelled the run we joined; start (or join) a fresh one
+            answer_data, shared = await answer_flight.ado(key, run)
+        answer_span.set(coalesced=shared)
+        return _coalesced(answer_data, start_time) if shared else answer_data
+
+def _search_scope(query: str, location: Optional[Union[str, List[str]]]) -> Tuple[Optional[Union[str, List[str]]], bool]:
+    """Location filter to search with, and whether it was detected from the question"""
+    # Restrict the search to locations named in the question
+    if location is None and AUTO_LOCATION_FILTER:
+        location = detect_locations(query) or None
+        return location, location is not None
+    return location, False
+
+def _search_limit() -> int:
+    """Results to retrieve: a wider candidate set when reranking"""
+    return RERANK_CANDIDATES if reranker else SEARCH_LIMIT
+
+def retrieve(
+    query: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None
+) -> Tuple[List[Dict], Optional[Union[str, List[str]]], Dict[str, float]]:
+    """
+    Retrieval stages of the pipeline: location detection, search and rerank
+
+    Returns:
+        Tuple of (search results for the prompt, location filter applied, stage timings)
+    """
+    location, detected = _search_scope(query, location)
+    stage_timings = {}
+
     # Search for relevant documents
-    search_results = qdrant_search(query, search_type)
+    limit = _search_limit()
+    start_time = time.time()
+    search_results = qdrant_search(query, search_type, limit, location=location)
+    if not search_results and detected:
+        # A detected location can be wrong; fall back to the whole collection
+        location = None
+        search_results = qdrant_search(query, search_type, limit)
+    stage_timings['search'] = time.time() - start_time
 
-    # Build prompt
-    prompt = build_prompt(query, search_results)
+    # Keep the best candidates by cross-encoder score (retrieval order if over budget)
+    if reranker:
+        start_time = time.time()
+        with span("rerank", candidates=len(search_results)) as rerank_span:
+            search_results = reranker.rerank(query, search_results, RERANK_TOP_N, fallback_limit=SEARCH_LIMIT)
+            rerank_span.set(kept=len(search_results))
+        stage_timings['rerank'] = time.time() - start_time
 
-    # Get LLM response
-    llm_response = llm(prompt, model_choice)
+    return search_results, location, stage_timings
 
-    # Evaluate relevance
-    relevance_data = evaluate_relevance(query, llm_response['answer'])
+async def aretrieve(
+    query: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None
+) -> Tuple[List[Dict], Optional[Union[str, List[str]]], Dict[str, float]]:
+    """retrieve() for coroutines; reranking runs on a worker thread"""
+    location, detected = _search_scope(query, location)
+    stage_timings = {}
 
-    # Calculate costs
-    openai_cost = calculate_openai_cost(model_choice, llm_response['tokens'])
+    limit = _search_limit()
+    start_time = time.time()
+    search_results = await aqdrant_search(query, search_type, limit, location=location)
+    if not search_results and detected:
+        location = None
+        search_results = await aqdrant_search(query, search_type, limit)
+    stage_timings['search'] = time.time() - start_time
+
+    if reranker:
+        start_time = time.time()
+        with span("rerank", candidates=len(search_results)) as rerank_span:
+            search_results = await asyncio.to_thread(
+                reranker.rerank, query, search_results, RERANK_TOP_N, fallback_limit=SEARCH_LIMIT
+            )
+            rerank_span.set(kept=len(search_results))
+        stage_timings['rerank'] = time.time() - start_time
+
+    return search_results, location, stage_timings
+
+def assemble_answer_data(
+    search_type: str,
+    location: Optional[Union[str, List[str]]],
+    search_results: List[Dict],
+    llm_response: Dict[str, Any],
+    relevance_data: Dict[str, Any],
+    stage_timings: Dict[str, float]
+) -> Dict[str, Any]:
+    """get_answer result from the LLM response and its relevance evaluation"""
+    # Calculate costs for the model that actually answered
+    model_used = llm_response['model_used']
+    openai_cost = calculate_openai_cost(model_used, llm_response['tokens'])
 
     return {
         'answer': llm_response['answer'],
         'response_time': llm_response['response_time'],
         'relevance': relevance_data['relevance'],
         'relevance_explanation': relevance_data['explanation'],
-        'model_used': model_choice,
+        'relevance_method': relevance_data['method'],
+        'relevance_confidence': relevance_data['confidence'],
+        'local_relevance': relevance_data['local_relevance'],
+        'model_used': model_used,
         'search_type': search_type,
+        'location_filter': location,
         'prompt_tokens': llm_response['tokens']['prompt_tokens'],
         'completion_tokens': llm_response['tokens']['completion_tokens'],
         'total_tokens': llm_response['tokens']['total_tokens'],
+        'cached_tokens': llm_response['tokens'].get('cached_tokens', 0),
         'eval_prompt_tokens': relevance_data['eval_tokens']['prompt_tokens'],
         'eval_completion_tokens': relevance_data['eval_tokens']['completion_tokens'],
         'eval_total_tokens': relevance_data['eval_tokens']['total_tokens'],
+        'eval_cached_tokens': relevance_data['eval_tokens'].get('cached_tokens', 0),
         'openai_cost': openai_cost,
-        'search_results_count': len(search_results)
+        'search_results_count': len(search_results),
+        'coalesced': False,
+        'stage_timings': stage_timings
     }
+
+def _evaluation_attributes(relevance_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: relevance_data[key] for key in ('method', 'relevance', 'confidence')}
+
+def build_answer_data(
+    query: str,
+    search_type: str,
+    location: Optional[Union[str, List[str]]],
+    search_results: List[Dict],
+    llm_response: Dict[str, Any],
+    stage_timings: Dict[str, float],
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """
+    Evaluate an LLM answer and assemble the get_answer result
+
+    Args:
+        query: User question
+        search_type: "semantic" or "hybrid"
+        location: Location filter that was applied
+        search_results: Documents the answer was based on
+        llm_response: Result of llm() (answer, tokens, response_time, model_used)
+        stage_timings: Stage timings so far; "evaluation" is added
+        skip_judge: Evaluate with the local scorer only
+
+    Returns:
+        Dictionary with answer and metadata
+    """
+    # Evaluate relevance
+    start_time = time.time()
+    with span("evaluation") as evaluation_span:
+        relevance_data = evaluate_relevance(query, llm_response['answer'], search_results, skip_judge)
+        evaluation_span.set(**_evaluation_attributes(relevance_data))
+    stage_timings['evaluation'] = time.time() - start_time
+
+    return assemble_answer_data(search_type, location, search_results, llm_response, relevance_data, stage_timings)
+
+async def abuild_answer_data(
+    query: str,
+    search_type: str,
+    location: Optional[Union[str, List[str]]],
+    search_results: List[Dict],
+    llm_response: Dict[str, Any],
+    stage_timings: Dict[str, float],
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """build_answer_data() for coroutines"""
+    start_time = time.time()
+    with span("evaluation") as evaluation_span:
+        relevance_data = await aevaluate_relevance(query, llm_response['answer'], search_results, skip_judge)
+        evaluation_span.set(**_evaluation_attributes(relevance_data))
+    stage_timings['evaluation'] = time.time() - start_time
+
+    return assemble_answer_data(search_type, location, search_results, llm_response, relevance_data, stage_timings)
+
+def _get_answer(
+    query: str,
+    model_choice: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None,
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """
+    Run the RAG pipeline for a query
+
+    Args:
+        query: User question
+        model_choice: LLM model to use
+        search_type: "semantic" or "hybrid"
+        location: Optional location filter; detected from the question when omitted
+        skip_judge: Evaluate with the local scorer only
+
+    Returns:
+        Dictionary with answer and metadata
+    """
+    search_results, location, stage_timings = retrieve(query, search_type, location)
+
+    prompt = _traced_prompt(query, search_results)
+
+    # Get LLM response
+    start_time = time.time()
+    llm_response = llm(prompt, model_choice, SYSTEM_PROMPT)
+    stage_timings['llm'] = time.time() - start_time
+
+    return build_answer_data(query, search_type, location, search_results, llm_response, stage_timings, skip_judge)
+
+async def _aget_answer(
+    query: str,
+    model_choice: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None,
+    skip_judge: bool = False
+) -> Dict[str, Any]:
+    """_get_answer() for coroutines"""
+    search_results, location, stage_timings = await aretrieve(query, search_type, location)
+    prompt = _traced_prompt(query, search_results)
+
+    start_time = time.time()
+    llm_response = await allm(prompt, model_choice, SYSTEM_PROMPT)
+    stage_timings['llm'] = time.time() - start_time
+
+    return await abuild_answer_data(query, search_type, location, search_results, llm_response, stage_timings,
+                                    skip_judge)
+
+class _StreamedAnswer:
+    """Text deltas and token usage of a streamed LLM answer, collected as they arrive"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.tokens = _no_tokens()
+        self.error: Optional[Exception] = None
+
+    def add(self, delta: Optional[str], usage: Optional[Dict[str, int]]) -> Optional[str]:
+        """Take one (text delta, usage) event; returns the delta to pass on, if any"""
+        if delta:
+            self.parts.append(delta)
+        if usage:
+            self.tokens = usage
+        return delta
+
+    def fail(self, error: Exception) -> str:
+        """Replace the answer with the error answer, which is returned"""
+        self.error = error
+        self.parts = [_failed_answer(error)]
+        return self.parts[0]
+
+    def answer(self) -> str:
+        return ''.join(self.parts)
+
+def stream_answer(
+    query: str,
+    model_choice: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None,
+    skip_judge: bool = False
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Run the RAG pipeline, streaming the answer as the LLM generates it
+
+    Yields:
+        ("token", text delta) events, then one ("done", answer data) event
+        with the same fields as get_answer
+    """
+    search_results, location, stage_timings = retrieve(query, search_type, location)
+    prompt = _traced_prompt(query, search_results)
+
+    start_time = time.time()
+    streamed = _StreamedAnswer()
+    with span("llm", model=model_choice, stream=True) as llm_span:
+        try:
+            for delta, usage in stream_complete(prompt, model_choice, SYSTEM_PROMPT):
+                if streamed.add(delta, usage):
+                    yield 'token', delta
+        except Exception as e:
+            llm_span.record_error(e)
+            yield 'token', streamed.fail(e)
+        llm_span.set(model_used=model_choice, **streamed.tokens)
+    llm_response = _llm_result(streamed.answer(), streamed.tokens, model_choice, start_time, streamed.error)
+    stage_timings['llm'] = llm_response['response_time']
+    yield 'done', build_answer_data(query, search_type, location, search_results, llm_response, stage_timings,
+                                    skip_judge)
+
+async def astream_answer(
+    query: str,
+    model_choice: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None,
+    skip_judge: bool = False
+) -> AsyncIterator[Tuple[str, Any]]:
+    """stream_answer() for coroutines (yields the same events)"""
+    search_results, location, stage_timings = await aretrieve(query, search_type, location)
+    prompt = _traced_prompt(query, search_results)
+
+    start_time = time.time()
+    streamed = _StreamedAnswer()
+    with span("llm", model=model_choice, stream=True) as llm_span:
+        try:
+            async for delta, usage in astream_complete(prompt, model_choice, SYSTEM_PROMPT):
+                if streamed.add(delta, usage):
+                    yield 'token', delta
+        except Exception as e:
+            llm_span.record_error(e)
+            yield 'token', streamed.fail(e)
+        llm_span.set(model_used=model_choice, **streamed.tokens)
+    llm_response = _llm_result(streamed.answer(), streamed.tokens, model_choice, start_time, streamed.error)
+    stage_timings['llm'] = llm_response['response_time']
+    yield 'done', await abuild_answer_data(query, search_type, location, search_results, llm_response,
+                                           stage_timings, skip_judge)
+
+# Stands in for the generated answer when admission control sheds LLM work
+RETRIEVAL_ONLY_NOTICE = (
+    "I'm answering a lot of questions right now, so here are the most relevant "
+    "passages from the travel database instead of a written answer:"
+)
+RETRIEVAL_ONLY_MODEL = "retrieval_only"
+
+def retrieval_only_text(search_results: List[Dict]) -> str:
+    """Answer made of the top search results, without an LLM"""
+    if not search_results:
+        return "I could not find this in the travel database."
+    passages = [f"- {result['location'].replace('_', ' ')}: {result['content'][:300]}"
+                for result in search_results[:SEARCH_LIMIT]]
+    return "\n".join([RETRIEVAL_ONLY_NOTICE, *passages])
+
+def _retrieval_only_data(
+    search_type: str,
+    location: Optional[Union[str, List[str]]],
+    search_results: List[Dict],
+    stage_timings: Dict[str, float],
+    start_time: float
+) -> Dict[str, Any]:
+    llm_response = {
+        'answer': retrieval_only_text(search_results),
+        'tokens': _no_tokens(),
+        'response_time': time.time() - start_time,
+        'model_used': RETRIEVAL_ONLY_MODEL
+    }
+    relevance_data = _unjudged({'local_relevance': None, 'confidence': None})
+    return assemble_answer_data(search_type, location, search_results, llm_response, relevance_data, stage_timings)
+
+def get_retrieval_answer(
+    query: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None
+) -> Dict[str, Any]:
+    """
+    Answer with the retrieved passages only: no LLM call, no evaluation
+
+    Admission control serves this when the queue is long enough that
+    generating answers would time everyone out. The result has the same
+    fields as get_answer, with model_used "retrieval_only" and zero tokens.
+    """
+    start_time = time.time()
+    with span("get_answer", search_type=search_type, retrieval_only=True):
+        search_results, location, stage_timings = retrieve(query, search_type, location)
+        return _retrieval_only_data(search_type, location, search_results, stage_timings, start_time)
+
+async def aget_retrieval_answer(
+    query: str,
+    search_type: str = "semantic",
+    location: Optional[Union[str, List[str]]] = None
+) -> Dict[str, Any]:
+    """get_retrieval_answer() for coroutines"""
+    start_time = time.time()
+    with span("get_answer", search_type=search_type, retrieval_only=True):
+        search_results, location, stage_timings = await aretrieve(query, search_type, location)
+        return _retrieval_only_data(search_type, location, search_results, stage_timings, start_time)
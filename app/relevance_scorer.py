@@ -0,0 +1,266 @@
+# relevance_scorer.py - Local Relevance Scorer Calibrated on Stored LLM Judgments
+import os
+import re
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "results"
+ANSWERS_PATH = RESULTS_DIR / "multiple_examples_comparison.csv"
+JUDGMENTS_PATH = RESULTS_DIR / "llm_as_a_judge_evaluations_multiple.csv"
+SCORER_PATH = Path(os.getenv("RELEVANCE_SCORER_PATH", PROJECT_ROOT / "data" / "relevance_scorer.json"))
+
+LABELS = ["NON_RELEVANT", "PARTLY_RELEVANT", "RELEVANT"]
+FEATURES = [
+    "question_answer_sim",
+    "answer_context_sim",
+    "question_context_sim",
+    "answer_log_words",
+    "question_term_overlap",
+    "refusal",
+]
+
+# Answers that decline or report a failure instead of answering
+REFUSAL_PATTERN = re.compile(
+    r"sorry|i (?:do not|don't|cannot|can't) (?:know|find|answer)|could not find|no information"
+    r"|not (?:mentioned|provided|available) in the context|does not (?:mention|provide|contain)",
+    re.IGNORECASE,
+)
+STOPWORDS = {"what", "which", "where", "when", "who", "whom", "whose", "how", "why", "the", "and",
+             "are", "is", "was", "were", "for", "with", "that", "this", "from", "into", "about",
+             "there", "their", "some", "does", "have", "has", "can", "could", "would", "should"}
+
+# encode(texts) -> one embedding row per text
+Encoder = Callable[[List[str]], np.ndarray]
+
+def content_terms(text: str) -> set:
+    """Lower-cased words of 3+ letters, minus question words and stopwords"""
+    return {w for w in re.findall(r"[a-z]{3,}", text.lower()) if w not in STOPWORDS}
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def extract_features(encode: Encoder, questions: List[str], answers: List[str],
+                     contexts: List[str]) -> np.ndarray:
+    """
+    Feature matrix (one row per question/answer pair, columns as in FEATURES)
+
+    Questions, answers and contexts are embedded in a single encoder call.
+    """
+    n = len(questions)
+    vectors = normalize_rows(encode(list(questions) + list(answers) + list(contexts)))
+    q, a, c = vectors[:n], vectors[n:2 * n], vectors[2 * n:]
+
+    rows = []
+    for i, (question, answer) in enumerate(zip(questions, answers)):
+        terms = content_terms(question)
+        rows.append([
+            float(q[i] @ a[i]),
+            float(a[i] @ c[i]),
+            float(q[i] @ c[i]),
+            float(np.log1p(len(answer.split()))),
+            len(terms & content_terms(answer)) / len(terms) if terms else 0.0,
+            1.0 if REFUSAL_PATTERN.search(answer) else 0.0,
+        ])
+    return np.array(rows, dtype=np.float32)
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+class RelevanceScorer:
+    """
+    Multinomial logistic regression over FEATURES
+
+    Fitted on stored LLM judgments without class weighting, so the softmax
+    probability of the predicted label stays usable as its confidence.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, mean: np.ndarray, std: np.ndarray,
+                 metadata: Optional[Dict[str, Any]] = None):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self.metadata = metadata or {}
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, l2: float = 0.01, epochs: int = 2000,
+            learning_rate: float = 0.5) -> "RelevanceScorer":
+        """
+        Fit on a feature matrix and label indices (positions in LABELS)
+        """
+        mean, std = X.mean(axis=0), X.std(axis=0)
+        std[std < 1e-6] = 1.0
+        Xs = (X - mean) / std
+
+        onehot = np.eye(len(LABELS))[y]
+        weights = np.zeros((X.shape[1], len(LABELS)))
+        bias = np.zeros(len(LABELS))
+        for _ in range(epochs):
+            gradient = (softmax(Xs @ weights + bias) - onehot) / len(y)
+            weights -= learning_rate * (Xs.T @ gradient + l2 * weights)
+            bias -= learning_rate * gradient.sum(axis=0)
+        return cls(weights, bias, mean, std)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return softmax((X - self.mean) / self.std @ self.weights + self.bias)
+
+    def score(self, encode: Encoder, question: str, answer: str, context: str) -> Tuple[str, float]:
+        """
+        Classify one answer
+
+        Returns:
+            Tuple of (label, confidence)
+        """
+        probs = self.predict_proba(extract_features(encode, [question], [answer], [context]))[0]
+        return LABELS[int(probs.argmax())], float(probs.max())
+
+    def save(self, path: Path = SCORER_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "labels": LABELS,
+            "features": FEATURES,
+            "weights": self.weights.tolist(),
+            "bias": self.bias.tolist(),
+            "mean": self.mean.tolist(),
+            "std": self.std.tolist(),
+            "metadata": self.metadata,
+        }, indent=2))
+
+    @classmethod
+    def load(cls, path: Path = SCORER_PATH) -> Optional["RelevanceScorer"]:
+        """Calibrated scorer, or None if it was never calibrated (or FEATURES changed since)"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        if data.get("features") != FEATURES or data.get("labels") != LABELS:
+            print(f"⚠️  {path} was calibrated with different features; recalibrate the relevance scorer")
+            return None
+        return cls(data["weights"], data["bias"], data["mean"], data["std"], data.get("metadata"))
+
+def context_text(search_results: List[Dict]) -> str:
+    """Retrieved documents joined into one text to embed"""
+    return "\n".join(doc.get("content", doc.get("text", "")) for doc in search_results)
+
+def load_judgments_csv(answers_path: Path = ANSWERS_PATH, judgments_path: Path = JUDGMENTS_PATH) -> pd.DataFrame:
+    """
+    Question-Answer judgments from the offline evaluation, joined with their answers
+
+    The source chunk a question was generated from (answer_orig) stands in
+    for the retrieved context.
+    """
+    answers = pd.read_csv(answers_path)
+    judgments = pd.read_csv(judgments_path)
+    judgments = judgments[judgments["evaluation_type"] == "Question-Answer"]
+    df = judgments.merge(answers, on=["model", "question_index"])
+    return pd.DataFrame({
+        "question": df["question"],
+        "answer": df["answer_llm"].fillna(""),
+        "context": df["answer_orig"].fillna(""),
+        "relevance": df["Relevance"],
+    })
+
+def load_judgments_db(search_type: str = "semantic") -> pd.DataFrame:
+    """
+    LLM judgments stored with conversations, with contexts re-retrieved
+
+    Conversations store no context, so each question is searched again.
+    """
+    from db import get_db_connection
+    from rag import qdrant_search_batch
+
+    conn = get_db_connection()
+    try:
+        df = pd.read_sql(
+            """SELECT question, answer, relevance FROM conversations
+               WHERE relevance_method <> 'local' AND relevance <> 'UNKNOWN'""",
+            conn,
+        )
+    finally:
+        conn.close()
+
+    contexts = []
+    questions = df["question"].tolist()
+    for start in range(0, len(questions), 64):
+        for results in qdrant_search_batch(questions[start:start + 64], search_type):
+            contexts.append(context_text(results))
+    df["context"] = contexts
+    return df
+
+def coverage_report(probs: np.ndarray, y: np.ndarray) -> List[Dict[str, float]]:
+    """Share of answers the scorer keeps, and its accuracy on them, per confidence threshold"""
+    confidence = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == y
+    return [
+        {
+            "threshold": threshold,
+            "coverage": float((confidence >= threshold).mean()),
+            "accuracy": float(correct[confidence >= threshold].mean()) if (confidence >= threshold).any() else None,
+        }
+        for threshold in (0.5, 0.6, 0.7, 0.8, 0.9)
+    ]
+
+def calibrate(df: pd.DataFrame, encode: Encoder, folds: int = 5, seed: int = 42) -> Tuple[RelevanceScorer, Dict[str, Any]]:
+    """
+    Fit the scorer on judged answers
+
+    Accuracy and the coverage/accuracy trade-off are estimated with k-fold
+    cross-validation before the final fit on all rows.
+
+    Returns:
+        Tuple of (scorer fitted on every row, cross-validation report)
+    """
+    df = df[df["relevance"].isin(LABELS)].reset_index(drop=True)
+    X = extract_features(encode, df["question"].tolist(), df["answer"].tolist(), df["context"].tolist())
+    y = df["relevance"].map(LABELS.index).to_numpy()
+
+    order = np.random.default_rng(seed).permutation(len(y))
+    probs = np.zeros((len(y), len(LABELS)))
+    for fold in np.array_split(order, folds):
+        train = np.setdiff1d(order, fold)
+        probs[fold] = RelevanceScorer.fit(X[train], y[train]).predict_proba(X[fold])
+
+    report = {
+        "samples": int(len(y)),
+        "label_counts": df["relevance"].value_counts().to_dict(),
+        "cv_accuracy": float((probs.argmax(axis=1) == y).mean()),
+        "coverage": coverage_report(probs, y),
+    }
+    scorer = RelevanceScorer.fit(X, y)
+    scorer.metadata = {"calibrated_at": datetime.now().isoformat(), **report}
+    return scorer, report
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the local relevance scorer on stored LLM judgments")
+    parser.add_argument("--source", choices=["csv", "db"], default="csv",
+                        help="csv: offline evaluation results; db: judged conversations")
+    parser.add_argument("--output", default=str(SCORER_PATH))
+    args = parser.parse_args()
+
+    from rag import embedding_model
+
+    df = load_judgments_csv() if args.source == "csv" else load_judgments_db()
+    print(f"⚖️  Calibrating on {len(df)} LLM judgments ({args.source})")
+
+    scorer, report = calibrate(df, embedding_model.encode)
+    scorer.save(Path(args.output))
+
+    print(f"   Cross-validated accuracy: {report['cv_accuracy']:.1%}")
+    for row in report["coverage"]:
+        accuracy = "-" if row["accuracy"] is None else f"{row['accuracy']:.1%}"
+        print(f"   confidence >= {row['threshold']:.1f}: scores {row['coverage']:.0%} locally, accuracy {accuracy}")
+    print(f"✅ Scorer saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# reranker.py - CPU Cross-encoder Reranking of Retrieved Candidates
+import os
+import time
+import threading
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+# torch: sentence-transformers CrossEncoder; onnx: the same through ONNX Runtime
+# (RERANK_ONNX_FILE picks a quantized export, e.g. onnx/model_qint8_avx512_vnni.onnx);
+# fastembed: fastembed's ONNX cross-encoders, no torch needed
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "torch").lower()
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE", "")
+# Candidates retrieved for reranking, and how many of them go into the prompt
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+# Rerank time allowed per query; over budget, the retrieval order is used instead (0 = no budget)
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "0")) or None
+
+BACKENDS = ("torch", "onnx", "fastembed")
+# CrossEncoder takes backend= and model_kwargs= from this sentence-transformers release on
+ONNX_MIN_SENTENCE_TRANSFORMERS = (4, 1)
+DEFAULT_MODELS = {
+    "torch": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    "onnx": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    "fastembed": "Xenova/ms-marco-MiniLM-L-6-v2",
+}
+
+class Reranker:
+    """
+    Rescores (query, document) pairs with a cross-encoder and keeps the best
+
+    Pairs are scored in batches of `batch_size`. A rolling estimate of the
+    cost per pair decides how many candidates fit in the latency budget;
+    when not even `top_n` fit, or scoring runs over budget, the retrieval
+    order is returned unchanged.
+    """
+
+    def __init__(
+        self,
+        backend: str = RERANK_BACKEND,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        budget_ms: float = RERANK_BUDGET_MS,
+        threads: Optional[int] = RERANK_THREADS,
+        onnx_file: str = RERANK_ONNX_FILE,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown rerank backend: {backend} (choose from {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.model_name = model_name or DEFAULT_MODELS[backend]
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000 if budget_ms > 0 else None
+        self.seconds_per_pair: Optional[float] = None
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+        if threads and backend == "torch":
+            # Keep inference from competing with the request threads for every core
+            import torch
+            torch.set_num_threads(threads)
+
+        if backend == "fastembed":
+            from fastembed.rerank.cross_encoder import TextCrossEncoder
+
+            self.model = TextCrossEncoder(self.model_name, threads=threads)
+        else:
+            import sentence_transformers
+            from sentence_transformers import CrossEncoder
+
+            kwargs = {}
+            if backend == "onnx":
+                installed = tuple(int(part) for part in sentence_transformers.__version__.split(".")[:2])
+                if installed < ONNX_MIN_SENTENCE_TRANSFORMERS:
+                    raise RuntimeError(
+                        f"RERANK_BACKEND=onnx needs sentence-transformers>="
+                        f"{'.'.join(map(str, ONNX_MIN_SENTENCE_TRANSFORMERS))} "
+                        f"(installed: {sentence_transformers.__version__}); upgrade it or use fastembed"
+                    )
+                kwargs["backend"] = "onnx"
+                if onnx_file:
+                    kwargs["model_kwargs"] = {"file_name": onnx_file}
+            self.model = CrossEncoder(self.model_name, device="cpu", **kwargs)
+
+        # First inference pays for graph setup; keep it out of request latency
+        self._score("warm up", ["warm up"])
+
+    @classmethod
+    def from_env(cls) -> Optional["Reranker"]:
+        """Reranker configured from RERANK_* variables, or None unless RERANK_ENABLED"""
+        return cls() if RERANK_ENABLED else None
+
+    def _score(self, query: str, documents: List[str]) -> np.ndarray:
+        if self.backend == "fastembed":
+            return np.fromiter(self.model.rerank(query, documents, batch_size=len(documents)), dtype=np.float32)
+        return np.asarray(self.model.predict([(query, doc) for doc in documents],
+                                             batch_size=len(documents), show_progress_bar=False))
+
+    def affordable(self, count: int) -> int:
+        """How many of `count` candidates fit in the budget at the observed cost per pair"""
+        if self.budget is None or self.seconds_per_pair is None:
+            return count
+        return min(count, int(self.budget / self.seconds_per_pair))
+
+    def _count(self, counter: str, value: int = 1):
+        with self.lock:
+            self.counters[counter] += value
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Dict],
+        top_n: int = RERANK_TOP_N,
+        fallback_limit: Optional[int] = None,
+        use_budget: bool = True,
+    ) -> List[Dict]:
+        """
+        Reorder retrieved candidates by cross-encoder score
+
+        Args:
+            query: User question
+            candidates: Search results in retrieval order
+            top_n: Results to keep after reranking
+            fallback_limit: Results to return in retrieval order when reranking
+                is skipped (defaults to top_n)
+            use_budget: Apply the latency budget (offline evaluation turns it off)
+
+        Returns:
+            Up to top_n results with a "rerank_score", or the first
+            fallback_limit candidates unchanged when over budget
+        """
+        budget = self.budget if use_budget else None
+        fallback = candidates[:fallback_limit or top_n]
+        if not candidates:
+            return []
+
+        pool_size = len(candidates) if budget is None else self.affordable(len(candidates))
+        if pool_size < min(top_n, len(candidates)):
+            self._count("skipped_over_budget")
+            with self.lock:
+                # Relax the estimate so a one-off slow spell does not disable reranking for good
+                self.seconds_per_pair *= 0.9
+            return fallback
+        if pool_size < len(candidates):
+            self._count("truncated_pools")
+
+        start_time = time.time()
+        documents = [doc.get("content", doc.get("text", "")) for doc in candidates[:pool_size]]
+        scores = []
+        for start in range(0, len(documents), self.batch_size):
+            scores.extend(self._score(query, documents[start:start + self.batch_size]))
+            # Over budget with batches still to go; a finished pool is used even if late
+            if budget is not None and time.time() - start_time > budget and start + self.batch_size < len(documents):
+                self._count("timeouts")
+                self._observe(time.time() - start_time, len(scores))
+                return fallback
+
+        self._observe(time.time() - start_time, len(documents))
+        self._count("reranked")
+        order = np.argsort(-np.asarray(scores), kind="stable")[:top_n]
+        return [{**candidates[i], "rerank_score": float(scores[i])} for i in order]
+
+    def _observe(self, elapsed: float, pairs: int):
+        """Update the cost-per-pair estimate (exponential moving average)"""
+        if pairs == 0:
+            return
+        per_pair = elapsed / pairs
+        with self.lock:
+            if self.seconds_per_pair is None:
+                self.seconds_per_pair = per_pair
+            else:
+                self.seconds_per_pair = 0.5 * self.seconds_per_pair + 0.5 * per_pair
+
+    def stats(self) -> Dict[str, Any]:
+        """Rerank/fallback counters and the current cost estimate"""
+        with self.lock:
+            return {
+                "backend": self.backend,
+                "model": self.model_name,
+                "ms_per_pair": self.seconds_per_pair * 1000 if self.seconds_per_pair else None,
+                **self.counters,
+            }
@@ -0,0 +1,212 @@
+# resilience.py - Retries with Backoff and Per-provider Circuit Breakers for LLM Calls
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar, ContextManager, AsyncContextManager
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# Consecutive failures that open a provider's breaker, and seconds before it lets a probe through
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# OpenAI SDK errors that never reached a response
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+T = TypeVar("T")
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its breaker is open"""
+
+def status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection failures and 5xx responses"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if status_code(error) is not None:
+        return status_code(error) in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS or isinstance(error, (TimeoutError, ConnectionError))
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait (retry-after-ms / Retry-After headers)"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form; fall back to our own backoff
+    return None
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None,
+                  base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when given (capped)"""
+    requested = retry_after(error) if error is not None else None
+    if requested is not None:
+        return min(requested, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Closed -> open after `threshold` consecutive failures; open -> half-open
+    after `reset_timeout` seconds, when one probe call is let through. A
+    successful probe closes the breaker, a failed one re-opens it.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.probe_in_flight = False
+            if self.state == "open" or (self.state == "half_open" and self.probe_in_flight):
+                raise CircuitOpenError("circuit open")
+            if self.state == "half_open":
+                self.probe_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True when this failure opened the breaker"""
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self.opened_at = time.time()
+                self.probe_in_flight = False
+                return True
+            return False
+
+# Per-provider breakers and counters, shared by every caller in the process
+_breakers: Dict[str, CircuitBreaker] = {}
+_metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+_lock = threading.Lock()
+
+def breaker_for(provider: str) -> CircuitBreaker:
+    with _lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker()
+        return _breakers[provider]
+
+def _count(provider: str, name: str, value: float = 1):
+    with _lock:
+        _metrics[provider][name] += value
+
+def _before_attempt(provider: str, breaker: CircuitBreaker):
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        _count(provider, "short_circuited")
+        raise CircuitOpenError(f"{provider} circuit open; failing fast")
+    _count(provider, "calls")
+
+def _failure_delay(provider: str, breaker: CircuitBreaker, error: Exception,
+                   attempt: int, max_retries: int) -> Optional[float]:
+    """Record a failed attempt; returns the backoff before the next one, or None to give up"""
+    _count(provider, "failures")
+    retryable = is_retryable(error)
+    if not retryable:
+        # The provider answered (e.g. 400/401): it is up, the request is bad
+        breaker.record_success()
+    elif breaker.record_failure():
+        _count(provider, "breaker_opens")
+    if not retryable or attempt == max_retries:
+        return None
+    delay = backoff_delay(attempt, error)
+    _count(provider, "retries")
+    _count(provider, "retry_seconds", delay)
+    return delay
+
+def call_with_resilience(provider: str, fn: Callable[[], T], max_retries: int = LLM_MAX_RETRIES,
+                         slot: Optional[Callable[[], ContextManager]] = None) -> T:
+    """
+    Call a provider with retries and its circuit breaker
+
+    Args:
+        provider: Provider name ("openai", "ollama"), one breaker each
+        fn: The request to make
+        max_retries: Retries after the first attempt for retryable errors
+        slot: Context manager held around each attempt (e.g. the model's in-flight
+            slot), so it is released while backing off; its errors are not retried
+
+    Returns:
+        Whatever fn returns
+
+    Raises:
+        CircuitOpenError: the provider's breaker is open (no request made)
+        Exception: the last error, once it is not retryable or retries run out
+    """
+    breaker = breaker_for(provider)
+    for attempt in range(max_retries + 1):
+        with slot() if slot else nullcontext():
+            _before_attempt(provider, breaker)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = _failure_delay(provider, breaker, e, attempt, max_retries)
+                if delay is None:
+                    raise
+            else:
+                breaker.record_success()
+                return result
+        time.sleep(delay)
+
+async def acall_with_resilience(provider: str, fn: Callable[[], Awaitable[T]], max_retries: int = LLM_MAX_RETRIES,
+                                slot: Optional[Callable[[], AsyncContextManager]] = None) -> T:
+    """
+    call_with_resilience for coroutines: same breakers and counters, backoff without blocking the event loop
+
+    Args:
+        provider: Provider name ("openai", "ollama"), one breaker each
+        fn: Returns a new awaitable request on every attempt
+        max_retries: Retries after the first attempt for retryable errors
+        slot: Async context manager held around each attempt, released while backing off
+    """
+    breaker = breaker_for(provider)
+    for attempt in range(max_retries + 1):
+        async with slot() if slot else nullcontext():
+            _before_attempt(provider, breaker)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = _failure_delay(provider, breaker, e, attempt, max_retries)
+                if delay is None:
+                    raise
+            else:
+                breaker.record_success()
+                return result
+        await asyncio.sleep(delay)
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Retry/failure counters, time spent backing off and breaker state per provider"""
+    with _lock:
+        providers = set(_metrics) | set(_breakers)
+        return {
+            provider: {
+                **dict(_metrics[provider]),
+                "breaker_state": _breakers[provider].state if provider in _breakers else "closed",
+            }
+            for provider in sorted(providers)
+        }
@@ -0,0 +1,295 @@
+# retrieval_cache.py - Retrieval Result Cache Shared Across Processes (SQLite or Redis), Invalidated on Reindex
+import os
+import json
+import time
+import zlib
+import sqlite3
+import asyncio
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Union
+
+from metrics import record_cache
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# sqlite: a local file shared by every process on the host; redis: a Redis-compatible server; off: no cache
+RETRIEVAL_CACHE = os.getenv("RETRIEVAL_CACHE", "sqlite").lower()
+RETRIEVAL_CACHE_PATH = Path(os.getenv("RETRIEVAL_CACHE_PATH", PROJECT_ROOT / "data" / "cache" / "retrieval.db"))
+RETRIEVAL_CACHE_URL = os.getenv("RETRIEVAL_CACHE_URL", "redis://localhost:6379/0")
+# Seconds an entry is served for
+RETRIEVAL_CACHE_TTL = int(os.getenv("RETRIEVAL_CACHE_TTL", "86400"))
+# Seconds a process trusts the collection version it last read (how soon a reindex is noticed)
+RETRIEVAL_CACHE_VERSION_TTL = float(os.getenv("RETRIEVAL_CACHE_VERSION_TTL", "5"))
+
+BACKENDS = ("sqlite", "redis", "off")
+
+def cache_key(collection: str, version: int, query: str, search_type: str, limit: int,
+              location: Optional[Union[str, List[str]]]) -> str:
+    """SHA-256 of everything that determines a search result"""
+    spec = json.dumps([collection, version, query, search_type, limit, location], separators=(",", ":"))
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+def encode_results(results: List[Dict[str, Any]]) -> bytes:
+    """Compact form of search results: minified JSON, zlib-compressed"""
+    return zlib.compress(json.dumps(results, separators=(",", ":")).encode("utf-8"))
+
+def decode_results(blob: bytes) -> List[Dict[str, Any]]:
+    return json.loads(zlib.decompress(blob))
+
+class SQLiteStore:
+    """Entries and collection versions in one SQLite file (WAL, so processes read while one writes)"""
+
+    def __init__(self, path: Path = RETRIEVAL_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by worker threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS retrieval_cache (
+                key TEXT PRIMARY KEY,
+                collection TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                results BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS collection_versions (
+                collection TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results FROM retrieval_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, collection: str, version: int, results: bytes, ttl: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retrieval_cache VALUES (?, ?, ?, ?, ?)",
+                (key, collection, version, results, time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._conn.execute("DELETE FROM retrieval_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def get_version(self, collection: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, collection: str) -> int:
+        """Move the collection to a new version and drop its older entries and expired ones"""
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO collection_versions VALUES (?, 1)
+                   ON CONFLICT(collection) DO UPDATE SET version = version + 1""",
+                (collection,),
+            )
+            version = self._conn.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "DELETE FROM retrieval_cache WHERE (collection = ? AND version < ?) OR expires_at <= ?",
+                (collection, version, time.time()),
+            )
+            self._conn.commit()
+        return version
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM retrieval_cache").fetchone()[0]
+
+class RedisStore:
+    """Entries as Redis strings with a TTL; old versions are never read again and simply expire"""
+
+    def __init__(self, url: str = RETRIEVAL_CACHE_URL, prefix: str = "retrieval:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(f"{self.prefix}{key}")
+
+    def set(self, key: str, collection: str, version: int, results: bytes, ttl: int):
+        self.client.set(f"{self.prefix}{key}", results, ex=ttl)
+
+    def get_version(self, collection: str) -> int:
+        return int(self.client.get(f"{self.prefix}version:{collection}") or 0)
+
+    def bump_version(self, collection: str) -> int:
+        return int(self.client.incr(f"{self.prefix}version:{collection}"))
+
+    def size(self) -> Optional[int]:
+        return None  # Shared with other keys; not counted
+
+class RetrievalCache:
+    """
+    Search results keyed by (query, search type, limit, filter, collection version)
+
+    The collection version lives in the store, so every process sharing the
+    store stops using a collection's entries once setup.py reindexes it and
+    calls bump_version(). Store errors never fail a search: they count as
+    misses and are reported once per failure streak.
+    """
+
+    def __init__(self, store: Union[SQLiteStore, RedisStore], backend: str = "sqlite",
+                 ttl: int = RETRIEVAL_CACHE_TTL, version_ttl: float = RETRIEVAL_CACHE_VERSION_TTL):
+        self.store = store
+        self.backend = backend
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.versions: Dict[str, tuple] = {}
+        self.counters = defaultdict(int)
+        self.failing = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["RetrievalCache"]:
+        """Cache configured from RETRIEVAL_CACHE* variables, or None when off"""
+        if RETRIEVAL_CACHE not in BACKENDS:
+            raise ValueError(f"Unknown retrieval cache: {RETRIEVAL_CACHE} (choose from {', '.join(BACKENDS)})")
+        if RETRIEVAL_CACHE == "off":
+            return None
+        store = RedisStore() if RETRIEVAL_CACHE == "redis" else SQLiteStore()
+        return cls(store, RETRIEVAL_CACHE)
+
+    def _store_failed(self, action: str, error: Exception):
+        with self.lock:
+            self.counters["errors"] += 1
+            first = not self.failing
+            self.failing = True
+        if first:
+            print(f"⚠️  Retrieval cache ({self.backend}) {action} failed: {error}")
+
+    def version(self, collection: str) -> int:
+        """The collection's version, re-read from the store every version_ttl seconds"""
+        now = time.time()
+        with self.lock:
+            cached = self.versions.get(collection)
+        if cached and now - cached[1] < self.version_ttl:
+            return cached[0]
+        version = self.store.get_version(collection)
+        with self.lock:
+            self.versions[collection] = (version, now)
+        return version
+
+    def get(self, collection: str, query: str, search_type: str, limit: int,
+            location: Optional[Union[str, List[str]]]) -> Optional[List[Dict[str, Any]]]:
+        """Cached results, or None on a miss"""
+        try:
+            key = cache_key(collection, self.version(collection), query, search_type, limit, location)
+            blob = self.store.get(key)
+            results = decode_results(blob) if blob is not None else None
+        except Exception as e:
+            self._store_failed("read", e)
+            results = None
+
+        hit = results is not None
+        with self.lock:
+            self.counters[f"{search_type}_{'hits' if hit else 'misses'}"] += 1
+        record_cache(f"retrieval_{search_type}", hit)
+        return results
+
+    def set(self, collection: str, query: str, search_type: str, limit: int,
+            location: Optional[Union[str, List[str]]], results: List[Dict[str, Any]]):
+        try:
+            version = self.version(collection)
+            key = cache_key(collection, version, query, search_type, limit, location)
+            self.store.set(key, collection, version, encode_results(results), self.ttl)
+        except Exception as e:
+            self._store_failed("write", e)
+        else:
+            self.failing = False
+
+    async def aget(self, collection: str, query: str, search_type: str, limit: int,
+                   location: Optional[Union[str, List[str]]]) -> Optional[List[Dict[str, Any]]]:
+        """get() on a worker thread, so a slow store doesn't block the event loop"""
+        return await asyncio.to_thread(self.get, collection, query, search_type, limit, location)
+
+    async def aset(self, collection: str, query: str, search_type: str, limit: int,
+                   location: Optional[Union[str, List[str]]], results: List[Dict[str, Any]]):
+        await asyncio.to_thread(self.set, collection, query, search_type, limit, location, results)
+
+    def bump_version(self, collection: str) -> int:
+        """Invalidate the collection's entries (call after reindexing it)"""
+        version = self.store.bump_version(collection)
+        with self.lock:
+            self.versions.pop(collection, None)
+        return version
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits, misses and hit rate per search type, store errors and the entry count"""
+        with self.lock:
+            counters = dict(self.counters)
+        search_types = sorted({name.rsplit("_", 1)[0] for name in counters if name.endswith(("_hits", "_misses"))})
+        by_search_type = {}
+        for search_type in search_types:
+            hits, misses = counters.get(f"{search_type}_hits", 0), counters.get(f"{search_type}_misses", 0)
+            by_search_type[search_type] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        try:
+            entries = self.store.size()
+        except Exception:
+            entries = None
+        return {
+            "backend": self.backend,
+            "entries": entries,
+            "errors": counters.get("errors", 0),
+            "by_search_type": by_search_type,
+        }
+
+def bump_collection_version(collection: str) -> Optional[int]:
+    """
+    Invalidate cached results for a reindexed collection in the configured store
+
+    Returns:
+        The new version, or None when the cache is off or the store is unreachable
+    """
+    cache = RetrievalCache.from_env()
+    if cache is None:
+        return None
+    try:
+        return cache.bump_version(collection)
+    except Exception as e:
+        print(f"⚠️  Could not invalidate the retrieval cache ({cache.backend}): {e}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the retrieval cache")
+    parser.add_argument("command", choices=["stats", "invalidate"])
+    parser.add_argument("--collection", default="travel-docs")
+    args = parser.parse_args()
+
+    cache = RetrievalCache.from_env()
+    if cache is None:
+        print("Retrieval cache is off (RETRIEVAL_CACHE=off)")
+        return
+
+    if args.command == "invalidate":
+        print(f"🧹 {args.collection} is now at version {cache.bump_version(args.collection)}")
+    else:
+        print(f"🗄️  {cache.backend}: version {cache.version(args.collection)} of {args.collection}, "
+              f"{cache.store.size()} entries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# retrieval_eval.py - Retrieval Evaluation Engine (hit rate, MRR, nDCG)
+import os
+import json
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+GROUND_TRUTH_PATH = PROJECT_ROOT / "data" / "processed" / "ground-truth-retrieval.csv"
+RESULTS_DIR = PROJECT_ROOT / "results"
+
+def load_ground_truth(path: Path = GROUND_TRUTH_PATH, sample: Optional[int] = None) -> pd.DataFrame:
+    """Load (question, id) ground-truth pairs, optionally the first `sample` rows"""
+    df = pd.read_csv(path)
+    return df.head(sample) if sample else df
+
+def relevance_matrix(expected_ids: Sequence[str], results: List[List[Dict]], k: int) -> np.ndarray:
+    """
+    Build a boolean (n_queries x k) relevance matrix
+
+    A result is relevant when its id, or one of the chunk IDs merged into it
+    by deduplication, equals the expected ground-truth id.
+    """
+    relevance = np.zeros((len(expected_ids), k), dtype=bool)
+    for row, (expected, hits) in enumerate(zip(expected_ids, results)):
+        for rank, hit in enumerate(hits[:k]):
+            relevance[row, rank] = hit.get("id") == expected or expected in hit.get("merged_ids", [])
+    return relevance
+
+def compute_metrics(relevance: np.ndarray, ks: Sequence[int] = (1, 3, 5), n_relevant: int = 1) -> Dict[str, float]:
+    """
+    Vectorized retrieval metrics over a relevance matrix
+
+    Args:
+        relevance: Boolean (n_queries x k) matrix, column j = rank j + 1
+        ks: Cutoffs for hit rate and nDCG
+        n_relevant: Relevant documents per query (1 for our ground truth)
+
+    Returns:
+        Dictionary with hit_rate@k, ndcg@k, mrr and total_questions
+    """
+    relevance = np.asarray(relevance, dtype=bool)
+    n_queries, depth = relevance.shape
+    if n_queries == 0:
+        return {"total_questions": 0}
+
+    ranks = np.arange(1, depth + 1)
+    discounts = 1.0 / np.log2(ranks + 1)
+    first_hit = np.where(relevance.any(axis=1), relevance.argmax(axis=1) + 1, 0)
+
+    metrics = {
+        "mrr": float(np.where(first_hit > 0, 1.0 / np.maximum(first_hit, 1), 0.0).mean()),
+        "total_questions": int(n_queries),
+    }
+    for k in ks:
+        k = min(k, depth)
+        dcg = (relevance[:, :k] * discounts[:k]).sum(axis=1)
+        idcg = discounts[:min(n_relevant, k)].sum()
+        metrics[f"hit_rate@{k}"] = float(relevance[:, :k].any(axis=1).mean())
+        metrics[f"ndcg@{k}"] = float((dcg / idcg).mean())
+    metrics["hit_rate"] = metrics[f"hit_rate@{min(max(ks), depth)}"]
+    return metrics
+
+def run_searches(
+    questions: List[str],
+    search_type: str = "semantic",
+    limit: int = 5,
+    batch_size: int = 16,
+    workers: int = 4,
+    auto_location: bool = False,
+) -> Tuple[List[List[Dict]], np.ndarray]:
+    """
+    Run rag.qdrant_search over many questions with batched requests on a worker pool
+
+    Args:
+        questions: Queries to run
+        search_type: "semantic" or "hybrid"
+        limit: Results per query
+        batch_size: Queries sent per Qdrant batch request
+        workers: Concurrent batch requests in flight
+        auto_location: Apply rag.detect_locations() filters, as get_answer does
+
+    Returns:
+        Tuple of (results per query, per-query latency in seconds). A query's
+        latency is the wall time of the batch request that carried it.
+    """
+    import rag
+
+    def run_batch(batch: List[str]) -> Tuple[List[List[Dict]], float]:
+        start_time = time.time()
+        if auto_location:
+            # Filters differ per question, so send them one by one
+            results = [rag.qdrant_search(q, search_type, limit, rag.detect_locations(q) or None) for q in batch]
+        else:
+            results = rag.qdrant_search_batch(batch, search_type, limit)
+        return results, time.time() - start_time
+
+    batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+    results, latencies = [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch, (batch_results, elapsed) in zip(batches, pool.map(run_batch, batches)):
+            results.extend(batch_results)
+            latencies.extend([elapsed] * len(batch))
+
+    return results, np.asarray(latencies)
+
+def rerank_results(questions: List[str], results: List[List[Dict]], limit: int) -> np.ndarray:
+    """
+    Rerank every query's candidates in place, without the latency budget
+
+    Returns:
+        Rerank time per query in seconds
+    """
+    import rag
+    from reranker import Reranker
+
+    reranker = rag.reranker or Reranker()
+    latencies = []
+    for i, (question, candidates) in enumerate(zip(questions, results)):
+        start_time = time.time()
+        results[i] = reranker.rerank(question, candidates, limit, use_budget=False)
+        latencies.append(time.time() - start_time)
+    return np.asarray(latencies)
+
+def evaluate(
+    search_type: str = "semantic",
+    limit: int = 5,
+    sample: Optional[int] = None,
+    batch_size: int = 16,
+    workers: int = 4,
+    auto_location: bool = False,
+    output_dir: Path = RESULTS_DIR,
+    rerank_candidates: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Evaluate retrieval against the ground truth and write a timestamped summary
+
+    With rerank_candidates, that many results are retrieved per question and
+    cross-encoder reranked down to `limit`; latency then includes the rerank.
+
+    Returns:
+        Summary dictionary (also written as JSON, with a per-query CSV alongside)
+    """
+    import rag
+
+    ground_truth = load_ground_truth(sample=sample)
+    method = f"{search_type}+rerank{rerank_candidates}" if rerank_candidates else search_type
+    print(f"🔎 Evaluating {method} search on {len(ground_truth)} questions "
+          f"(batch size {batch_size}, {workers} workers)...")
+
+    start_time = time.time()
+    questions = ground_truth["question"].tolist()
+    results, latencies = run_searches(
+        questions, search_type, rerank_candidates or limit, batch_size, workers, auto_location
+    )
+    if rerank_candidates:
+        latencies = latencies + rerank_results(questions, results, limit)
+    wall_time = time.time() - start_time
+
+    relevance = relevance_matrix(ground_truth["id"].tolist(), results, limit)
+    metrics = compute_metrics(relevance, ks=sorted({1, 3, limit}))
+    summary = {
+        "method": method,
+        "limit": limit,
+        "auto_location": auto_location,
+        # Only --auto-location searches go through the cache (batched searches bypass it)
+        "retrieval_cache": auto_location and rag.retrieval_cache is not None,
+        "batch_size": batch_size,
+        "workers": workers,
+        "metrics": metrics,
+        "latency_ms": {
+            "mean": float(latencies.mean() * 1000),
+            "p50": float(np.percentile(latencies, 50) * 1000),
+            "p95": float(np.percentile(latencies, 95) * 1000),
+            "p99": float(np.percentile(latencies, 99) * 1000),
+        },
+        "queries_per_sec": len(ground_truth) / wall_time if wall_time > 0 else 0.0,
+        "evaluation_timestamp": datetime.now().isoformat(),
+    }
+
+    first_hit = np.where(relevance.any(axis=1), relevance.argmax(axis=1) + 1, 0)
+    per_query = pd.DataFrame({
+        "question": ground_truth["question"],
+        "id": ground_truth["id"],
+        "rank": first_hit,
+        "reciprocal_rank": np.where(first_hit > 0, 1.0 / np.maximum(first_hit, 1), 0.0),
+        "latency_ms": latencies * 1000,
+    })
+
+    output_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    stem = f"retrieval_eval_{method}_{timestamp}"
+    with open(output_dir / f"{stem}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    per_query.to_csv(output_dir / f"{stem}.csv", index=False)
+
+    print(f"   Hit Rate: {metrics['hit_rate']:.4f} | MRR: {metrics['mrr']:.4f} | "
+          f"nDCG@{limit}: {metrics[f'ndcg@{limit}']:.4f}")
+    print(f"   Latency p50/p95: {summary['latency_ms']['p50']:.1f}/{summary['latency_ms']['p95']:.1f} ms, "
+          f"{summary['queries_per_sec']:.1f} queries/sec")
+    print(f"   Results saved to: {output_dir / stem}.json / .csv")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval against the ground truth")
+    parser.add_argument("--search-type", nargs="+", default=["semantic", "hybrid"],
+                        choices=["semantic", "hybrid"])
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=None, help="Evaluate only the first N questions")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--auto-location", action="store_true",
+                        help="Apply detected location filters like get_answer does")
+    parser.add_argument("--rerank", type=int, default=None, metavar="CANDIDATES",
+                        help="Retrieve this many candidates and cross-encoder rerank them down to --limit")
+    parser.add_argument("--retrieval-cache", action="store_true",
+                        help="Serve repeated searches from the retrieval cache (off so searches are measured)")
+    args = parser.parse_args()
+
+    if not args.retrieval_cache:
+        # Cache hits would stand in for the Qdrant searches being measured; set before
+        # anything imports rag (use_offline_services() requires that too)
+        os.environ["RETRIEVAL_CACHE"] = "off"
+
+    for search_type in args.search_type:
+        evaluate(search_type, args.limit, args.sample, args.batch_size, args.workers, args.auto_location,
+                 rerank_candidates=args.rerank)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# router.py - Latency-aware LLM Routing with Hedged Requests and Fallback
+import os
+import time
+import threading
+from collections import deque, defaultdict
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+import numpy as np
+
+# Fallback chains, e.g. "ollama/phi3=openai/gpt-4o-mini,openai/gpt-4o=openai/gpt-4o-mini|openai/gpt-3.5-turbo"
+LLM_FALLBACKS = os.getenv("LLM_FALLBACKS", "")
+# Seconds before a hedged request goes to the first fallback; "auto" uses the model's rolling p95, 0 disables hedging
+LLM_HEDGE_DELAY = os.getenv("LLM_HEDGE_DELAY", "auto")
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))
+ROUTER_ERROR_THRESHOLD = float(os.getenv("ROUTER_ERROR_THRESHOLD", "0.5"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+
+# Hedge delay used by "auto" until a model has enough samples, and its bounds
+DEFAULT_HEDGE_DELAY = 2.0
+MIN_HEDGE_DELAY, MAX_HEDGE_DELAY = 0.25, 15.0
+
+# call(prompt, model, **kwargs) -> (answer, tokens)
+LLMCall = Callable[..., Tuple[str, Dict[str, int]]]
+# on_abandoned(model, tokens): usage of a losing call that still ran to completion
+UsageCallback = Callable[[str, Dict[str, int]], None]
+
+def parse_fallbacks(spec: str) -> Dict[str, List[str]]:
+    """Parse "primary=fallback1|fallback2,..." into {primary: [fallbacks]}"""
+    fallbacks = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        primary, _, chain = entry.partition("=")
+        fallbacks[primary.strip()] = [m.strip() for m in chain.split("|") if m.strip()]
+    return fallbacks
+
+class ModelStats:
+    """Rolling latency and error rate over a model's last `window` calls"""
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.calls = deque(maxlen=window)  # (latency, ok)
+        self.counters = defaultdict(int)
+
+    def record(self, latency: float, ok: bool):
+        self.calls.append((latency, ok))
+        self.counters["calls"] += 1
+        self.counters["errors"] += 0 if ok else 1
+
+    def error_rate(self) -> float:
+        return float(1 - np.mean([ok for _, ok in self.calls])) if self.calls else 0.0
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        latencies = [latency for latency, ok in self.calls if ok]
+        return float(np.percentile(latencies, q)) if latencies else None
+
+class CallStarted(threading.Event):
+    """Set once a submitted call starts running on a pool thread"""
+
+    def __init__(self):
+        super().__init__()
+        self.time = None
+
+    def mark(self):
+        self.time = time.time()
+        self.set()
+
+class Router:
+    """
+    Routes LLM calls across a model and its fallbacks
+
+    The requested model is tried first unless its recent error rate marks it
+    unhealthy. If it has not answered after the hedge delay, the same prompt
+    is also sent to the next model and the first successful answer wins; the
+    slower request is abandoned (cancelled if it has not started). Errors
+    fall through to the remaining fallbacks in order.
+
+    The hedge delay counts from when a call starts running on a pool thread,
+    not from when it was queued. An abandoned call that had already started
+    still finishes (and is billed), so its usage is passed to on_abandoned.
+    """
+
+    def __init__(
+        self,
+        call: LLMCall,
+        fallbacks: Dict[str, List[str]],
+        hedge_delay: str = LLM_HEDGE_DELAY,
+        window: int = ROUTER_WINDOW,
+        error_threshold: float = ROUTER_ERROR_THRESHOLD,
+        min_samples: int = ROUTER_MIN_SAMPLES,
+        max_workers: int = 32,
+        on_abandoned: Optional[UsageCallback] = None,
+    ):
+        self.call = call
+        self.on_abandoned = on_abandoned
+        self.fallbacks = fallbacks
+        self.hedge_delay = hedge_delay
+        self.window = window
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.model_stats: Dict[str, ModelStats] = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+
+    @classmethod
+    def from_env(cls, call: LLMCall, on_abandoned: Optional[UsageCallback] = None) -> Optional["Router"]:
+        """Router configured from LLM_FALLBACKS / LLM_HEDGE_DELAY, or None when no fallbacks are set"""
+        fallbacks = parse_fallbacks(LLM_FALLBACKS)
+        return cls(call, fallbacks, on_abandoned=on_abandoned) if fallbacks else None
+
+    def _model_stats(self, model: str) -> ModelStats:
+        # Caller holds self.lock
+        if model not in self.model_stats:
+            self.model_stats[model] = ModelStats(self.window)
+        return self.model_stats[model]
+
+    def _count(self, model: str, counter: str):
+        with self.lock:
+            self._model_stats(model).counters[counter] += 1
+
+    def _record(self, model: str, latency: float, ok: bool):
+        with self.lock:
+            self._model_stats(model).record(latency, ok)
+
+    def is_healthy(self, model: str) -> bool:
+        with self.lock:
+            stats = self._model_stats(model)
+            return len(stats.calls) < self.min_samples or stats.error_rate() < self.error_threshold
+
+    def candidates(self, model_choice: str) -> List[str]:
+        """Requested model followed by its fallbacks, healthy models first"""
+        chain = [model_choice] + [m for m in self.fallbacks.get(model_choice, []) if m != model_choice]
+        return sorted(chain, key=lambda m: not self.is_healthy(m))
+
+    def delay_for(self, model: str) -> Optional[float]:
+        """Hedge delay for a model (None disables hedging)"""
+        if self.hedge_delay != "auto":
+            delay = float(self.hedge_delay)
+            return delay if delay > 0 else None
+        with self.lock:
+            stats = self._model_stats(model)
+            p95 = stats.latency_percentile(95) if len(stats.calls) >= self.min_samples else None
+        return min(max(p95 or DEFAULT_HEDGE_DELAY, MIN_HEDGE_DELAY), MAX_HEDGE_DELAY)
+
+    def _submit(self, model: str, prompt: str, **kwargs) -> Future:
+        started = CallStarted()
+
+        def run():
+            started.mark()
+            start_time = started.time
+            try:
+                result = self.call(prompt, model, **kwargs)
+            except Exception:
+                self._record(model, time.time() - start_time, False)
+                raise
+            self._record(model, time.time() - start_time, True)
+            return result
+
+        future = self.pool.submit(run)
+        future.started = started
+        return future
+
+    def _hedge_timeout(self, future: Future, delay: float) -> float:
+        """Seconds left before hedging a call, counting from when it started running"""
+        # Waiting for a free pool thread does not count towards the hedge delay
+        future.started.wait()
+        return max(delay - (time.time() - future.started.time), 0.0)
+
+    def _abandon(self, future: Future, model: str):
+        """Stop waiting for a losing call, keeping track of its usage if it still completes"""
+        self._count(model, "abandoned")
+        if future.cancel():
+            return
+
+        def finished(future: Future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            _, tokens = future.result()
+            self._count(model, "abandoned_completed")
+            if self.on_abandoned:
+                self.on_abandoned(model, tokens)
+
+        future.add_done_callback(finished)
+
+    def complete(self, prompt: str, model_choice: str, **kwargs) -> Tuple[str, Dict[str, int], str]:
+        """
+        Answer a prompt, hedging and falling back as needed
+
+        Extra keyword arguments (e.g. system_prompt) are passed to every call.
+
+        Returns:
+            Tuple of (answer, token usage, model that produced the answer)
+
+        Raises:
+            RuntimeError: when the model and all of its fallbacks fail
+        """
+        remaining = self.candidates(model_choice)
+        first = remaining.pop(0)
+        in_flight = {self._submit(first, prompt, **kwargs): first}
+        delay = self.delay_for(first)
+        errors = []
+
+        while in_flight:
+            hedge_possible = remaining and delay is not None and len(in_flight) == 1
+            timeout = self._hedge_timeout(next(iter(in_flight)), delay) if hedge_possible else None
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Slow answer: hedge with the next model
+                hedge = remaining.pop(0)
+                self._count(hedge, "hedges")
+                in_flight[self._submit(hedge, prompt, **kwargs)] = hedge
+                continue
+
+            for future in done:
+                model = in_flight.pop(future)
+                try:
+                    answer, tokens = future.result()
+                except Exception as e:
+                    errors.append(f"{model}: {e}")
+                    continue
+
+                for other, other_model in in_flight.items():
+                    self._abandon(other, other_model)
+                if model != model_choice:
+                    self._count(model, "served_for_others")
+                return answer, tokens, model
+
+            if not in_flight and remaining:
+                # Every request in flight failed: fall back to the next model
+                fallback = remaining.pop(0)
+                self._count(fallback, "fallbacks")
+                in_flight[self._submit(fallback, prompt, **kwargs)] = fallback
+                delay = self.delay_for(fallback)
+
+        raise RuntimeError("All models failed: " + "; ".join(errors))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Rolling latency/error stats and hedge/fallback counters per model"""
+        with self.lock:
+            return {
+                model: {
+                    "window_calls": len(stats.calls),
+                    "error_rate": stats.error_rate(),
+                    "p50_latency": stats.latency_percentile(50),
+                    "p95_latency": stats.latency_percentile(95),
+                    **stats.counters,
+                }
+                for model, stats in self.model_stats.items()
+            }
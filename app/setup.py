@@ -2,8 +2,10 @@
 import os
 import json
 import uuid
+import time
 import hashlib
 from pathlib import Path
+from datetime import datetime
 from dotenv import load_dotenv
 from tqdm import tqdm
 
@@ -11,17 +13,27 @@ from tqdm import tqdm
 load_dotenv()
 
 from db import init_db
+from retrieval_cache import bump_collection_version
+from dedup import deduplicate
+from collection_profile import load_profile, collection_params, verify_collection, is_local_client
 from qdrant_client import QdrantClient, models
 
-def setup_qdrant():
+# Drop near-duplicate / low-information chunks before indexing
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+
+def setup_qdrant(client=None, collection_name="travel-docs", profile=None):
     """Setup Qdrant collection for documents"""
     print("🔧 Setting up Qdrant vector database...")
     
-    # Initialize Qdrant client
-    qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-    client = QdrantClient(qdrant_url)
-    
-    collection_name = "travel-docs"  
+    # Initialize Qdrant client (":memory:" gives a local in-process instance)
+    if client is None:
+        qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
+        client = QdrantClient(qdrant_url)
+
+    # Shards, replicas, on-disk storage and optimizer settings (collection_profiles.yaml)
+    if profile is None:
+        profile = load_profile()
+    print(f"Using collection profile: {profile['name']}")
     
     try:
         # Delete existing collection if it exists
@@ -33,21 +45,22 @@ def setup_qdrant():
     # Create new collection with hybrid vector configuration
     client.create_collection(
         collection_name=collection_name,
-        vectors_config={
-            # Dense vector configuration for semantic search
-            "jina-small": models.VectorParams(
-                size=512,  # Jina embeddings v2 small dimension
-                distance=models.Distance.COSINE,
-            ),
-        },
-        sparse_vectors_config={
-            # Sparse vector configuration for keyword search  
-            "bm25": models.SparseVectorParams(
-                modifier=models.Modifier.IDF,
-            )
-        }
+        **collection_params(profile)
     )
-    
+
+    # Keyword payload indexes so location / doc_id filters don't scan the collection
+    for field_name in ("location", "doc_id"):
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+
+    # Local (in-process) Qdrant ignores topology settings, so only verify servers
+    mismatches = [] if is_local_client(client) else verify_collection(client, collection_name, profile)
+    for mismatch in mismatches:
+        print(f"⚠️  Collection config differs from profile: {mismatch}")
+
     print(f"✅ Created Qdrant collection: {collection_name}")
     return client, collection_name
 
@@ -55,24 +68,32 @@ def load_documents():
     """Load processed documents from your pipeline"""
     print("📄 Loading documents...")
     
-    # Check if documents-with-ids.json exists (from your notebooks)
+    # Prefer the JSONL written by ingest.py (the chunked PDFs), falling back
+    # to documents-with-ids.json (from your notebooks)
     doc_paths = [
+        "data/processed/documents-with-ids.jsonl",
+        "../data/processed/documents-with-ids.jsonl",
         "data/processed/documents-with-ids.json",
         "../data/processed/documents-with-ids.json",
-        "documents-with-ids.json"
+        "documents-with-ids.json",
     ]
-    
+    if os.getenv("DOCUMENTS_PATH"):
+        doc_paths.insert(0, os.getenv("DOCUMENTS_PATH"))
+
     documents = None
     for doc_path in doc_paths:
         if os.path.exists(doc_path):
             print(f"Loading documents from: {doc_path}")
             with open(doc_path, 'r', encoding='utf-8') as f:
-                documents = json.load(f)
+                if doc_path.endswith(".jsonl"):
+                    documents = [json.loads(line) for line in f if line.strip()]
+                else:
+                    documents = json.load(f)
             break
-    
+
     if documents is None:
         print("⚠️  No processed documents found. Please run your document processing pipeline first.")
-        print("Expected file: data/processed/documents-with-ids.json")
+        print("Expected file: data/processed/documents-with-ids.json (or run app/ingest.py)")
         return []
     
     print(f"✅ Loaded {len(documents)} documents")
@@ -111,7 +132,9 @@ def index_documents(client, collection_name, documents):
                 "content": doc['content'],
                 "location": doc.get('location', ''),
                 "doc_id": doc.get('doc_id', ''),
-                "id": doc_id
+                "id": doc_id,
+                # IDs of dropped duplicate / low-information chunks this one stands for
+                "merged_ids": doc.get('merged_ids', [])
             }
         )
         points.append(point)
@@ -124,6 +147,27 @@ def index_documents(client, collection_name, documents):
     
     print(f"✅ Indexed {len(points)} documents successfully")
 
+def report_dedup(report, index_time):
+    """Print and save the index-size / indexing-time reduction from deduplication"""
+    dropped = report["input_chunks"] - report["kept_chunks"]
+    per_chunk = index_time / report["kept_chunks"] if report["kept_chunks"] else 0.0
+    report["index_time"] = index_time
+    report["estimated_index_time_saved"] = per_chunk * dropped
+
+    print("\n🧹 Deduplication report:")
+    print(f"   Chunks: {report['input_chunks']} → {report['kept_chunks']} "
+          f"({report['index_size_reduction']:.1%} smaller index)")
+    print(f"   Dropped: {report['dropped_duplicates']} near-duplicates, "
+          f"{report['dropped_low_information']} low-information")
+    print(f"   Content: {report['content_bytes_before']} → {report['content_bytes_after']} bytes")
+    print(f"   Indexing took {index_time:.1f}s, ~{report['estimated_index_time_saved']:.1f}s saved")
+
+    results_dir = Path(__file__).resolve().parent.parent / "results"
+    results_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with open(results_dir / f"dedup_report_{timestamp}.json", "w") as f:
+        json.dump(report, f, indent=2)
+
 def generate_sample_data():
     """Generate sample travel documents for testing"""
     print("🧪 Generating sample travel documents...")
@@ -195,8 +239,20 @@ def main():
         if not documents:
             print("📝 Using sample documents for demonstration...")
             documents = generate_sample_data()
-        
+
+        report = None
+        if DEDUP_ENABLED:
+            documents, report = deduplicate(documents)
+
+        start_time = time.time()
         index_documents(client, collection_name, documents)
+        if report:
+            report_dedup(report, time.time() - start_time)
+
+        # Cached search results describe the old index
+        version = bump_collection_version(collection_name)
+        if version is not None:
+            print(f"🧹 Retrieval cache invalidated ({collection_name} is now version {version})")
         
     except Exception as e:
         print(f"❌ Document indexing failed: {e}")
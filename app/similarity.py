@@ -0,0 +1,139 @@
+# similarity.py - Vectorized Answer Similarity Evaluation (original vs generated answers)
+import os
+import time
+import argparse
+from pathlib import Path
+from collections import defaultdict
+from typing import List, Dict
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "results"
+ANSWERS_PATH = RESULTS_DIR / "multiple_examples_comparison.csv"
+OUTPUT_PATH = RESULTS_DIR / "cosine_similarities_multiple.csv"
+STATS_PATH = RESULTS_DIR / "cosine_similarity_stats.csv"
+
+# Model used for the stored results in notebooks/offline-rag-evaluation.ipynb
+SIMILARITY_MODEL = os.getenv("SIMILARITY_MODEL", "multi-qa-MiniLM-L6-cos-v1")
+
+OUTPUT_COLUMNS = ["model", "question_index", "cosine_similarity", "question", "document_id"]
+
+def encode_normalized(model, texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Encode texts in batches and L2-normalize the rows
+
+    Args:
+        model: SentenceTransformer model
+        texts: Texts to encode
+        batch_size: Encoder batch size
+
+    Returns:
+        float32 array of shape (len(texts), dim) with unit-length rows
+    """
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def rowwise_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine similarity of matching rows of two normalized matrices"""
+    return np.einsum("ij,ij->i", a, b)
+
+def compute_similarities(
+    answers_path: Path = ANSWERS_PATH,
+    output_path: Path = OUTPUT_PATH,
+    model_name: str = SIMILARITY_MODEL,
+    batch_size: int = 64,
+    chunk_size: int = 2000,
+) -> Dict[str, np.ndarray]:
+    """
+    Cosine similarity between original and generated answers, streamed to CSV
+
+    The answers CSV is read in chunks. Generated answers are encoded per
+    chunk in one batch; original answers are shared by every LLM compared, so
+    each distinct one is encoded only once.
+
+    Args:
+        answers_path: CSV with model, question_index, question, document_id, answer_orig, answer_llm
+        output_path: Per-answer similarity CSV
+        model_name: SentenceTransformer model
+        batch_size: Encoder batch size
+        chunk_size: Rows read, encoded and written at a time
+
+    Returns:
+        Similarities per LLM (for summary statistics)
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    original_vectors: Dict[str, np.ndarray] = {}
+    similarities = defaultdict(list)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(exist_ok=True)
+    if output_path.exists():
+        output_path.unlink()
+
+    rows = 0
+    for chunk in pd.read_csv(answers_path, chunksize=chunk_size):
+        chunk = chunk.fillna({"answer_orig": "", "answer_llm": ""})
+
+        new_originals = [t for t in chunk["answer_orig"].unique() if t not in original_vectors]
+        original_vectors.update(zip(new_originals, encode_normalized(model, new_originals, batch_size)))
+
+        v_orig = np.stack([original_vectors[t] for t in chunk["answer_orig"]])
+        v_llm = encode_normalized(model, chunk["answer_llm"].tolist(), batch_size)
+        chunk["cosine_similarity"] = rowwise_cosine(v_llm, v_orig)
+
+        chunk[OUTPUT_COLUMNS].to_csv(output_path, mode="a", header=rows == 0, index=False)
+        for llm_model, values in chunk.groupby("model")["cosine_similarity"]:
+            similarities[llm_model].append(values.to_numpy())
+        rows += len(chunk)
+
+    print(f"   {rows} answers, {len(original_vectors)} distinct original answers")
+    return {llm_model: np.concatenate(parts) for llm_model, parts in similarities.items()}
+
+def similarity_stats(similarities: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """count/mean/std/min/max/median per LLM, as in cosine_similarity_stats.csv"""
+    stats = pd.DataFrame([
+        {
+            "model": llm_model,
+            "count": len(values),
+            "mean": values.mean(),
+            "std": values.std(ddof=1) if len(values) > 1 else np.nan,
+            "min": values.min(),
+            "max": values.max(),
+            "median": np.median(values),
+        }
+        for llm_model, values in sorted(similarities.items())
+    ]).set_index("model")
+    return stats.round(4)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cosine similarity of original vs generated answers")
+    parser.add_argument("--answers", default=str(ANSWERS_PATH))
+    parser.add_argument("--output", default=str(OUTPUT_PATH))
+    parser.add_argument("--stats-output", default=str(STATS_PATH))
+    parser.add_argument("--model", default=SIMILARITY_MODEL)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"📐 Computing answer similarities with {args.model}...")
+    start_time = time.time()
+    similarities = compute_similarities(
+        Path(args.answers), Path(args.output), args.model, args.batch_size, args.chunk_size
+    )
+    stats = similarity_stats(similarities)
+    stats.to_csv(args.stats_output)
+
+    print(f"   Done in {time.time() - start_time:.1f}s")
+    print(stats)
+    print(f"✅ Saved similarities to: {args.output}")
+    print(f"✅ Saved summary statistics to: {args.stats_output}")
+
+if __name__ == "__main__":
+    main()
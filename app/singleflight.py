@@ -0,0 +1,158 @@
+# singleflight.py - Coalesce Identical Concurrent Requests into One Computation
+import re
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, Any, Callable, Awaitable, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+def normalize_query(query: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+class LeaderAborted(RuntimeError):
+    """Raised to followers when the leader was stopped rather than failing (cancelled, KeyboardInterrupt, a script stop)"""
+
+def _aborted(error: BaseException) -> LeaderAborted:
+    return LeaderAborted(f"The shared call was aborted ({type(error).__name__})")
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class _AsyncCall:
+    __slots__ = ("future", "followers")
+
+    def __init__(self):
+        self.future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive with the same key while it runs wait and receive the same result
+    (or exception). If the leader is stopped rather than failing (its task
+    cancelled because its client went away, KeyboardInterrupt, Streamlit
+    stopping its script), followers get LeaderAborted instead of the
+    leader's stop. Nothing is cached once the call finishes.
+
+    do() serves threads and ado() coroutines; they keep separate in-flight
+    tables (one kind cannot wait on the other) but share the counters.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, _Call] = {}
+        self.async_calls: Dict[Hashable, _AsyncCall] = {}
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run fn, or join the in-flight call with the same key
+
+        Returns:
+            Tuple of (result, shared) where shared is True for callers that
+            joined another caller's computation
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.counters["coalesced"] += 1
+                leader = False
+            else:
+                call = self.calls[key] = _Call()
+                self.counters["leaders"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self.lock:
+                self.counters["errors"] += 1
+            raise
+        except BaseException as e:
+            # The interruption is the leader's own; followers get an error instead of no result
+            call.error = _aborted(e)
+            with self.lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+                if call.followers:
+                    self.counters["shared_calls"] += 1
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        do() for coroutines: await fn(), or join the in-flight call with the same key
+
+        Returns:
+            Tuple of (result, shared) as for do()
+        """
+        with self.lock:
+            call = self.async_calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.counters["coalesced"] += 1
+                leader = False
+            else:
+                call = self.async_calls[key] = _AsyncCall()
+                self.counters["leaders"] += 1
+                leader = True
+
+        if not leader:
+            # Shielded so a follower giving up does not cancel the leader's result
+            return await asyncio.shield(call.future), True
+
+        try:
+            result = await fn()
+        except Exception as e:
+            call.future.set_exception(e)
+            call.future.exception()  # Retrieved here; followers (if any) re-raise it
+            with self.lock:
+                self.counters["errors"] += 1
+            raise
+        except BaseException as e:
+            # Includes CancelledError: cancelling the future would cancel every follower too
+            call.future.set_exception(_aborted(e))
+            call.future.exception()
+            with self.lock:
+                self.counters["errors"] += 1
+            raise
+        else:
+            call.future.set_result(result)
+        finally:
+            with self.lock:
+                del self.async_calls[key]
+                if call.followers:
+                    self.counters["shared_calls"] += 1
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Leader/coalesced counts, how many calls were shared, and calls in flight"""
+        with self.lock:
+            leaders = self.counters["leaders"]
+            return {
+                **self.counters,
+                "in_flight": len(self.calls) + len(self.async_calls),
+                "coalesced_ratio": self.counters["coalesced"] / (leaders + self.counters["coalesced"])
+                if leaders else 0.0,
+            }
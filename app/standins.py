@@ -0,0 +1,228 @@
+# standins.py - Local Stand-in Services for Offline Benchmarks (stub LLM + in-memory Qdrant)
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+# Defaults for the simulated LLM
+STUB_LATENCY = float(os.getenv("STUB_LLM_LATENCY", "0.5"))
+STUB_JITTER = float(os.getenv("STUB_LLM_JITTER", "0.2"))
+STUB_ERROR_RATE = float(os.getenv("STUB_LLM_ERROR_RATE", "0.0"))
+
+def stub_completion(prompt: str) -> str:
+    """
+    Deterministic stand-in answer for a prompt
+
+    Judge prompts (rag.evaluate_relevance) get parsable JSON; RAG prompts get
+    the first line of retrieved context echoed back as the answer.
+    """
+    if "expert evaluator" in prompt:
+        return json.dumps({"Relevance": "RELEVANT", "Explanation": "Stand-in evaluation"})
+
+    for line in prompt.splitlines():
+        if line.startswith("content: "):
+            return f"Based on the travel database: {line[len('content: '):][:300]}"
+    return "I could not find this in the travel database."
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /chat/completions endpoint"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = "\n".join(m.get("content") or "" for m in request.get("messages", []))
+
+        server = self.server
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        if random.random() < server.error_rate:
+            self._send_json(500, {"error": {"message": "stand-in failure", "type": "server_error"}})
+            return
+
+        answer = stub_completion(prompt)
+        prompt_tokens, completion_tokens = len(prompt.split()), len(answer.split())
+
+        # Simulated prefix cache: a system message seen before counts as cached
+        system = "\n".join(m.get("content") or "" for m in request.get("messages", []) if m.get("role") == "system")
+        cached_tokens = len(system.split()) if system in server.seen_prefixes else 0
+        if system:
+            server.seen_prefixes.add(system)
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        response_id, created = f"chatcmpl-stub-{int(time.time() * 1000)}", int(time.time())
+        if request.get("stream"):
+            self._send_stream(request, response_id, created, answer, usage)
+            return
+
+        self._send_json(200, {
+            "id": response_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _send_stream(self, request: Dict[str, Any], response_id: str, created: int,
+                     answer: str, usage: Dict[str, Any]):
+        """Server-sent chat.completion.chunk events, one per word, then usage"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def chunk(choices, chunk_usage=None):
+            body = {"id": response_id, "object": "chat.completion.chunk", "created": created,
+                    "model": request.get("model", "stub"), "choices": choices, "usage": chunk_usage}
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+
+        for i, word in enumerate(answer.split(" ")):
+            chunk([{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}, "finish_reason": None}])
+        chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+def start_stub_llm(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = STUB_LATENCY,
+    jitter: float = STUB_JITTER,
+    error_rate: float = STUB_ERROR_RATE,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stub LLM server on a background thread
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        latency: Mean simulated response time in seconds
+        jitter: Uniform +/- jitter added to the latency
+        error_rate: Fraction of requests answered with HTTP 500
+
+    Returns:
+        Tuple of (server, OpenAI-compatible base URL)
+    """
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency, server.jitter, server.error_rate = latency, jitter, error_rate
+    server.seen_prefixes = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/"
+
+def use_offline_services(
+    latency: float = STUB_LATENCY,
+    jitter: float = STUB_JITTER,
+    error_rate: float = STUB_ERROR_RATE,
+) -> ThreadingHTTPServer:
+    """
+    Point rag.py at local stand-ins: the stub LLM for both providers and an
+    in-process Qdrant. Must run before rag is imported, since rag creates its
+    clients at import time. Fill the collection with index_local_qdrant().
+
+    Returns:
+        The running stub LLM server
+    """
+    if "rag" in sys.modules:
+        raise RuntimeError("use_offline_services() must be called before importing rag")
+
+    server, base_url = start_stub_llm(latency=latency, jitter=jitter, error_rate=error_rate)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stand-in"
+    os.environ["OLLAMA_URL"] = base_url
+    os.environ["QDRANT_URL"] = ":memory:"
+    # No Postgres offline; export traces only when asked for explicitly
+    os.environ.setdefault("TRACE_EXPORTER", "none")
+    # Keep results from the in-memory collection out of the real retrieval cache
+    os.environ.setdefault("RETRIEVAL_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="brahman-"), "retrieval.db"))
+    print(f"🔧 Stand-in LLM at {base_url} (latency {latency}s ± {jitter}s, errors {error_rate:.0%}), "
+          f"in-memory Qdrant")
+    return server
+
+def index_local_qdrant(client=None, collection_name: Optional[str] = None) -> int:
+    """
+    Create and fill the travel-docs collection on an in-process Qdrant
+
+    The fastembed models must already be in the local cache to run offline.
+
+    Args:
+        client: Qdrant client (defaults to rag.qdrant_client)
+        collection_name: Collection (defaults to rag.COLLECTION_NAME)
+
+    Returns:
+        Number of indexed documents
+    """
+    import rag
+    from setup import DEDUP_ENABLED, setup_qdrant, load_documents, index_documents
+    from dedup import deduplicate
+
+    client = client or rag.qdrant_client
+    collection_name = collection_name or rag.COLLECTION_NAME
+
+    documents = load_documents()
+    if DEDUP_ENABLED:
+        documents, _ = deduplicate(documents)
+    setup_qdrant(client, collection_name)
+    index_documents(client, collection_name, documents)
+
+    # rag.async_qdrant_client has an in-memory store of its own; point it at the same collections
+    if client is rag.qdrant_client and hasattr(rag.async_qdrant_client._client, "collections"):
+        rag.async_qdrant_client._client.collections = client._client.collections
+    if rag.retrieval_cache:
+        rag.retrieval_cache.bump_version(collection_name)
+    return len(documents)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stand-in LLM server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8009)
+    parser.add_argument("--latency", type=float, default=STUB_LATENCY)
+    parser.add_argument("--jitter", type=float, default=STUB_JITTER)
+    parser.add_argument("--error-rate", type=float, default=STUB_ERROR_RATE)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_llm(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"✅ Stand-in LLM listening on {base_url}")
+    print("   Use OPENAI_BASE_URL / OLLAMA_URL with this address")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
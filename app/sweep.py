@@ -0,0 +1,324 @@
+# sweep.py - Retrieval Hyperparameter Sweep with Candidate Reuse
+import os
+import time
+import argparse
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from qdrant_client import models
+
+from retrieval_eval import load_ground_truth, relevance_matrix, compute_metrics
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "results"
+
+DENSE_MODEL = "jinaai/jina-embeddings-v2-small-en"
+SPARSE_MODEL = "Qdrant/bm25"
+
+# Qdrant's RRF ranking constant: score = sum of 1 / (rank + k), rank counted from 0
+RRF_K = 2
+
+# dense/sparse: single vector; rrf/dbsf: fused prefetches; multistage: dense prefetch reranked by bm25
+FUSIONS = ["dense", "sparse", "rrf", "dbsf", "multistage"]
+
+# A ranked candidate list: (point id, score), best first
+Candidates = List[Tuple[Any, float]]
+
+def rrf(lists: List[Candidates], k: int = RRF_K) -> Candidates:
+    """Reciprocal Rank Fusion, as computed by Qdrant"""
+    scores = defaultdict(float)
+    for candidates in lists:
+        for rank, (point_id, _) in enumerate(candidates):
+            scores[point_id] += 1.0 / (rank + k)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def dbsf(lists: List[Candidates]) -> Candidates:
+    """Distribution-Based Score Fusion: scores normalized to mean +/- 3 std per list, then summed"""
+    scores = defaultdict(float)
+    for candidates in lists:
+        if not candidates:
+            continue
+        raw = np.array([score for _, score in candidates])
+        std = raw.std(ddof=1) if len(raw) > 1 else 0.0
+        if std == 0:
+            normalized = np.full(len(raw), 0.5)
+        else:
+            low = raw.mean() - 3 * std
+            normalized = (raw - low) / (6 * std)
+        for (point_id, _), score in zip(candidates, normalized):
+            scores[point_id] += float(score)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def derive(config: Dict[str, Any], dense: Candidates, sparse: Candidates) -> List[Any]:
+    """
+    Point IDs a configuration would return, computed from the full candidate lists
+
+    Args:
+        config: Sweep configuration (fusion, limit, prefetch_mult)
+        dense: Deepest dense candidate list for the query
+        sparse: Deepest sparse candidate list for the query
+
+    Returns:
+        Ranked point IDs (at most config["limit"])
+    """
+    limit, fusion = config["limit"], config["fusion"]
+    if fusion == "dense":
+        ranked = dense
+    elif fusion == "sparse":
+        ranked = sparse
+    else:
+        depth = limit * config["prefetch_mult"]
+        if fusion == "rrf":
+            ranked = rrf([dense[:depth], sparse[:depth]])
+        elif fusion == "dbsf":
+            ranked = dbsf([dense[:depth], sparse[:depth]])
+        else:
+            bm25 = dict(sparse)
+            ranked = sorted(dense[:depth], key=lambda c: bm25.get(c[0], 0.0), reverse=True)
+    return [point_id for point_id, _ in ranked[:limit]]
+
+def build_config_request(
+    question: str,
+    config: Dict[str, Any],
+    query_filter: Optional[models.Filter],
+    params: Optional[models.SearchParams],
+) -> models.QueryRequest:
+    """The Qdrant request a configuration corresponds to (used for latency calibration)"""
+    dense_query = models.Document(text=question, model=DENSE_MODEL)
+    sparse_query = models.Document(text=question, model=SPARSE_MODEL)
+    limit, fusion = config["limit"], config["fusion"]
+
+    if fusion in ("dense", "sparse"):
+        return models.QueryRequest(
+            query=dense_query if fusion == "dense" else sparse_query,
+            using="jina-small" if fusion == "dense" else "bm25",
+            filter=query_filter, params=params, limit=limit, with_payload=False,
+        )
+
+    depth = limit * config["prefetch_mult"]
+    dense_prefetch = models.Prefetch(
+        query=dense_query, using="jina-small", filter=query_filter, params=params, limit=depth
+    )
+    if fusion == "multistage":
+        return models.QueryRequest(
+            prefetch=[dense_prefetch], query=sparse_query, using="bm25",
+            filter=query_filter, limit=limit, with_payload=False,
+        )
+    return models.QueryRequest(
+        prefetch=[
+            dense_prefetch,
+            models.Prefetch(query=sparse_query, using="bm25", filter=query_filter, limit=depth),
+        ],
+        query=models.FusionQuery(fusion=models.Fusion.RRF if fusion == "rrf" else models.Fusion.DBSF),
+        filter=query_filter, limit=limit, with_payload=False,
+    )
+
+def search_params(rescore: Optional[bool]) -> Optional[models.SearchParams]:
+    if rescore is None:
+        return None
+    return models.SearchParams(quantization=models.QuantizationSearchParams(rescore=rescore))
+
+def fetch_candidates(
+    questions: List[str],
+    filters: List[Optional[models.Filter]],
+    depth: int,
+    rescore: Optional[bool],
+    batch_size: int = 16,
+) -> Tuple[List[Tuple[Candidates, Candidates]], Dict[Any, Dict]]:
+    """
+    Fetch the deepest dense and sparse candidate lists once per question
+
+    Returns:
+        Tuple of ((dense, sparse) candidates per question, payload per point id)
+    """
+    import rag
+
+    candidates, payloads = [], {}
+    params = search_params(rescore)
+    for start in range(0, len(questions), batch_size):
+        requests = []
+        for question, query_filter in zip(questions[start:start + batch_size], filters[start:start + batch_size]):
+            requests.append(models.QueryRequest(
+                query=models.Document(text=question, model=DENSE_MODEL), using="jina-small",
+                filter=query_filter, params=params, limit=depth, with_payload=["id", "merged_ids"],
+            ))
+            requests.append(models.QueryRequest(
+                query=models.Document(text=question, model=SPARSE_MODEL), using="bm25",
+                filter=query_filter, limit=depth, with_payload=["id", "merged_ids"],
+            ))
+        responses = rag.qdrant_client.query_batch_points(collection_name=rag.COLLECTION_NAME, requests=requests)
+
+        ranked = []
+        for response in responses:
+            ranked.append([(point.id, point.score) for point in response.points])
+            for point in response.points:
+                payloads[point.id] = point.payload
+        candidates.extend(zip(ranked[0::2], ranked[1::2]))
+    return candidates, payloads
+
+def sweep_configs(
+    limits: List[int],
+    prefetch_mults: List[int],
+    fusions: List[str],
+) -> List[Dict[str, Any]]:
+    """All (fusion, limit, prefetch multiplier) combinations; prefetch only applies to fused searches"""
+    configs = []
+    for fusion in fusions:
+        for limit in limits:
+            for mult in ([None] if fusion in ("dense", "sparse") else prefetch_mults):
+                configs.append({"fusion": fusion, "limit": limit, "prefetch_mult": mult})
+    return configs
+
+def pareto_front(df: pd.DataFrame, quality: str = "mrr", cost: str = "latency_p50_ms") -> pd.Series:
+    """Rows not dominated by another row with >= quality and <= cost (one strictly better)"""
+    q, c = df[quality].to_numpy(), df[cost].to_numpy()
+    dominated = ((q[None, :] >= q[:, None]) & (c[None, :] <= c[:, None])
+                 & ((q[None, :] > q[:, None]) | (c[None, :] < c[:, None]))).any(axis=1)
+    return pd.Series(~dominated, index=df.index)
+
+def run_sweep(
+    limits: List[int] = (1, 3, 5, 10),
+    prefetch_mults: List[int] = (2, 5, 10),
+    fusions: List[str] = FUSIONS,
+    filter_modes: List[str] = ("none", "auto"),
+    rescore_modes: Optional[List[bool]] = None,
+    sample: Optional[int] = None,
+    calibration: int = 10,
+    batch_size: int = 16,
+) -> pd.DataFrame:
+    """
+    Sweep retrieval settings and score each configuration on the ground truth
+
+    For every (filter mode, rescore) pair the deepest dense and sparse lists
+    are fetched once per question; every limit / prefetch / fusion setting is
+    then derived locally, using Qdrant's fusion formulas. Latency cannot be
+    derived, so each configuration is also run for real on `calibration`
+    questions; those runs double as a check that derived rankings match the
+    server's (derived_agreement).
+
+    Args:
+        limits: Result counts to try
+        prefetch_mults: Prefetch depth as a multiple of the limit (fused searches)
+        fusions: Subset of FUSIONS
+        filter_modes: "none" and/or "auto" (rag.detect_locations filters)
+        rescore_modes: Quantization rescoring settings; defaults to [True, False]
+            when the collection is quantized, otherwise not swept
+        sample: Evaluate only the first N ground-truth questions
+        calibration: Questions timed against the server per configuration
+        batch_size: Queries per candidate-fetch batch
+
+    Returns:
+        DataFrame with one row per configuration and a "pareto" column
+    """
+    import rag
+
+    ground_truth = load_ground_truth(sample=sample)
+    questions = ground_truth["question"].tolist()
+    expected_ids = ground_truth["id"].tolist()
+    configs = sweep_configs(list(limits), list(prefetch_mults), list(fusions))
+    depth = max(limits) * max(prefetch_mults)
+
+    if rescore_modes is None:
+        quantized = rag.qdrant_client.get_collection(rag.COLLECTION_NAME).config.quantization_config
+        rescore_modes = [True, False] if quantized else [None]
+        if not quantized:
+            print("ℹ️  Collection is not quantized; rescoring is not swept")
+
+    print(f"🧪 Sweeping {len(configs)} configurations x {len(filter_modes)} filter mode(s) x "
+          f"{len(rescore_modes)} rescore mode(s) on {len(questions)} questions (depth {depth})")
+
+    rows = []
+    for filter_mode in filter_modes:
+        filters = [
+            rag.location_filter(rag.detect_locations(q) or None) if filter_mode == "auto" else None
+            for q in questions
+        ]
+        for rescore in rescore_modes:
+            start_time = time.time()
+            candidates, payloads = fetch_candidates(questions, filters, depth, rescore, batch_size)
+            fetch_time = time.time() - start_time
+            print(f"   filter={filter_mode} rescore={rescore}: candidates fetched in {fetch_time:.1f}s")
+
+            for config in configs:
+                ranked = [derive(config, dense, sparse) for dense, sparse in candidates]
+                results = [[payloads[point_id] for point_id in ids] for ids in ranked]
+                metrics = compute_metrics(
+                    relevance_matrix(expected_ids, results, config["limit"]), ks=(config["limit"],)
+                )
+
+                # Time the real request on a few questions and check the derived ranking
+                latencies, agree = [], []
+                for i in range(min(calibration, len(questions))):
+                    request = build_config_request(questions[i], config, filters[i], search_params(rescore))
+                    query_start = time.time()
+                    response = rag.qdrant_client.query_batch_points(
+                        collection_name=rag.COLLECTION_NAME, requests=[request]
+                    )[0]
+                    latencies.append(time.time() - query_start)
+                    agree.append([p.id for p in response.points] == ranked[i])
+
+                rows.append({
+                    **config,
+                    "filter": filter_mode,
+                    "rescore": rescore,
+                    "mrr": metrics["mrr"],
+                    "hit_rate": metrics["hit_rate"],
+                    "ndcg": metrics[f"ndcg@{config['limit']}"],
+                    "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else np.nan,
+                    "latency_p95_ms": float(np.percentile(latencies, 95) * 1000) if latencies else np.nan,
+                    "derived_agreement": float(np.mean(agree)) if agree else np.nan,
+                })
+
+    df = pd.DataFrame(rows)
+    df["pareto"] = pareto_front(df)
+    return df.sort_values(["latency_p50_ms", "mrr"], ascending=[True, False]).reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep retrieval settings (MRR vs latency)")
+    parser.add_argument("--limits", nargs="+", type=int, default=[1, 3, 5, 10])
+    parser.add_argument("--prefetch-mults", nargs="+", type=int, default=[2, 5, 10])
+    parser.add_argument("--fusions", nargs="+", default=FUSIONS, choices=FUSIONS)
+    parser.add_argument("--filters", nargs="+", default=["none", "auto"], choices=["none", "auto"])
+    parser.add_argument("--rescore", nargs="+", default=None, choices=["true", "false"],
+                        help="Quantization rescoring settings (default: both if the collection is quantized)")
+    parser.add_argument("--sample", type=int, default=None)
+    parser.add_argument("--calibration", type=int, default=10, help="Questions timed per configuration")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--offline", action="store_true", help="Index into an in-memory Qdrant first")
+    args = parser.parse_args()
+
+    # The sweep queries Qdrant directly and never reads the retrieval cache; keep rag from opening it
+    os.environ["RETRIEVAL_CACHE"] = "off"
+
+    if args.offline:
+        import standins
+
+        standins.use_offline_services()
+        print(f"📄 Indexed {standins.index_local_qdrant()} documents into the in-memory collection")
+
+    start_time = time.time()
+    df = run_sweep(
+        limits=args.limits,
+        prefetch_mults=args.prefetch_mults,
+        fusions=args.fusions,
+        filter_modes=args.filters,
+        rescore_modes=[v == "true" for v in args.rescore] if args.rescore else None,
+        sample=args.sample,
+        calibration=args.calibration,
+        batch_size=args.batch_size,
+    )
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_path = RESULTS_DIR / f"retrieval_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    df.to_csv(output_path, index=False)
+
+    print(f"\n🏁 Sweep finished in {time.time() - start_time:.1f}s. Pareto front (MRR vs p50 latency):")
+    print(df[df["pareto"]].to_string(index=False))
+    print(f"\n✅ Results saved to: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# test_admission.py - Tests for the admission controller (priority queue, degradation levels, shedding)
+import time
+import asyncio
+import threading
+
+import pytest
+
+from admission import (
+    AdmissionController, Overloaded, FEEDBACK, RETRY, QUESTION,
+    FULL, NO_JUDGE, RETRIEVAL_ONLY, SHED,
+)
+
+def wait_for_queue(controller: AdmissionController, depth: int, timeout: float = 2.0):
+    """Block until `depth` requests are queued"""
+    deadline = time.time() + timeout
+    while len(controller.queue) < depth:
+        assert time.time() < deadline, f"queue never reached {depth}"
+        time.sleep(0.005)
+
+def queue_behind(controller: AdmissionController, priorities, served, levels=None):
+    """Start one thread per priority, each queued in turn behind the held slot"""
+    threads = []
+    for i, (name, priority) in enumerate(priorities):
+        def run(name=name, priority=priority):
+            with controller.admit(priority) as admission:
+                served.append(name)
+                if levels is not None:
+                    levels[name] = admission.level
+        thread = threading.Thread(target=run)
+        thread.start()
+        wait_for_queue(controller, i + 1)
+        threads.append(thread)
+    return threads
+
+def test_waiters_served_by_priority_then_arrival():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, timeout=5)
+    held = controller.acquire()
+    assert held.level == FULL
+
+    served = []
+    threads = queue_behind(controller, [("q1", QUESTION), ("r1", RETRY), ("q2", QUESTION), ("f1", FEEDBACK)], served)
+    controller.release()
+    for thread in threads:
+        thread.join()
+
+    assert served == ["f1", "r1", "q1", "q2"]
+    assert controller.inflight == 0
+
+def test_level_follows_queue_depth_when_the_slot_is_granted():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=5,
+                                     skip_judge_at=0.25, retrieval_only_at=0.5)
+    controller.acquire()
+    served, levels = [], {}
+    # Queue depth left behind each grant: 3, 2, 1, 0 -> shares 0.75, 0.5, 0.25, 0
+    threads = queue_behind(controller, [(f"q{i}", QUESTION) for i in range(4)], served, levels)
+    assert controller.level() == RETRIEVAL_ONLY
+    controller.release()
+    for thread in threads:
+        thread.join()
+
+    assert [levels[f"q{i}"] for i in range(4)] == [RETRIEVAL_ONLY, RETRIEVAL_ONLY, NO_JUDGE, FULL]
+
+def test_retries_are_not_degraded_past_no_judge():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=5,
+                                     skip_judge_at=0.25, retrieval_only_at=0.5)
+    controller.acquire()
+    served, levels = [], {}
+    # Two questions still queued when the retry is granted: a question would get retrieval only
+    threads = queue_behind(controller, [("r1", RETRY), ("q1", QUESTION), ("q2", QUESTION)], served, levels)
+    controller.release()
+    for thread in threads:
+        thread.join()
+
+    assert served[0] == "r1"
+    assert levels["r1"] == NO_JUDGE
+
+def test_full_queue_sheds_questions_but_not_feedback_or_retries():
+    controller = AdmissionController(max_concurrency=1, max_queue=1, timeout=5)
+    controller.acquire()
+    served = []
+    threads = queue_behind(controller, [("q1", QUESTION)], served)
+
+    before = SHED.values.get(("question", "queue_full"), 0.0)
+    with pytest.raises(Overloaded):
+        controller.acquire(QUESTION)
+    assert SHED.values[("question", "queue_full")] == before + 1
+
+    threads += queue_behind(controller, [("r1", RETRY), ("f1", FEEDBACK)], served)
+    assert len(controller.queue) == 3
+    controller.release()
+    for thread in threads:
+        thread.join()
+    assert served == ["f1", "r1", "q1"]
+
+def test_timeout_leaves_the_queue_and_keeps_the_slot_count():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=0.05)
+    controller.acquire()
+    with pytest.raises(Overloaded):
+        controller.acquire(QUESTION)
+    assert controller.queue == []
+    assert controller.counters["shed_timeout"] == 1
+
+    controller.release()
+    assert controller.inflight == 0
+    assert controller.acquire().waited == 0.0
+
+def test_async_waiters_share_the_queue_with_threads():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=5)
+
+    async def main():
+        held = controller.acquire()
+        served = []
+
+        async def ask(name, priority):
+            async with controller.aadmit(priority):
+                served.append(name)
+
+        tasks = [asyncio.create_task(ask("q1", QUESTION))]
+        while len(controller.queue) < 1:
+            await asyncio.sleep(0.005)
+        tasks.append(asyncio.create_task(ask("f1", FEEDBACK)))
+        while len(controller.queue) < 2:
+            await asyncio.sleep(0.005)
+
+        # Released from another thread, as a sync caller would
+        threading.Thread(target=controller.release).start()
+        await asyncio.gather(*tasks)
+        return held, served
+
+    held, served = asyncio.run(main())
+    assert held.level == FULL
+    assert served == ["f1", "q1"]
+    assert controller.inflight == 0
+
+def test_cancelled_waiter_gives_up_its_place():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=5)
+
+    async def main():
+        controller.acquire()
+        waiter = asyncio.create_task(controller.aacquire())
+        while len(controller.queue) < 1:
+            await asyncio.sleep(0.005)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert controller.queue == []
+    controller.release()
+    assert controller.inflight == 0
+
+def test_cancelled_waiter_hands_back_a_granted_slot():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, timeout=5)
+
+    async def main():
+        controller.acquire()
+        waiter = asyncio.create_task(controller.aacquire())
+        while len(controller.queue) < 1:
+            await asyncio.sleep(0.005)
+        # Cancelled, then handed the slot before it gets to run
+        waiter.cancel()
+        controller.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert controller.inflight == 0
+    assert controller.queue == []
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController().acquire(priority=7)
@@ -0,0 +1,83 @@
+# test_benchmark.py - Tests for the benchmark gate (tolerances, comparison and exit codes)
+import os
+import sys
+import json
+
+import pytest
+
+import benchmark
+from benchmark import DEFAULT_TOLERANCES, compare, tolerance_for
+
+def statuses(baseline, current, tolerances=DEFAULT_TOLERANCES):
+    return {row["metric"]: row["status"] for row in compare(baseline, current, tolerances)}
+
+def test_first_matching_pattern_wins():
+    tolerances = {"latency.total.*": {"direction": "lower", "rel": 0.5}, **DEFAULT_TOLERANCES}
+    assert tolerance_for("latency.total.p95_ms", tolerances)["rel"] == 0.5
+    assert tolerance_for("latency.search.p95_ms", tolerances)["rel"] == 0.25
+    assert tolerance_for("queue.depth", tolerances) is None
+
+def test_direction_and_slack():
+    baseline = {"retrieval.semantic.mrr": 0.80, "latency.total.p95_ms": 100.0, "pipeline.error_rate": 0.0}
+    assert statuses(baseline, {"retrieval.semantic.mrr": 0.795, "latency.total.p95_ms": 124.0,
+                               "pipeline.error_rate": 0.01}) == {
+        "retrieval.semantic.mrr": "ok", "latency.total.p95_ms": "ok", "pipeline.error_rate": "ok",
+    }
+    assert statuses(baseline, {"retrieval.semantic.mrr": 0.78, "latency.total.p95_ms": 126.0,
+                               "pipeline.error_rate": 0.05}) == {
+        "retrieval.semantic.mrr": "regression", "latency.total.p95_ms": "regression",
+        "pipeline.error_rate": "regression",
+    }
+    assert statuses(baseline, {"retrieval.semantic.mrr": 0.85, "latency.total.p95_ms": 50.0,
+                               "pipeline.error_rate": 0.0}) == {
+        "retrieval.semantic.mrr": "improved", "latency.total.p95_ms": "improved", "pipeline.error_rate": "ok",
+    }
+
+def test_absolute_slack_covers_small_baselines():
+    # 25% of 4 ms is 1 ms, but latencies may drift by 5 ms
+    assert statuses({"latency.search.p50_ms": 4.0}, {"latency.search.p50_ms": 8.5}) == {
+        "latency.search.p50_ms": "ok",
+    }
+
+def test_new_missing_and_ungated_metrics():
+    assert statuses({"retrieval.hybrid.mrr": 0.7, "other": 1.0}, {"latency.llm.p50_ms": 10.0, "other": 9.0}) == {
+        "retrieval.hybrid.mrr": "missing", "latency.llm.p50_ms": "new", "other": "ok",
+    }
+
+@pytest.fixture
+def gate(monkeypatch, tmp_path):
+    """Run benchmark.main() with fixed metrics; returns the exit code (0 when it returns)"""
+    monkeypatch.setattr(benchmark, "RESULTS_DIR", tmp_path / "results")
+    monkeypatch.setenv("RETRIEVAL_CACHE", "on")
+    baseline = tmp_path / "baseline.json"
+
+    def run(metrics, *argv):
+        monkeypatch.setattr(benchmark, "run_benchmarks", lambda args: dict(metrics))
+        monkeypatch.setattr(sys, "argv", ["benchmark.py", "--baseline", str(baseline), *argv])
+        try:
+            benchmark.main()
+        except SystemExit as e:
+            return e.code
+        return 0
+
+    run.baseline = baseline
+    return run
+
+def test_gate_exit_codes(gate):
+    assert gate({"latency.total.p95_ms": 100.0}) == 2  # No baseline yet
+    assert gate({"latency.total.p95_ms": 100.0}, "--update-baseline") == 0
+    assert json.loads(gate.baseline.read_text())["version"] == 1
+    assert os.environ["RETRIEVAL_CACHE"] == "off"
+
+    assert gate({"latency.total.p95_ms": 110.0}) == 0
+    assert gate({"latency.total.p95_ms": 200.0}) == 1
+    assert gate({"latency.total.p95_ms": 200.0}, "--tolerance", "latency.total.*=1.5") == 0
+
+def test_baseline_keeps_its_tolerances(gate):
+    gate({"latency.total.p95_ms": 100.0}, "--update-baseline", "--tolerance", "latency.*=1.0")
+    saved = json.loads(gate.baseline.read_text())
+    assert saved["tolerances"]["latency.*"] == {"direction": "lower", "abs": 5.0, "rel": 1.0}
+    gate({"latency.total.p95_ms": 100.0}, "--update-baseline")
+    assert json.loads(gate.baseline.read_text())["version"] == 2
+    # Baseline tolerances apply without repeating the override
+    assert gate({"latency.total.p95_ms": 190.0}) == 0
@@ -0,0 +1,54 @@
+# test_cassette.py - Tests for the LLM record/replay store (round trip, misses, old cassettes)
+import sqlite3
+
+import pytest
+
+from cassette import Cassette, CassetteMiss, prompt_hash
+
+TOKENS = {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150, "cached_tokens": 64}
+
+@pytest.fixture
+def cassette(tmp_path):
+    return Cassette(tmp_path / "cassettes" / "llm_calls.db", mode="record")
+
+def test_record_then_replay(cassette):
+    cassette.record("openai/gpt-4o-mini", "Best forts?", "Amber Fort", TOKENS, 0.8)
+    assert cassette.replay("openai/gpt-4o-mini", "Best forts?") == {
+        "answer": "Amber Fort", "tokens": TOKENS, "latency": 0.8,
+    }
+
+def test_calls_are_keyed_by_model_and_prompt(cassette):
+    cassette.record("openai/gpt-4o-mini", "Best forts?", "Amber Fort", TOKENS, 0.8)
+    assert cassette.lookup("openai/gpt-4o", "Best forts?") is None
+    assert cassette.lookup("openai/gpt-4o-mini", "Best forts in Goa?") is None
+    with pytest.raises(CassetteMiss, match=prompt_hash("Best forts?!")[:12]):
+        cassette.replay("openai/gpt-4o-mini", "Best forts?!")
+
+def test_recording_again_overwrites(cassette):
+    cassette.record("openai/gpt-4o-mini", "Best forts?", "Amber Fort", TOKENS, 0.8)
+    cassette.record("openai/gpt-4o-mini", "Best forts?", "Golconda Fort", TOKENS, 0.4)
+    assert cassette.replay("openai/gpt-4o-mini", "Best forts?")["answer"] == "Golconda Fort"
+    assert cassette.stats() == {"openai/gpt-4o-mini": {"calls": 1, "avg_latency": 0.4, "total_tokens": 150}}
+
+def test_cached_tokens_default_to_zero(cassette):
+    tokens = {key: value for key, value in TOKENS.items() if key != "cached_tokens"}
+    cassette.record("ollama/phi3", "Best forts?", "Amber Fort", tokens, 2.0)
+    assert cassette.replay("ollama/phi3", "Best forts?")["tokens"]["cached_tokens"] == 0
+
+def test_old_cassettes_gain_the_cached_tokens_column(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE llm_calls (model TEXT, prompt_hash TEXT, prompt BLOB, answer BLOB,
+                    prompt_tokens INTEGER, completion_tokens INTEGER, total_tokens INTEGER,
+                    latency REAL, recorded_at TEXT, PRIMARY KEY (model, prompt_hash))""")
+    conn.commit()
+    conn.close()
+
+    cassette = Cassette(path, mode="replay")
+    assert cassette.replaying and not cassette.recording
+    cassette.record("ollama/phi3", "Best forts?", "Amber Fort", TOKENS, 2.0)
+    assert cassette.replay("ollama/phi3", "Best forts?")["tokens"] == TOKENS
+
+def test_unknown_mode(tmp_path):
+    with pytest.raises(ValueError, match="Unknown cassette mode"):
+        Cassette(tmp_path / "llm_calls.db", mode="rewind")
@@ -0,0 +1,56 @@
+# test_chunking.py - Tests for the pluggable chunkers and the chunking benchmark helpers
+import pytest
+
+from chunking import CHUNKERS, chunk_documents, chunks_overlap, generate_document_id, get_chunker, length_stats
+
+MARKDOWN = """# Rajasthan
+
+## Jaipur
+
+Amber Fort overlooks Maota Lake. """ + "The fort is built of red sandstone and marble. " * 20 + """
+
+## Udaipur
+
+City Palace stands on the banks of Lake Pichola and is the largest palace complex in Rajasthan.
+"""
+
+def recipe_cached() -> bool:
+    """chonkie downloads its markdown recipe from the Hugging Face Hub on first use"""
+    from huggingface_hub import try_to_load_from_cache
+    return try_to_load_from_cache("chonkie-ai/recipes", "markdown_en.json", repo_type="dataset") is not None
+
+@pytest.mark.parametrize("name", list(CHUNKERS))
+def test_chunkers_produce_setup_documents(name):
+    if name == "chonkie" and not recipe_cached():
+        pytest.skip("chonkie's markdown recipe is not in the local Hugging Face cache")
+    documents = get_chunker(name).chunk("Rajasthan.pdf", MARKDOWN)
+    assert len(documents) > 1
+    for doc in documents:
+        assert set(doc) == {"location", "doc_id", "content", "id"}
+        assert doc["location"] == "Rajasthan"
+        assert doc["id"] == generate_document_id("Rajasthan", doc["doc_id"], doc["content"])
+    assert any("City Palace" in doc["content"] for doc in documents)
+
+def test_langchain_chunks_respect_the_size_limit():
+    documents = get_chunker("langchain").chunk("Rajasthan.pdf", MARKDOWN)
+    assert max(len(doc["content"]) for doc in documents) <= 500
+
+def test_unknown_chunker():
+    with pytest.raises(ValueError, match="Unknown chunker"):
+        get_chunker("sentencepiece")
+
+def test_parallel_chunking_keeps_source_order():
+    sources = [("Rajasthan.pdf", MARKDOWN), ("Goa.pdf", "# Goa\n\nBaga Beach is known for its nightlife.")]
+    serial = chunk_documents(sources, "langchain", workers=1)
+    assert chunk_documents(sources, "langchain", workers=2) == serial
+    assert serial[-1]["location"] == "Goa"
+
+def test_chunks_overlap():
+    passage = "Amber Fort overlooks Maota Lake near Jaipur in Rajasthan"
+    assert chunks_overlap(passage, passage + " and was built in 1592")
+    assert not chunks_overlap(passage, "Baga Beach is known for its nightlife and water sports")
+    assert not chunks_overlap("Amber Fort", "Amber Fort")  # Too short to judge
+
+def test_length_stats():
+    stats = length_stats([100, 200, 300, 400])
+    assert (stats["min"], stats["max"], stats["mean"], stats["p50"]) == (100, 400, 250.0, 250.0)
@@ -0,0 +1,85 @@
+# test_collection_profile.py - Tests for the declarative Qdrant collection profiles
+import sys
+from types import SimpleNamespace
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+import collection_profile
+from collection_profile import collection_params, is_local_client, load_profile, verify_collection
+
+def test_profiles_load_with_their_name():
+    for name in ("default", "ondisk", "cluster"):
+        assert load_profile(name)["name"] == name
+    with pytest.raises(ValueError, match="Unknown Qdrant profile"):
+        load_profile("tiny")
+
+def test_environment_overrides(monkeypatch):
+    monkeypatch.setenv("QDRANT_SHARD_NUMBER", "4")
+    monkeypatch.setenv("QDRANT_ON_DISK_PAYLOAD", "True")
+    profile = load_profile("default")
+    assert (profile["shard_number"], profile["on_disk_payload"]) == (4, True)
+
+def test_profile_becomes_create_collection_arguments():
+    params = collection_params(load_profile("ondisk"))
+    dense = params["vectors_config"]["jina-small"]
+    assert (dense.size, dense.on_disk, dense.hnsw_config.m) == (512, True, 16)
+    assert params["sparse_vectors_config"]["bm25"].index.on_disk is True
+    assert params["optimizers_config"].memmap_threshold == 10000
+    assert params["wal_config"].wal_capacity_mb == 16
+    assert (params["shard_number"], params["on_disk_payload"]) == (1, True)
+    assert "write_consistency_factor" not in params
+
+def test_minimal_profile_leaves_qdrant_defaults():
+    params = collection_params({"name": "bare"})
+    assert params["optimizers_config"] is None and params["wal_config"] is None
+    assert params["vectors_config"]["jina-small"].hnsw_config is None
+    assert "shard_number" not in params
+
+def live_config(shard_number=1, indexing_threshold=20000, hnsw_on_disk=False):
+    """What get_collection(...).config looks like on a Qdrant server"""
+    hnsw = models.HnswConfigDiff(m=16, ef_construct=100, on_disk=hnsw_on_disk)
+    return SimpleNamespace(
+        params=SimpleNamespace(
+            vectors={"jina-small": SimpleNamespace(hnsw_config=hnsw)},
+            sparse_vectors={"bm25": SimpleNamespace(index=models.SparseIndexParams(on_disk=False))},
+            shard_number=shard_number, replication_factor=1, write_consistency_factor=1, on_disk_payload=False,
+        ),
+        hnsw_config=hnsw,
+        optimizer_config=SimpleNamespace(indexing_threshold=indexing_threshold, default_segment_number=0),
+        wal_config=SimpleNamespace(wal_capacity_mb=32),
+    )
+
+class ServerStandIn:
+    def __init__(self, config):
+        self.config = config
+
+    def get_collection(self, collection_name):
+        return SimpleNamespace(config=self.config)
+
+def test_verify_reports_what_differs():
+    profile = load_profile("default")
+    assert verify_collection(ServerStandIn(live_config()), "travel-docs", profile) == []
+
+    mismatches = verify_collection(ServerStandIn(live_config(2, 10000, True)), "travel-docs", profile)
+    assert mismatches == [
+        "shard_number: expected 1, got 2",
+        "hnsw.on_disk: expected False, got True",
+        "optimizers.indexing_threshold: expected 20000, got 10000",
+    ]
+
+def test_local_client_is_detected():
+    assert is_local_client(QdrantClient(":memory:"))
+    assert not is_local_client(ServerStandIn(live_config()))
+
+def test_show_and_verify_commands(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["collection_profile.py", "show", "cluster"])
+    collection_profile.main()
+    assert "shard_number: 2" in capsys.readouterr().out
+
+    monkeypatch.setattr(collection_profile, "QdrantClient", lambda url: ServerStandIn(live_config(shard_number=2)))
+    monkeypatch.setattr(sys, "argv", ["collection_profile.py", "verify", "default"])
+    with pytest.raises(SystemExit) as excinfo:
+        collection_profile.main()
+    assert excinfo.value.code == 1
+    assert "shard_number: expected 1, got 2" in capsys.readouterr().out
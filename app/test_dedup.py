@@ -0,0 +1,37 @@
+# test_dedup.py - Tests for near-duplicate and low-information chunk elimination
+from dedup import deduplicate, find_duplicate_clusters, is_low_information
+
+FORT = ("Amber Fort stands on a hill above Maota Lake, eleven kilometres from Jaipur. Built from red "
+        "sandstone and marble, it is known for its mirror palace, the Sheesh Mahal, and its elephant rides.")
+
+def doc(content, location="Rajasthan", doc_id="0", id=None):
+    return {"content": content, "location": location, "doc_id": doc_id, "id": id or f"{location}-{len(content)}"}
+
+def test_low_information_chunks():
+    assert is_low_information("![map](images/map.png)")
+    assert is_low_information("Asia > South Asia > India > Rajasthan")
+    assert not is_low_information(FORT)
+
+def test_near_duplicates_cluster():
+    clusters = find_duplicate_clusters([FORT, FORT + " Tickets are sold at the gate.", "Mysore Palace " * 20])
+    assert clusters == [[0, 1]]
+
+def test_duplicates_merge_into_the_longest_chunk():
+    documents = [doc(FORT, id="short"), doc(FORT + " Tickets are sold at the gate.", id="long")]
+    kept, report = deduplicate(documents)
+    assert [d["id"] for d in kept] == ["long"]
+    assert kept[0]["merged_ids"] == ["short"]
+    assert report["dropped_duplicates"] == 1
+
+def test_low_information_chunk_is_attributed_to_its_source():
+    documents = [doc("![fort](fort.png)", id="image"), doc(FORT, location="Karnataka", id="other"), doc(FORT, id="fort")]
+    kept, report = deduplicate(documents)
+    assert {d["id"]: d.get("merged_ids") for d in kept} == {"other": None, "fort": ["image"]}
+    assert report["dropped_low_information"] == 1
+
+def test_same_text_in_two_locations_is_kept_in_both():
+    # A location-filtered search for either state must still find the chunk
+    documents = [doc(FORT, location="Rajasthan", id="rj"), doc(FORT, location="Karnataka", id="ka")]
+    kept, report = deduplicate(documents)
+    assert [d["id"] for d in kept] == ["rj", "ka"]
+    assert report["dropped_duplicates"] == 0
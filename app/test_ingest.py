@@ -0,0 +1,82 @@
+# test_ingest.py - Tests for the PDF ingestion CLI (conversion cache, failed PDFs, exit status)
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ingest
+from ingest import IngestFailed, failure_manifest_path
+
+MARKDOWN = "# Amber Fort\n\nAmber Fort overlooks Maota Lake near Jaipur.\n"
+
+class InlinePool(ThreadPoolExecutor):
+    """Runs conversions in threads and skips loading the Marker models"""
+
+    def __init__(self, max_workers=None, initializer=None):
+        super().__init__(max_workers=max_workers)
+
+def fake_convert(pdf_path):
+    if "broken" in pdf_path:
+        raise ValueError("not a PDF")
+    return {"pdf_name": ingest.os.path.basename(pdf_path), "markdown": MARKDOWN, "convert_time": 0.0}
+
+@pytest.fixture
+def layout(monkeypatch, tmp_path):
+    """Raw PDF folder, output path and conversion cache under tmp_path"""
+    monkeypatch.setattr(ingest, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(ingest, "ProcessPoolExecutor", InlinePool)
+    monkeypatch.setattr(ingest, "convert_pdf", fake_convert)
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "Rajasthan.pdf").write_bytes(b"%PDF rajasthan")
+    return raw, tmp_path / "out" / "documents-with-ids.jsonl"
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_chunks_are_written_and_conversions_cached(layout, monkeypatch):
+    raw, output = layout
+    assert ingest.ingest(raw, output, workers=1) > 0
+    documents = read_jsonl(output)
+    assert documents and all(doc["location"] == "Rajasthan" for doc in documents)
+
+    # Second run: served from the cache, nothing is converted
+    monkeypatch.setattr(ingest, "convert_pdf", lambda path: pytest.fail("converted a cached PDF"))
+    assert ingest.ingest(raw, output, workers=1) == len(documents)
+
+def test_failed_pdf_keeps_previous_output_and_writes_manifest(layout):
+    raw, output = layout
+    output.parent.mkdir()
+    output.write_text("previous\n")
+    (raw / "broken.pdf").write_bytes(b"garbage")
+
+    with pytest.raises(IngestFailed) as excinfo:
+        ingest.ingest(raw, output, workers=1)
+    assert output.read_text() == "previous\n"
+    assert excinfo.value.manifest_path == failure_manifest_path(output)
+    assert "ValueError: not a PDF" in json.loads(failure_manifest_path(output).read_text())["broken.pdf"]
+
+def test_skip_failures_publishes_the_rest(layout):
+    raw, output = layout
+    (raw / "broken.pdf").write_bytes(b"garbage")
+    assert ingest.ingest(raw, output, workers=1, skip_failures=True) > 0
+    assert {doc["location"] for doc in read_jsonl(output)} == {"Rajasthan"}
+    assert list(json.loads(failure_manifest_path(output).read_text())) == ["broken.pdf"]
+
+    # Once the PDF is fixed, the stale manifest goes away
+    (raw / "broken.pdf").unlink()
+    ingest.ingest(raw, output, workers=1)
+    assert not failure_manifest_path(output).exists()
+
+def test_cli_exits_non_zero_on_failure(layout, monkeypatch):
+    raw, output = layout
+    (raw / "broken.pdf").write_bytes(b"garbage")
+    monkeypatch.setattr(sys, "argv", ["ingest.py", "--input", str(raw), "--output", str(output)])
+    with pytest.raises(SystemExit) as excinfo:
+        ingest.main()
+    assert excinfo.value.code == 1
+
+    monkeypatch.setattr(sys, "argv", sys.argv + ["--skip-failures"])
+    ingest.main()
+    assert output.exists()
@@ -0,0 +1,60 @@
+# test_judge.py - Tests for the batch judge: cache keys, CSV field handling and the resumable cache
+import math
+
+import judge
+from judge import JudgeCache, field_text, judge_key, run_judge
+
+def record(question="Best forts?", answer_llm="Amber Fort", answer_orig="Amber Fort in Jaipur", index=0):
+    return {"model": "ollama/phi3", "question_index": index, "question": question,
+            "answer_orig": answer_orig, "answer_llm": answer_llm}
+
+def test_field_text():
+    assert field_text(math.nan) == ""
+    assert field_text(None) == ""
+    assert field_text(42.0) == "42.0"
+    assert field_text("Amber Fort") == "Amber Fort"
+
+def test_key_depends_on_model_type_and_text():
+    key = judge_key("openai/gpt-4o-mini", "Question-Answer", record())
+    assert key == judge_key("openai/gpt-4o-mini", "Question-Answer", record(answer_orig="ignored for QA"))
+    assert key != judge_key("openai/gpt-4o", "Question-Answer", record())
+    assert key != judge_key("openai/gpt-4o-mini", "Answer-Question-Answer", record())
+    assert key != judge_key("openai/gpt-4o-mini", "Question-Answer", record(answer_llm="City Palace"))
+
+def test_key_accepts_pandas_missing_and_numeric_values():
+    key = judge_key("openai/gpt-4o-mini", "Answer-Question-Answer", record(answer_llm=math.nan, answer_orig=3.0))
+    assert key == judge_key("openai/gpt-4o-mini", "Answer-Question-Answer", record(answer_llm="", answer_orig="3.0"))
+
+def test_run_judge_uses_the_cache_and_survives_bad_rows(monkeypatch, tmp_path):
+    prompts = []
+
+    def fake_judge(prompt, judge_model, pacer):
+        prompts.append(prompt)
+        return {"Relevance": "RELEVANT", "Explanation": "ok", "tokens": {}}
+
+    monkeypatch.setattr(judge, "judge_one", fake_judge)
+    cache = JudgeCache(tmp_path / "cache.jsonl")
+    records = [record(), record(answer_llm=math.nan, index=1)]
+
+    df = run_judge(records, ["Question-Answer"], rpm=0, cache=cache)
+    assert len(df) == 2 and len(prompts) == 2
+    assert "Generated Answer: \n" in prompts[1]
+
+    # Second run: everything served from the cache file
+    df = run_judge(records, ["Question-Answer"], rpm=0, cache=JudgeCache(tmp_path / "cache.jsonl"))
+    assert len(df) == 2 and len(prompts) == 2
+
+def test_cache_drops_a_partly_written_last_line(tmp_path):
+    path = tmp_path / "cache.jsonl"
+    path.write_text('{"key": "a", "Relevance": "RELEVANT"}\n{"key":"b","x"')
+
+    cache = JudgeCache(path)
+    assert list(cache.entries) == ["a"]
+    cache.put("c", {"Relevance": "NON_RELEVANT"})
+    assert list(JudgeCache(path).entries) == ["a", "c"]
+
+def test_cache_ends_a_last_entry_missing_its_newline(tmp_path):
+    path = tmp_path / "cache.jsonl"
+    path.write_text('{"key": "a"}')
+    JudgeCache(path).put("b", {})
+    assert list(JudgeCache(path).entries) == ["a", "b"]
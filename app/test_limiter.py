@@ -0,0 +1,129 @@
+# test_limiter.py - Tests for the per-model in-flight limiter (FIFO handoff, rejections, cancellation)
+import time
+import asyncio
+import threading
+
+import pytest
+
+import limiter as limiter_module
+import metrics
+from limiter import ModelLimiter, QueueFullError, QueueTimeoutError, parse_limits
+
+def wait_for_queue(limiter: ModelLimiter, depth: int, timeout: float = 2.0):
+    deadline = time.time() + timeout
+    while len(limiter.queue) < depth:
+        assert time.time() < deadline, f"queue never reached {depth}"
+        time.sleep(0.005)
+
+def test_parse_limits():
+    assert parse_limits("ollama/*=2, openai/gpt-4o=8") == {"ollama/*": 2, "openai/gpt-4o": 8}
+    assert parse_limits("") == {}
+
+def test_freed_slot_goes_to_the_oldest_waiter_sync_or_async():
+    limiter = ModelLimiter(max_inflight=1, max_queue=8, timeout=5)
+    served = []
+
+    def sync_caller(name):
+        limiter.acquire()
+        served.append(name)
+        limiter.release(0.01)
+
+    async def main():
+        limiter.acquire()
+        threads = []
+
+        async def async_caller(name):
+            await limiter.aacquire()
+            served.append(name)
+            limiter.release(0.01)
+
+        # Alternate thread and coroutine waiters: s1, a1, s2, a2
+        tasks = []
+        for i in (1, 2):
+            thread = threading.Thread(target=sync_caller, args=(f"s{i}",))
+            thread.start()
+            threads.append(thread)
+            while len(limiter.queue) < 2 * i - 1:
+                await asyncio.sleep(0.005)
+            tasks.append(asyncio.create_task(async_caller(f"a{i}")))
+            while len(limiter.queue) < 2 * i:
+                await asyncio.sleep(0.005)
+
+        limiter.release(0.01)
+        await asyncio.gather(*tasks)
+        for thread in threads:
+            await asyncio.to_thread(thread.join)
+
+    asyncio.run(main())
+    assert served == ["s1", "a1", "s2", "a2"]
+    assert limiter.inflight == 0
+    assert limiter.counters["admitted"] == 5
+
+def test_full_queue_rejects_at_once():
+    limiter = ModelLimiter(max_inflight=1, max_queue=1, timeout=5)
+    limiter.acquire()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), limiter.release(0.0)))
+    thread.start()
+    wait_for_queue(limiter, 1)
+
+    with pytest.raises(QueueFullError):
+        limiter.acquire()
+    limiter.release(0.0)
+    thread.join()
+    assert limiter.counters["rejected_queue_full"] == 1
+
+def test_expected_wait_beyond_the_deadline_rejects_at_once():
+    limiter = ModelLimiter(max_inflight=1, max_queue=8, timeout=1)
+    limiter.acquire()
+    limiter.release(5.0)  # Calls take ~5s, so waiting for the next one exceeds the 1s deadline
+    limiter.acquire()
+    with pytest.raises(QueueFullError):
+        limiter.acquire()
+    assert len(limiter.queue) == 0
+
+def test_timeout_leaves_the_queue():
+    limiter = ModelLimiter(max_inflight=1, max_queue=8, timeout=0.05)
+    limiter.acquire()
+    with pytest.raises(QueueTimeoutError):
+        limiter.acquire()
+    assert len(limiter.queue) == 0
+    limiter.release(0.0)
+    assert limiter.inflight == 0
+
+def test_cancelled_async_waiter_hands_back_a_granted_slot():
+    limiter = ModelLimiter(max_inflight=1, max_queue=8, timeout=5)
+
+    async def main():
+        limiter.acquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        while len(limiter.queue) < 1:
+            await asyncio.sleep(0.005)
+        waiter.cancel()
+        limiter.release(0.0)
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert limiter.inflight == 0
+    assert len(limiter.queue) == 0
+
+def test_slot_waits_are_observed_per_model(monkeypatch):
+    limiter = ModelLimiter(max_inflight=1, max_queue=8, timeout=5)
+    monkeypatch.setitem(limiter_module._limiters, "test/queued", limiter)
+
+    def second_caller():
+        with limiter_module.model_slot("test/queued"):
+            pass
+
+    with limiter_module.model_slot("test/queued"):
+        thread = threading.Thread(target=second_caller)
+        thread.start()
+        wait_for_queue(limiter, 1)
+        time.sleep(0.05)
+    thread.join()
+
+    samples = {(name, labels.get("le")): value for name, labels, value in metrics.LIMITER_QUEUE_WAIT.samples()
+               if labels["model"] == "test/queued"}
+    assert samples[("rag_limiter_queue_wait_seconds_count", None)] == 2
+    assert samples[("rag_limiter_queue_wait_seconds_bucket", "0.005")] == 1  # Only the first was admitted at once
+    assert samples[("rag_limiter_queue_wait_seconds_sum", None)] >= 0.05
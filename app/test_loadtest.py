@@ -0,0 +1,101 @@
+# test_loadtest.py - Tests for the load generator (answer classification, loops and the summary)
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import loadtest
+import retrieval_eval
+from loadtest import percentiles, record_answer, summarize
+
+def answer(text="Amber Fort", relevance="RELEVANT", **timings):
+    return {"answer": text, "relevance": relevance, "prompt_tokens": 100, "cached_tokens": 40,
+            "stage_timings": timings}
+
+def usage(user, system, maxrss=204800):
+    return SimpleNamespace(ru_utime=user, ru_stime=system, ru_maxrss=maxrss)
+
+@pytest.mark.parametrize("answer_data, error", [
+    (answer(), None),
+    (answer("Sorry, I encountered an error: timeout"), "llm_error"),
+    (answer("Sorry, the model is busy right now"), "llm_busy"),
+    (answer(relevance="UNKNOWN"), "evaluation_error"),
+])
+def test_record_answer_classifies_failures(answer_data, error):
+    record = {"error": None}
+    record_answer(record, answer_data)
+    assert record["error"] == error
+
+def test_record_answer_copies_timings_and_tokens():
+    record = {"error": None}
+    record_answer(record, answer(search=0.1, llm=0.5))
+    assert record == {"error": None, "search": 0.1, "llm": 0.5, "prompt_tokens": 100, "cached_tokens": 40}
+
+def test_percentiles_are_in_milliseconds():
+    stats = percentiles([0.1, 0.2, 0.3])
+    assert stats["p50"] == pytest.approx(200)
+    assert stats["max"] == pytest.approx(300)
+    assert stats["mean"] == pytest.approx(200)
+
+def test_summarize_reports_successful_latency_only():
+    records = [
+        {"error": None, "search": 0.1, "total": 1.0, "prompt_tokens": 100, "cached_tokens": 50},
+        {"error": None, "search": 0.3, "total": 2.0, "prompt_tokens": 100, "cached_tokens": 0},
+        {"error": "llm_error", "search": 0.0, "total": 0.01, "prompt_tokens": 0, "cached_tokens": 0},
+    ]
+    summary = summarize(records, wall_time=2.0, usage_before=usage(1.0, 0.5),
+                        usage_after=usage(2.0, 1.0), peak_threads=7)
+
+    assert (summary["requests"], summary["successful"]) == (3, 2)
+    assert summary["error_rate"] == pytest.approx(1 / 3)
+    assert summary["errors"] == {"llm_error": 1}
+    assert summary["throughput_rps"] == 1.5
+    assert summary["successful_rps"] == 1.0
+    assert set(summary["latency_ms"]) == {"search", "total"}
+    assert summary["latency_ms"]["total"]["max"] == pytest.approx(2000)
+    assert summary["cached_token_ratio"] == 0.25
+    assert summary["resources"] == {"cpu_seconds": 1.5, "cpu_utilization": 0.75,
+                                    "peak_rss_mb": 200.0, "peak_threads": 7}
+
+def test_load_questions_repeats_the_shuffled_ground_truth(monkeypatch):
+    monkeypatch.setattr(retrieval_eval, "load_ground_truth",
+                        lambda: pd.DataFrame({"question": ["q1", "q2", "q3"]}))
+    questions = loadtest.load_questions(7)
+    assert len(questions) == 7
+    assert sorted(questions[:3]) == ["q1", "q2", "q3"]
+    assert questions[3:6] == questions[:3]
+    assert questions == loadtest.load_questions(7)
+
+def test_closed_loop_keeps_order(monkeypatch):
+    monkeypatch.setattr(loadtest, "run_request", lambda question, **kwargs: {"question": question, **kwargs})
+    records = loadtest.run_closed_loop(["a", "b", "c"], concurrency=2, target="rag")
+    assert [r["question"] for r in records] == ["a", "b", "c"]
+    assert all(r["target"] == "rag" for r in records)
+
+def test_open_loop_schedules_requests_at_the_rate(monkeypatch):
+    def fake_request(question, scheduled_at, **kwargs):
+        return {"question": question, "scheduled_at": scheduled_at, "started": time.time()}
+
+    monkeypatch.setattr(loadtest, "run_request", fake_request)
+    records = loadtest.run_open_loop(["a", "b", "c"], rps=20, max_in_flight=2)
+    gaps = [b["scheduled_at"] - a["scheduled_at"] for a, b in zip(records, records[1:])]
+    assert gaps == pytest.approx([0.05, 0.05])
+    assert all(r["started"] >= r["scheduled_at"] for r in records)
+
+def test_async_closed_loop_caps_concurrency(monkeypatch):
+    running, peak = 0, 0
+
+    async def fake_request(question, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"question": question}
+
+    monkeypatch.setattr(loadtest, "arun_request", fake_request)
+    records = asyncio.run(loadtest.arun_closed_loop(list("abcdef"), concurrency=2))
+    assert [r["question"] for r in records] == list("abcdef")
+    assert peak == 2
@@ -0,0 +1,78 @@
+# test_metrics.py - Tests for the Prometheus registry and text exposition
+import json
+import time
+
+import pytest
+
+import metrics
+
+def sample_lines(text: str, name: str):
+    return [line for line in text.splitlines() if line.startswith(name) and not line.startswith("#")]
+
+@pytest.fixture(autouse=True)
+def single_process(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", "")
+
+def test_counter_and_gauge_text_format():
+    requests = metrics.counter("test_requests_total", "Requests served", ["route"])
+    in_flight = metrics.gauge("test_in_flight", "Requests running")
+    requests.inc(route="/answer")
+    requests.inc(2, route='/say "hi"')
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    text = metrics.render()
+    assert "# HELP test_requests_total Requests served\n# TYPE test_requests_total counter\n" in text
+    assert sample_lines(text, "test_requests_total") == [
+        'test_requests_total{route="/answer"} 1.0',
+        'test_requests_total{route="/say \\"hi\\""} 2.0',
+    ]
+    assert "# TYPE test_in_flight gauge" in text
+    assert sample_lines(text, "test_in_flight") == ["test_in_flight 1.0"]
+    assert text.endswith("\n")
+
+def test_histogram_buckets_are_cumulative():
+    latency = metrics.histogram("test_latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, stage="llm")
+
+    assert sample_lines(metrics.render(), "test_latency_seconds") == [
+        'test_latency_seconds_bucket{stage="llm",le="0.1"} 1.0',
+        'test_latency_seconds_bucket{stage="llm",le="1.0"} 3.0',
+        'test_latency_seconds_bucket{stage="llm",le="+Inf"} 4.0',
+        'test_latency_seconds_sum{stage="llm"} 4.25',
+        'test_latency_seconds_count{stage="llm"} 4.0',
+    ]
+    with pytest.raises(TypeError):
+        latency.set(1.0, stage="llm")
+
+def test_labels_and_names_are_checked():
+    labelled = metrics.counter("test_labelled_total", "Labelled", ["model"])
+    with pytest.raises(ValueError):
+        labelled.inc(kind="prompt")
+    with pytest.raises(ValueError):
+        metrics.counter("test_labelled_total", "Registered twice")
+
+def test_collectors_run_before_each_render():
+    depth = metrics.gauge("test_collected_depth", "Filled by a collector")
+    values = iter([3, 5])
+    metrics.register_collector(lambda: depth.set(next(values)))
+
+    assert sample_lines(metrics.render(), "test_collected_depth") == ["test_collected_depth 3.0"]
+    assert sample_lines(metrics.render(), "test_collected_depth") == ["test_collected_depth 5.0"]
+
+def test_other_workers_are_merged_with_a_worker_label(monkeypatch, tmp_path):
+    published = metrics.counter("test_published_total", "Published by every worker")
+    published.inc(2)
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+
+    family = {"name": "test_published_total", "type": "counter", "help": "Published by every worker",
+              "samples": [["test_published_total", {}, 7.0]]}
+    (tmp_path / "worker_1.json").write_text(json.dumps({"time": time.time(), "families": [family]}))
+    (tmp_path / "worker_2.json").write_text(json.dumps({"time": time.time() - 3600, "families": [family]}))
+
+    lines = sample_lines(metrics.render(), "test_published_total")
+    assert f'test_published_total{{worker="{metrics.os.getpid()}"}} 2.0' in lines
+    assert 'test_published_total{worker="1"} 7.0' in lines
+    assert not any('worker="2"' in line for line in lines)  # Stale snapshot: that worker is gone
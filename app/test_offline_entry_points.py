@@ -0,0 +1,55 @@
+# test_offline_entry_points.py - Smoke tests: the measuring CLIs start with --offline and keep the retrieval cache off
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+import benchmark
+import loadtest
+import standins
+import sweep
+
+@pytest.fixture(autouse=True)
+def offline_cli(monkeypatch, tmp_path):
+    """Fresh environment, no indexing (needs the embedding models) and results in tmp_path"""
+    if "rag" in sys.modules:
+        pytest.skip("rag already imported in this process; use_offline_services() needs a fresh one")
+    saved_environ = dict(os.environ)
+    monkeypatch.delenv("RETRIEVAL_CACHE", raising=False)
+    monkeypatch.setattr(standins, "index_local_qdrant", lambda *args, **kwargs: 0)
+    for module in (loadtest, benchmark, sweep):
+        monkeypatch.setattr(module, "RESULTS_DIR", tmp_path)
+    yield
+    os.environ.clear()
+    os.environ.update(saved_environ)
+
+def run_main(monkeypatch, module, *argv):
+    monkeypatch.setattr(sys, "argv", [module.__name__, *argv])
+    module.main()
+    assert "rag" not in sys.modules
+
+def test_loadtest_offline(monkeypatch):
+    calls = []
+    monkeypatch.setattr(loadtest, "load_test", lambda **kwargs: calls.append(kwargs))
+    run_main(monkeypatch, loadtest, "--offline", "--requests", "1")
+    assert calls and calls[0]["requests"] == 1
+    assert os.environ["RETRIEVAL_CACHE"] == "off"
+    assert os.environ["QDRANT_URL"] == ":memory:"
+
+def test_loadtest_retrieval_cache_flag_keeps_the_cache(monkeypatch):
+    monkeypatch.setattr(loadtest, "load_test", lambda **kwargs: None)
+    run_main(monkeypatch, loadtest, "--offline", "--retrieval-cache")
+    assert "RETRIEVAL_CACHE" not in os.environ
+
+def test_benchmark_offline(monkeypatch, tmp_path):
+    monkeypatch.setattr(benchmark, "run_benchmarks", lambda args: {"pipeline.error_rate": 0.0})
+    baseline = tmp_path / "baseline.json"
+    run_main(monkeypatch, benchmark, "--offline", "--update-baseline", "--baseline", str(baseline))
+    assert os.environ["RETRIEVAL_CACHE"] == "off"
+    assert '"retrieval_cache": false' in baseline.read_text()
+
+def test_sweep_offline(monkeypatch):
+    monkeypatch.setattr(sweep, "run_sweep", lambda **kwargs: pd.DataFrame({"mrr": [0.5], "pareto": [True]}))
+    run_main(monkeypatch, sweep, "--offline")
+    assert os.environ["RETRIEVAL_CACHE"] == "off"
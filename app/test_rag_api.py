@@ -0,0 +1,102 @@
+# test_rag_api.py - Tests for the HTTP API on the stand-ins (answers, streaming, degradation, busy responses)
+import json
+
+import pytest
+
+from admission import AdmissionController, QUESTION
+
+MODEL = "openai/gpt-4o-mini"
+
+@pytest.fixture
+def api(rag, monkeypatch):
+    """api with conversations recorded in memory instead of Postgres"""
+    import api
+
+    saved = []
+
+    async def save_conversation(conversation_id, question, answer_data):
+        saved.append((conversation_id, question, answer_data))
+
+    monkeypatch.setattr(api, "asave_conversation", save_conversation)
+    monkeypatch.setattr(api, "admission_control", AdmissionController(4))
+    api.saved = saved
+    return api
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+
+    # No lifespan: it migrates the database
+    return TestClient(api.app)
+
+def sse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+def test_answer_is_saved_under_its_conversation(api, client):
+    response = client.post("/answer", json={"question": "Palaces in Karnataka?", "model": MODEL,
+                                            "conversation_id": "c-1"})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["conversation_id"], body["degradation"], body["model_used"]) == ("c-1", "full", MODEL)
+    assert body["location_filter"] == ["Karnataka"]
+    assert [(c, q) for c, q, _ in api.saved] == [("c-1", "Palaces in Karnataka?")]
+
+    response = client.post("/answer", json={"question": "Beaches?", "model": MODEL, "save": False})
+    assert response.json()["conversation_id"] and len(api.saved) == 1
+
+def test_stream(api, client):
+    response = client.post("/answer", json={"question": "Beaches?", "model": MODEL, "stream": True,
+                                            "conversation_id": "c-2"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert events[0] == ("start", {"conversation_id": "c-2", "trace_id": events[0][1]["trace_id"]})
+    assert events[-1][0] == "done"
+    tokens = "".join(data for event, data in events if event == "token")
+    assert events[-1][1]["answer"] == tokens
+    assert api.saved[0][0] == "c-2" and api.saved[0][2]["answer"] == tokens
+
+def test_degraded_to_retrieval_only(api, client, monkeypatch):
+    monkeypatch.setattr(api, "admission_control", AdmissionController(4, max_queue=1, retrieval_only_at=0.0))
+    body = client.post("/answer", json={"question": "Beaches in Goa?", "model": MODEL, "save": False}).json()
+    assert body["degradation"] == "retrieval_only"
+    assert "Baga Beach" in body["answer"]
+
+def test_shed_requests_get_busy_responses(api, client, monkeypatch):
+    monkeypatch.setattr(api, "admission_control", AdmissionController(0, max_queue=0))
+    response = client.post("/answer", json={"question": "Beaches?", "model": MODEL})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(api.API_RETRY_AFTER)
+
+    response = client.post("/answer", json={"question": "Beaches?", "model": MODEL, "stream": True})
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["start", "busy"]
+    assert events[1][1]["retry_after"] == api.API_RETRY_AFTER
+    assert api.saved == []
+
+def test_batch(api, client, monkeypatch):
+    questions = ["Beaches?", "Palaces in Karnataka?"]
+    results = client.post("/answer/batch", json={"requests": [
+        {"question": question, "model": MODEL, "save": False} for question in questions
+    ]}).json()
+    assert [r["location_filter"] for r in results] == [None, ["Karnataka"]]
+
+    monkeypatch.setattr(api, "API_BATCH_LIMIT", 1)
+    response = client.post("/answer/batch", json={"requests": [{"question": q} for q in questions]})
+    assert response.status_code == 413
+
+def test_requests_are_validated(client):
+    assert client.post("/answer", json={"question": ""}).status_code == 422
+    assert client.post("/answer", json={"question": "Beaches?", "search_type": "fuzzy"}).status_code == 422
+    assert client.post("/feedback", json={"conversation_id": "c-1", "feedback": 0}).status_code == 422
+
+def test_metrics_cover_routes_and_components(client):
+    client.get("/health")
+    text = client.get("/metrics").text
+    assert 'rag_http_requests_total{method="GET",path="/health",status="200"}' in text
+    assert "# TYPE rag_admission_requests_total counter" in text
+    assert 'rag_cache_entries{cache="relevance"}' in text
+    assert "rag_singleflight_in_flight" in text
@@ -0,0 +1,110 @@
+# test_rag_pipelines.py - Tests for the RAG pipeline on the stand-ins (location filters, prompt caching, sync/async agreement)
+import asyncio
+
+import pytest
+
+def uncached(rag, run):
+    """Run a pipeline without judgments cached by the previous one"""
+    rag._relevance_cache.clear()
+    return run()
+
+def comparable(answer_data):
+    return {key: value for key, value in answer_data.items() if key not in ("response_time", "stage_timings")}
+
+def test_locations_named_in_the_question(rag):
+    assert rag.detect_locations("Zoos and temples in Andhra?") == ["Andhra_Pradesh", "Indian_zoos_and_botanical_gardens"]
+    assert rag.detect_locations("Best beaches in India?") == []
+    assert rag.location_filter(None) is None
+
+def test_location_filtered_search(rag):
+    assert {r["location"] for r in rag.qdrant_search("palaces", limit=3, location="Goa")} == {"Goa"}
+    assert {r["location"] for r in rag.qdrant_search("palaces", "hybrid", 3, ["Goa", "Karnataka"])} <= {"Goa", "Karnataka"}
+
+    results, location, _ = rag.retrieve("Palaces in Karnataka?")
+    assert location == ["Karnataka"] and {r["location"] for r in results} == {"Karnataka"}
+
+    # Nothing indexed for the detected location: search the whole collection instead
+    results, location, _ = rag.retrieve("Hill stations to visit?")
+    assert location is None and len(results) == 3  # Every indexed document
+
+@pytest.mark.parametrize("search_type", ["semantic", "hybrid"])
+@pytest.mark.parametrize("location", [None, "Goa", ["Goa", "Karnataka"]])
+def test_searches_agree(rag, search_type, location):
+    assert rag.qdrant_search("palaces", search_type, 3, location) == \
+        asyncio.run(rag.aqdrant_search("palaces", search_type, 3, location))
+
+@pytest.mark.parametrize("question,location,skip_judge", [
+    ("Where can I see a palace in Karnataka?", None, False),
+    ("Beaches?", "Goa", True),
+    ("Forts?", "Kerala", False),  # No documents there: empty context
+])
+def test_answers_agree(rag, question, location, skip_judge):
+    sync = uncached(rag, lambda: rag.get_answer(question, "openai/gpt-4o-mini", "hybrid", location, skip_judge))
+    async_ = uncached(rag, lambda: asyncio.run(
+        rag.aget_answer(question, "openai/gpt-4o-mini", "hybrid", location, skip_judge)))
+    assert comparable(sync) == comparable(async_)
+    assert sync["stage_timings"].keys() == async_["stage_timings"].keys()
+
+def test_streams_agree(rag):
+    async def collect():
+        return [event async for event in rag.astream_answer("Palaces?", "openai/gpt-4o-mini")]
+
+    sync = uncached(rag, lambda: list(rag.stream_answer("Palaces?", "openai/gpt-4o-mini")))
+    async_ = uncached(rag, lambda: asyncio.run(collect()))
+    assert [event for event in sync if event[0] == "token"] == [event for event in async_ if event[0] == "token"]
+    assert comparable(sync[-1][1]) == comparable(async_[-1][1])
+    assert sync[-1][1]["answer"] == "".join(delta for kind, delta in sync if kind == "token")
+
+def test_failed_calls_agree(rag):
+    sync = rag.get_answer("Palaces?", "unknown/model", skip_judge=True)
+    async_ = asyncio.run(rag.aget_answer("Palaces?", "unknown/model", skip_judge=True))
+    assert sync["answer"].startswith("Sorry, I encountered an error")
+    assert comparable(sync) == comparable(async_)
+
+def test_streamed_answer_collects_deltas_and_usage(rag):
+    streamed = rag._StreamedAnswer()
+    assert streamed.add("Mysore", None) == "Mysore"
+    assert streamed.add(" Palace", None) == " Palace"
+    usage = {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5, "cached_tokens": 0}
+    assert streamed.add(None, usage) is None
+    assert (streamed.answer(), streamed.tokens) == ("Mysore Palace", usage)
+
+    assert streamed.fail(ValueError("stream broke")) == "Sorry, I encountered an error: stream broke"
+    assert streamed.answer() == "Sorry, I encountered an error: stream broke"
+
+def test_judge_is_only_called_when_needed(rag, monkeypatch):
+    unscored = {"local_relevance": None, "confidence": None}
+    confident = {"local_relevance": "RELEVANT", "confidence": 0.95}
+    assert rag._judgment_without_judge(unscored, skip_judge=True)[0]["method"] == "skipped"
+    assert rag._judgment_without_judge(confident, skip_judge=True)[0]["method"] == "local"
+    assert rag._judgment_without_judge(unscored, skip_judge=False) == (None, "llm")
+
+    monkeypatch.setattr(rag, "RELEVANCE_JUDGE_SAMPLE_RATE", 0.0)
+    assert rag._judgment_without_judge(confident, skip_judge=False)[0]["method"] == "local"
+    assert rag._judgment_without_judge({**confident, "confidence": 0.1}, skip_judge=False) == (None, "llm_low_confidence")
+
+def test_prompt_puts_the_static_instructions_first(rag):
+    results = [{"location": "Goa", "content": "Baga Beach"}, {"location": "Kerala", "text": "Backwaters"}]
+    prompt = rag.build_prompt("Beaches?", results)
+    assert prompt == "CONTEXT:\nlocation: Goa\ncontent: Baga Beach\n\nlocation: Kerala\ncontent: Backwaters\n\n" \
+                     "QUESTION: Beaches?"
+
+    messages = rag._chat_args(prompt, "openai/gpt-4o-mini", rag.SYSTEM_PROMPT)["messages"]
+    assert messages == [{"role": "system", "content": rag.SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+    # Requests differ only after the shared prefix
+    other = rag._chat_args(rag.build_prompt("Forts?", []), "openai/gpt-4o-mini", rag.SYSTEM_PROMPT)["messages"]
+    assert other[0] == messages[0]
+
+def test_cached_tokens_are_billed_at_the_cached_rate(rag):
+    tokens = {"prompt_tokens": 2000, "completion_tokens": 100, "cached_tokens": 1024}
+    assert rag.calculate_openai_cost("openai/gpt-4o-mini", tokens) == pytest.approx(
+        (976 * 0.00015 + 1024 * 0.000075 + 100 * 0.0006) / 1000)
+    assert rag.calculate_openai_cost("openai/gpt-4o", {"prompt_tokens": 1000, "completion_tokens": 1000}) == \
+        pytest.approx(0.0125)
+    assert rag.calculate_openai_cost("ollama/phi3", tokens) == 0
+
+def test_answers_report_cached_prompt_tokens(rag):
+    answer_data = uncached(rag, lambda: rag.get_answer("Palaces?", "openai/gpt-4o-mini", skip_judge=True))
+    assert 0 < answer_data["cached_tokens"] <= answer_data["prompt_tokens"]
+    tokens = {key: answer_data[key] for key in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+    assert answer_data["openai_cost"] == rag.calculate_openai_cost("openai/gpt-4o-mini", tokens)
@@ -0,0 +1,97 @@
+# test_relevance_scorer.py - Tests for the local relevance scorer (features, fitting, calibration, persistence)
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from relevance_scorer import (FEATURES, LABELS, RelevanceScorer, calibrate, content_terms, extract_features,
+                              load_judgments_csv)
+
+def encode(texts):
+    """Bag of words hashed into 32 dimensions"""
+    vectors = np.zeros((len(texts), 32))
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, sum(map(ord, word)) % 32] += 1
+    return vectors
+
+def judged(n=30):
+    places = ["Mysore Palace", "Amber Fort", "Baga Beach", "Hawa Mahal", "Lalbagh Garden", "Meenakshi Temple"]
+    rows = []
+    for i in range(n):
+        place = places[i % len(places)]
+        question = f"What is special about {place}?"
+        context = f"{place} is famous for its architecture and history."
+        if i % 2:
+            rows.append((question, f"{place} is famous for its architecture and history.", context, "RELEVANT"))
+        else:
+            rows.append((question, "Sorry, I could not find that in the context.", context, "NON_RELEVANT"))
+    return pd.DataFrame(rows, columns=["question", "answer", "context", "relevance"])
+
+def test_content_terms_drop_stopwords():
+    assert content_terms("What are the best forts in Rajasthan?") == {"best", "forts", "rajasthan"}
+
+def test_features():
+    X = extract_features(encode, ["Which forts are in Jaipur?", "Which forts are in Jaipur?"],
+                         ["Amber Fort is in Jaipur", "Sorry, no information"], ["Amber Fort, Jaipur", ""])
+    assert X.shape == (2, len(FEATURES))
+    columns = dict(zip(FEATURES, X.T))
+    assert columns["question_term_overlap"].tolist() == [0.5, 0.0]  # "jaipur" of {"forts", "jaipur"}
+    assert columns["refusal"].tolist() == [0.0, 1.0]
+    assert columns["answer_log_words"][0] == pytest.approx(np.log1p(5))
+    assert columns["answer_context_sim"][1] == 0.0  # Empty context embeds to a zero vector
+
+def test_fit_separates_labels():
+    X = np.array([[0.0], [0.1], [0.5], [0.6], [1.0], [1.1]])
+    y = np.array([0, 0, 1, 1, 2, 2])
+    probs = RelevanceScorer.fit(X, y).predict_proba(X)
+    assert probs.argmax(axis=1).tolist() == y.tolist()
+    assert np.allclose(probs.sum(axis=1), 1.0)
+
+def test_calibrate_and_score(tmp_path):
+    df = judged()
+    df.loc[len(df)] = ["Ignored?", "Unlabelled", "", "UNKNOWN"]
+    scorer, report = calibrate(df, encode, folds=3)
+    assert report["samples"] == 30
+    assert report["label_counts"] == {"NON_RELEVANT": 15, "RELEVANT": 15}
+    assert report["cv_accuracy"] == 1.0
+    assert [row["threshold"] for row in report["coverage"]] == [0.5, 0.6, 0.7, 0.8, 0.9]
+
+    label, confidence = scorer.score(encode, "What is special about Hawa Mahal?",
+                                     "Hawa Mahal is famous for its architecture and history.",
+                                     "Hawa Mahal is famous for its architecture and history.")
+    assert label == "RELEVANT" and confidence > 0.5
+
+    path = tmp_path / "scorer.json"
+    scorer.save(path)
+    loaded = RelevanceScorer.load(path)
+    assert loaded.metadata["samples"] == 30
+    assert np.allclose(loaded.predict_proba(np.ones((1, len(FEATURES)))),
+                       scorer.predict_proba(np.ones((1, len(FEATURES)))))
+
+def test_load_rejects_missing_or_outdated_scorers(tmp_path):
+    path = tmp_path / "scorer.json"
+    assert RelevanceScorer.load(path) is None
+
+    scorer = RelevanceScorer(np.zeros((len(FEATURES), len(LABELS))), np.zeros(len(LABELS)),
+                             np.zeros(len(FEATURES)), np.ones(len(FEATURES)))
+    scorer.save(path)
+    data = json.loads(path.read_text())
+    path.write_text(json.dumps({**data, "features": FEATURES[:-1]}))
+    assert RelevanceScorer.load(path) is None
+
+def test_load_judgments_csv_joins_question_answer_judgments(tmp_path):
+    answers = pd.DataFrame({"model": ["phi3", "phi3"], "question_index": [0, 1], "question": ["q0", "q1"],
+                            "answer_llm": ["a0", None], "answer_orig": ["c0", "c1"]})
+    judgments = pd.DataFrame({"model": ["phi3", "phi3", "phi3"], "question_index": [0, 1, 0],
+                              "evaluation_type": ["Question-Answer", "Question-Answer", "Answer-Question-Answer"],
+                              "Relevance": ["RELEVANT", "NON_RELEVANT", "PARTLY_RELEVANT"]})
+    answers.to_csv(tmp_path / "answers.csv", index=False)
+    judgments.to_csv(tmp_path / "judgments.csv", index=False)
+
+    df = load_judgments_csv(tmp_path / "answers.csv", tmp_path / "judgments.csv")
+    assert df.to_dict("records") == [
+        {"question": "q0", "answer": "a0", "context": "c0", "relevance": "RELEVANT"},
+        {"question": "q1", "answer": "", "context": "c1", "relevance": "NON_RELEVANT"},
+    ]
@@ -0,0 +1,78 @@
+# test_reranker.py - Tests for cross-encoder reranking and its latency budget
+import time
+
+import pytest
+import sentence_transformers
+
+from reranker import Reranker
+
+CANDIDATES = [{"id": str(i), "content": content} for i, content in enumerate([
+    "Baga Beach nightlife",
+    "Mysore Palace lights",
+    "Palace of Mysore, lit on Sundays: Mysore Palace",
+    "Amber Fort",
+])]
+
+class WordCountEncoder:
+    """Scores a pair by how often the query's words occur in the document; `delay` seconds per pair"""
+    delay = 0.0
+
+    def __init__(self, model_name, device, **kwargs):
+        self.batches = []
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay * len(pairs))
+        return [sum(doc.lower().split().count(word) for word in query.lower().split()) for query, doc in pairs]
+
+@pytest.fixture
+def make_reranker(monkeypatch):
+    monkeypatch.setattr(sentence_transformers, "CrossEncoder", WordCountEncoder)
+
+    def make(delay=0.0, **kwargs):
+        monkeypatch.setattr(WordCountEncoder, "delay", delay)
+        reranker = Reranker(backend="torch", **kwargs)
+        reranker.model.batches.clear()  # Drop the warm-up call
+        return reranker
+    return make
+
+def test_reranks_by_score(make_reranker):
+    reranker = make_reranker(budget_ms=0)
+    results = reranker.rerank("mysore palace", CANDIDATES, top_n=2)
+    assert [r["id"] for r in results] == ["2", "1"]
+    assert [r["rerank_score"] for r in results] == [3.0, 2.0]
+    assert reranker.stats()["reranked"] == 1
+    assert reranker.rerank("mysore palace", [], top_n=2) == []
+
+def test_scores_in_batches(make_reranker):
+    reranker = make_reranker(budget_ms=0, batch_size=3)
+    reranker.rerank("palace", CANDIDATES, top_n=1)
+    assert reranker.model.batches == [3, 1]
+
+def test_pool_is_cut_to_what_fits_the_budget(make_reranker):
+    reranker = make_reranker(budget_ms=100)
+    reranker.seconds_per_pair = 0.04  # Two pairs fit
+    results = reranker.rerank("mysore palace", CANDIDATES, top_n=2)
+    assert [r["id"] for r in results] == ["1", "0"]
+    assert reranker.stats()["truncated_pools"] == 1
+
+def test_falls_back_to_retrieval_order_when_top_n_does_not_fit(make_reranker):
+    reranker = make_reranker(budget_ms=100)
+    reranker.seconds_per_pair = 0.2
+    assert reranker.rerank("mysore palace", CANDIDATES, top_n=2, fallback_limit=3) == CANDIDATES[:3]
+    assert reranker.stats()["skipped_over_budget"] == 1
+    assert reranker.seconds_per_pair == pytest.approx(0.18)  # Relaxed for the next query
+    assert reranker.model.batches == []
+
+def test_slow_batches_time_out(make_reranker):
+    reranker = make_reranker(delay=0.03, budget_ms=50, batch_size=2)
+    assert reranker.rerank("mysore palace", CANDIDATES, top_n=2) == CANDIDATES[:2]
+    assert reranker.stats()["timeouts"] == 1
+    assert reranker.seconds_per_pair >= 0.03
+
+    # Offline evaluation ignores the budget
+    assert [r["id"] for r in reranker.rerank("mysore palace", CANDIDATES, top_n=2, use_budget=False)] == ["2", "1"]
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown rerank backend"):
+        Reranker(backend="tpu")
@@ -0,0 +1,155 @@
+# test_resilience.py - Tests for LLM retries, backoff and the per-provider circuit breakers
+import time
+import asyncio
+import itertools
+from contextlib import contextmanager, asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import resilience
+from resilience import (CircuitBreaker, CircuitOpenError, acall_with_resilience, backoff_delay,
+                        call_with_resilience, is_retryable, retry_after)
+
+_providers = itertools.count()
+
+class APIError(Exception):
+    def __init__(self, status_code=None, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+class APIConnectionError(Exception):
+    pass
+
+@pytest.fixture
+def provider():
+    """A provider name of its own, so breakers and counters start fresh"""
+    return f"test-provider-{next(_providers)}"
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(resilience.time, "sleep", slept.append)
+    return slept
+
+def failing(*errors, result="answer"):
+    """fn raising the given errors in turn, then returning result"""
+    calls = iter(errors)
+
+    def fn():
+        error = next(calls, None)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+@pytest.mark.parametrize("error, retryable", [
+    (APIError(429), True),
+    (APIError(503), True),
+    (APIError(400), False),
+    (APIError(401), False),
+    (APIConnectionError(), True),
+    (TimeoutError(), True),
+    (ValueError(), False),
+    (CircuitOpenError(), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) == retryable
+
+def test_retry_after_headers():
+    assert retry_after(APIError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(APIError(429, {"retry-after": "3"})) == 3.0
+    assert retry_after(APIError(429, {"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"})) is None
+    assert retry_after(ValueError()) is None
+
+def test_backoff_delay():
+    assert backoff_delay(1, APIError(429, {"retry-after": "60"}), cap=20) == 20
+    assert backoff_delay(0, APIError(429, {"retry-after": "2"})) == 2
+    assert all(0 <= backoff_delay(3, base=0.5, cap=20) <= 4 for _ in range(100))
+    assert all(backoff_delay(10, base=0.5, cap=2) <= 2 for _ in range(100))
+
+def test_breaker_opens_then_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    breaker.before_call()
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # The probe
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one probe at a time
+    assert breaker.record_failure() is True  # Failed probe re-opens
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_success()
+    assert (breaker.state, breaker.failures) == ("closed", 0)
+
+def test_retries_then_succeeds(provider, sleeps):
+    fn = failing(APIError(429, {"retry-after": "1"}), APIError(503, {"retry-after": "2"}))
+    assert call_with_resilience(provider, fn, max_retries=3) == "answer"
+    assert sleeps == [1.0, 2.0]
+    stats = resilience.stats()[provider]
+    assert (stats["calls"], stats["failures"], stats["retries"], stats["retry_seconds"]) == (3, 2, 2, 3.0)
+    assert stats["breaker_state"] == "closed"
+
+def test_bad_requests_are_not_retried(provider, sleeps):
+    with pytest.raises(APIError):
+        call_with_resilience(provider, failing(APIError(400)), max_retries=3)
+    assert sleeps == []
+    assert resilience.stats()[provider]["calls"] == 1
+
+def test_gives_up_after_max_retries(provider, sleeps):
+    errors = [APIError(500, {"retry-after": "0"}) for _ in range(3)]
+    with pytest.raises(APIError):
+        call_with_resilience(provider, failing(*errors), max_retries=2)
+    assert len(sleeps) == 2
+
+def test_open_breaker_fails_fast(provider, sleeps):
+    resilience.breaker_for(provider).threshold = 2
+    errors = [APIConnectionError() for _ in range(2)]
+    with pytest.raises(CircuitOpenError):
+        call_with_resilience(provider, failing(*errors), max_retries=5)
+    stats = resilience.stats()[provider]
+    assert (stats["calls"], stats["breaker_opens"], stats["short_circuited"]) == (2, 1, 1)
+    assert stats["breaker_state"] == "open"
+
+def test_slot_is_released_while_backing_off(provider, monkeypatch):
+    events = []
+
+    @contextmanager
+    def slot():
+        events.append("acquire")
+        yield
+        events.append("release")
+
+    monkeypatch.setattr(resilience.time, "sleep", lambda delay: events.append("sleep"))
+    fn = failing(APIError(429, {"retry-after": "0"}))
+    assert call_with_resilience(provider, fn, slot=slot) == "answer"
+    assert events == ["acquire", "release", "sleep", "acquire", "release"]
+
+def test_async_retries_with_slot(provider, monkeypatch):
+    events = []
+
+    @asynccontextmanager
+    async def slot():
+        events.append("acquire")
+        yield
+        events.append("release")
+
+    async def no_sleep(delay):
+        events.append("sleep")
+
+    monkeypatch.setattr(resilience.asyncio, "sleep", no_sleep)
+    sync_fn = failing(APIError(503, {"retry-after": "0"}))
+
+    async def fn():
+        return sync_fn()
+
+    assert asyncio.run(acall_with_resilience(provider, fn, slot=slot)) == "answer"
+    assert events == ["acquire", "release", "sleep", "acquire", "release"]
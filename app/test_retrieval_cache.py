@@ -0,0 +1,68 @@
+# test_retrieval_cache.py - Tests for the shared retrieval cache (SQLite store, version invalidation)
+import asyncio
+
+import pytest
+
+from retrieval_cache import RetrievalCache, SQLiteStore, cache_key, decode_results, encode_results
+
+RESULTS = [{"id": "doc-1", "content": "Mysore Palace", "location": "Karnataka", "score": 0.91}]
+
+@pytest.fixture
+def cache(tmp_path):
+    # version_ttl=0: read the collection version from the store on every lookup
+    return RetrievalCache(SQLiteStore(tmp_path / "retrieval.db"), version_ttl=0)
+
+def test_results_round_trip():
+    assert decode_results(encode_results(RESULTS)) == RESULTS
+
+def test_key_covers_everything_that_changes_the_results():
+    base = cache_key("docs", 1, "palaces", "semantic", 5, None)
+    assert base == cache_key("docs", 1, "palaces", "semantic", 5, None)
+    assert base != cache_key("docs", 2, "palaces", "semantic", 5, None)
+    assert base != cache_key("docs", 1, "palaces", "hybrid", 5, None)
+    assert base != cache_key("docs", 1, "palaces", "semantic", 3, None)
+    assert base != cache_key("docs", 1, "palaces", "semantic", 5, "Karnataka")
+
+def test_miss_then_hit(cache):
+    assert cache.get("docs", "palaces", "semantic", 5, None) is None
+    cache.set("docs", "palaces", "semantic", 5, None, RESULTS)
+    assert cache.get("docs", "palaces", "semantic", 5, None) == RESULTS
+
+    stats = cache.stats()["by_search_type"]["semantic"]
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+def test_bump_version_invalidates_only_that_collection(cache):
+    cache.set("docs", "palaces", "semantic", 5, None, RESULTS)
+    cache.set("other", "palaces", "semantic", 5, None, RESULTS)
+
+    assert cache.bump_version("docs") == 1
+    assert cache.get("docs", "palaces", "semantic", 5, None) is None
+    assert cache.get("other", "palaces", "semantic", 5, None) == RESULTS
+    assert cache.store.size() == 1
+
+def test_other_processes_see_the_new_version(tmp_path):
+    path = tmp_path / "retrieval.db"
+    reader = RetrievalCache(SQLiteStore(path), version_ttl=0)
+    reader.set("docs", "palaces", "semantic", 5, None, RESULTS)
+
+    # A second store on the same file, as setup.py would open after reindexing
+    RetrievalCache(SQLiteStore(path)).bump_version("docs")
+    assert reader.get("docs", "palaces", "semantic", 5, None) is None
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = RetrievalCache(SQLiteStore(tmp_path / "retrieval.db"), ttl=-1)
+    cache.set("docs", "palaces", "semantic", 5, None, RESULTS)
+    assert cache.get("docs", "palaces", "semantic", 5, None) is None
+
+def test_store_errors_count_as_misses(cache):
+    cache.store._conn.close()
+    assert cache.get("docs", "palaces", "semantic", 5, None) is None
+    cache.set("docs", "palaces", "semantic", 5, None, RESULTS)
+    assert cache.stats()["errors"] == 2
+
+def test_async_wrappers(cache):
+    async def main():
+        await cache.aset("docs", "palaces", "hybrid", 5, ["Karnataka"], RESULTS)
+        return await cache.aget("docs", "palaces", "hybrid", 5, ["Karnataka"])
+
+    assert asyncio.run(main()) == RESULTS
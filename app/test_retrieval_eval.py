@@ -0,0 +1,54 @@
+# test_retrieval_eval.py - Tests for the retrieval metrics (relevance matrix, hit rate, MRR, nDCG)
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from retrieval_eval import compute_metrics, load_ground_truth, relevance_matrix
+
+def test_relevance_matrix_matches_ids_and_merged_ids():
+    results = [
+        [{"id": "a"}, {"id": "b"}],
+        [{"id": "x"}, {"id": "y", "merged_ids": ["c", "d"]}],
+        [{"id": "z"}],
+    ]
+    relevance = relevance_matrix(["a", "d", "e"], results, k=3)
+    assert relevance.tolist() == [
+        [True, False, False],
+        [False, True, False],
+        [False, False, False],
+    ]
+
+def test_relevance_matrix_stops_at_k():
+    results = [[{"id": "x"}, {"id": "y"}, {"id": "a"}]]
+    assert not relevance_matrix(["a"], results, k=2).any()
+
+def test_metrics_on_a_small_matrix():
+    relevance = np.array([
+        [True, False, False],   # rank 1
+        [False, True, False],   # rank 2
+        [False, False, False],  # missed
+    ])
+    metrics = compute_metrics(relevance, ks=(1, 3))
+    assert metrics["total_questions"] == 3
+    assert metrics["mrr"] == pytest.approx((1 + 0.5) / 3)
+    assert metrics["hit_rate@1"] == pytest.approx(1 / 3)
+    assert metrics["hit_rate@3"] == pytest.approx(2 / 3)
+    assert metrics["hit_rate"] == metrics["hit_rate@3"]
+    assert metrics["ndcg@1"] == pytest.approx(1 / 3)
+    assert metrics["ndcg@3"] == pytest.approx((1 + 1 / math.log2(3)) / 3)
+
+def test_cutoffs_beyond_the_depth_are_clamped():
+    metrics = compute_metrics(np.array([[False, True]]), ks=(1, 5))
+    assert metrics["hit_rate@2"] == 1.0
+    assert "hit_rate@5" not in metrics
+
+def test_no_questions():
+    assert compute_metrics(np.zeros((0, 5), dtype=bool)) == {"total_questions": 0}
+
+def test_load_ground_truth_sample(tmp_path):
+    path = tmp_path / "ground-truth.csv"
+    pd.DataFrame({"question": ["q1", "q2", "q3"], "id": ["a", "b", "c"]}).to_csv(path, index=False)
+    assert len(load_ground_truth(path)) == 3
+    assert load_ground_truth(path, sample=2)["id"].tolist() == ["a", "b"]
@@ -0,0 +1,60 @@
+# test_router.py - Tests for hedged requests, fallbacks and abandoned-call accounting
+import time
+import threading
+
+import pytest
+
+from router import Router, parse_fallbacks
+
+TOKENS = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15, "cached_tokens": 0}
+
+def fake_call(latencies, failing=()):
+    """LLM call answering after a per-model latency; models in `failing` raise"""
+    def call(prompt, model, **kwargs):
+        time.sleep(latencies.get(model, 0))
+        if model in failing:
+            raise ConnectionError(f"{model} down")
+        return f"{model} answer", dict(TOKENS)
+    return call
+
+def test_parse_fallbacks():
+    assert parse_fallbacks("ollama/phi3=openai/gpt-4o-mini, openai/gpt-4o=a|b") == {
+        "ollama/phi3": ["openai/gpt-4o-mini"], "openai/gpt-4o": ["a", "b"]}
+
+def test_fast_primary_is_not_hedged():
+    router = Router(fake_call({}), {"slow": ["fast"]}, hedge_delay="0.5")
+    assert router.complete("q", "slow")[2] == "slow"
+    assert "hedges" not in router.stats()["slow"]
+
+def test_slow_primary_is_hedged_and_its_usage_recorded():
+    abandoned = []
+    done = threading.Event()
+
+    def on_abandoned(model, tokens):
+        abandoned.append((model, tokens))
+        done.set()
+
+    router = Router(fake_call({"slow": 0.3}), {"slow": ["fast"]}, hedge_delay="0.05", on_abandoned=on_abandoned)
+    answer, tokens, model = router.complete("q", "slow")
+    assert (answer, model) == ("fast answer", "fast")
+    assert done.wait(2)
+    assert abandoned == [("slow", TOKENS)]
+    stats = router.stats()
+    assert stats["fast"]["hedges"] == 1 and stats["fast"]["served_for_others"] == 1
+    assert stats["slow"]["abandoned"] == 1 and stats["slow"]["abandoned_completed"] == 1
+
+def test_errors_fall_back():
+    router = Router(fake_call({}, failing={"primary"}), {"primary": ["backup"]}, hedge_delay="0")
+    assert router.complete("q", "primary")[2] == "backup"
+
+    router = Router(fake_call({}, failing={"primary", "backup"}), {"primary": ["backup"]}, hedge_delay="0")
+    with pytest.raises(RuntimeError, match="All models failed"):
+        router.complete("q", "primary")
+
+def test_hedge_delay_starts_when_the_call_runs():
+    # One pool thread, busy for 0.3s: the primary waits in the queue before it runs
+    router = Router(fake_call({"primary": 0.1}), {"primary": ["backup"]}, hedge_delay="0.2", max_workers=1)
+    router.pool.submit(time.sleep, 0.3)
+    # Timed from submission the hedge would fire at 0.2s; the primary answers 0.1s after starting
+    assert router.complete("q", "primary")[2] == "primary"
+    assert "hedges" not in router.stats().get("backup", {})
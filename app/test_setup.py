@@ -0,0 +1,55 @@
+# test_setup.py - Tests for document loading and collection setup
+import json
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+import setup
+
+def test_ingest_output_is_preferred(monkeypatch, tmp_path):
+    processed = tmp_path / "data" / "processed"
+    processed.mkdir(parents=True)
+    (processed / "documents-with-ids.json").write_text(json.dumps([{"id": "notebook"}]))
+    (processed / "documents-with-ids.jsonl").write_text('{"id": "ingest-1"}\n\n{"id": "ingest-2"}\n')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DOCUMENTS_PATH", raising=False)
+
+    assert [doc["id"] for doc in setup.load_documents()] == ["ingest-1", "ingest-2"]
+
+    monkeypatch.setenv("DOCUMENTS_PATH", str(processed / "documents-with-ids.json"))
+    assert [doc["id"] for doc in setup.load_documents()] == ["notebook"]
+
+def test_missing_documents(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DOCUMENTS_PATH", raising=False)
+    assert setup.load_documents() == []
+
+class RecordingClient(QdrantClient):
+    """In-process Qdrant that remembers its payload indexes (the local mode ignores them)"""
+
+    def __init__(self):
+        super().__init__(":memory:")
+        self.payload_indexes = {}
+
+    def create_payload_index(self, collection_name, field_name, field_schema=None, **kwargs):
+        self.payload_indexes[field_name] = field_schema
+        return super().create_payload_index(collection_name, field_name, field_schema, **kwargs)
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+def test_collection_has_both_vectors_and_keyword_indexes():
+    client = RecordingClient()
+    setup.setup_qdrant(client, "test-docs")
+
+    params = client.get_collection("test-docs").config.params
+    assert set(params.vectors) == {"jina-small"}
+    assert set(params.sparse_vectors) == {"bm25"}
+    assert client.payload_indexes == {"location": models.PayloadSchemaType.KEYWORD,
+                                      "doc_id": models.PayloadSchemaType.KEYWORD}
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+def test_setup_replaces_an_existing_collection():
+    client = RecordingClient()
+    setup.setup_qdrant(client, "test-docs")
+    client.upsert("test-docs", points=[models.PointStruct(id=1, vector={}, payload={"location": "Goa"})])
+    setup.setup_qdrant(client, "test-docs")
+    assert client.count("test-docs").count == 0
@@ -0,0 +1,72 @@
+# test_similarity.py - Tests for the answer similarity evaluation (normalization, streaming, summary)
+import numpy as np
+import pandas as pd
+import pytest
+import sentence_transformers
+
+from similarity import compute_similarities, encode_normalized, rowwise_cosine, similarity_stats
+
+class LetterEncoder:
+    """Encodes a text as its counts of a, b and c; remembers every batch it encoded"""
+
+    def __init__(self, model_name=None):
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+    def encode(self, texts, batch_size, convert_to_numpy):
+        self.batches.append(list(texts))
+        return np.array([[t.count("a"), t.count("b"), t.count("c")] for t in texts], dtype=np.float64)
+
+def test_encode_normalized_gives_unit_rows():
+    vectors = encode_normalized(LetterEncoder(), ["aab", "c", ""])
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0)
+    assert not vectors[2].any()  # Empty text: zero vector, no division by zero
+    assert encode_normalized(LetterEncoder(), []).shape == (0, 3)
+
+def test_rowwise_cosine():
+    a = np.array([[1.0, 0.0], [0.6, 0.8]])
+    b = np.array([[1.0, 0.0], [0.8, 0.6]])
+    assert rowwise_cosine(a, b) == pytest.approx([1.0, 0.96])
+
+def test_compute_similarities_streams_chunks(monkeypatch, tmp_path):
+    encoders = []
+
+    def make_encoder(model_name):
+        encoders.append(LetterEncoder())
+        return encoders[-1]
+
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", make_encoder)
+    answers = pd.DataFrame({
+        "model": ["phi3", "gpt", "phi3", "gpt", "phi3"],
+        "question_index": [0, 0, 1, 1, 2],
+        "question": ["q0", "q0", "q1", "q1", "q2"],
+        "document_id": ["d0", "d0", "d1", "d1", "d2"],
+        "answer_orig": ["aa", "aa", "bb", "bb", None],
+        "answer_llm": ["aa", "bb", "bb", "ab", "cc"],
+    })
+    answers_path, output_path = tmp_path / "answers.csv", tmp_path / "out" / "similarities.csv"
+    answers.to_csv(answers_path, index=False)
+    output_path.parent.mkdir()
+    output_path.write_text("stale\n")
+
+    similarities = compute_similarities(answers_path, output_path, chunk_size=2)
+
+    assert similarities["phi3"] == pytest.approx([1.0, 1.0, 0.0])
+    assert similarities["gpt"] == pytest.approx([0.0, np.sqrt(0.5)])
+    # Per chunk: the original answers not seen before, then the generated answers
+    assert encoders[0].batches == [["aa"], ["aa", "bb"], ["bb"], ["bb", "ab"], [""], ["cc"]]
+
+    written = pd.read_csv(output_path)
+    assert list(written.columns) == ["model", "question_index", "cosine_similarity", "question", "document_id"]
+    assert len(written) == 5
+
+def test_similarity_stats():
+    stats = similarity_stats({"gpt": np.array([0.5, 0.7, 0.9]), "phi3": np.array([0.4])})
+    assert list(stats.index) == ["gpt", "phi3"]
+    assert stats.loc["gpt", "mean"] == pytest.approx(0.7)
+    assert stats.loc["gpt", "std"] == pytest.approx(0.2)
+    assert stats.loc["gpt", "median"] == pytest.approx(0.7)
+    assert np.isnan(stats.loc["phi3", "std"])
@@ -0,0 +1,139 @@
+# test_singleflight.py - Tests for coalescing identical concurrent calls (results, errors, interruptions)
+import time
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import SingleFlight, LeaderAborted, normalize_query
+
+class ScriptStopped(BaseException):
+    """Stands in for Streamlit's script-stop exceptions (BaseException, not Exception)"""
+
+def run_leader_and_follower(flight: SingleFlight, leader_fn, follower_fn=lambda: "follower ran"):
+    """Start a leader, join it with a follower once it is in flight; returns each side's outcome"""
+    outcomes = {}
+    started = threading.Event()
+
+    def leader():
+        def fn():
+            started.set()
+            time.sleep(0.05)
+            return leader_fn()
+        try:
+            outcomes["leader"] = flight.do("key", fn)
+        except BaseException as e:
+            outcomes["leader"] = e
+
+    def follower():
+        try:
+            outcomes["follower"] = flight.do("key", follower_fn)
+        except BaseException as e:
+            outcomes["follower"] = e
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait()
+    follower_thread = threading.Thread(target=follower)
+    follower_thread.start()
+    leader_thread.join()
+    follower_thread.join()
+    return outcomes
+
+def test_normalize_query():
+    assert normalize_query("  Best   forts in  Rajasthan?! ") == "best forts in rajasthan"
+
+def test_follower_shares_the_leaders_result():
+    flight = SingleFlight()
+    outcomes = run_leader_and_follower(flight, lambda: {"answer": 42})
+    assert outcomes["leader"] == ({"answer": 42}, False)
+    assert outcomes["follower"] == ({"answer": 42}, True)
+    assert flight.stats()["coalesced"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+def test_follower_gets_the_leaders_exception():
+    def fail():
+        raise ValueError("provider down")
+
+    flight = SingleFlight()
+    outcomes = run_leader_and_follower(flight, fail)
+    assert isinstance(outcomes["leader"], ValueError)
+    assert outcomes["follower"] is outcomes["leader"]
+    assert flight.stats()["errors"] == 1
+
+def test_interrupted_leader_gives_followers_an_error():
+    def interrupt():
+        raise KeyboardInterrupt
+
+    flight = SingleFlight()
+    outcomes = run_leader_and_follower(flight, interrupt)
+    assert isinstance(outcomes["leader"], KeyboardInterrupt)
+    assert isinstance(outcomes["follower"], LeaderAborted)
+
+def test_calls_after_completion_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.do("key", lambda: 2) == (2, False)
+
+def test_async_followers_share_result_and_errors():
+    flight = SingleFlight()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError("provider down")
+
+    async def main():
+        shared = await asyncio.gather(*[flight.ado("ok", compute) for _ in range(3)])
+        failed = await asyncio.gather(*[flight.ado("bad", fail) for _ in range(2)], return_exceptions=True)
+        return shared, failed
+
+    shared, failed = asyncio.run(main())
+    assert len(runs) == 1
+    assert shared == [("answer", False), ("answer", True), ("answer", True)]
+    assert all(isinstance(error, ValueError) for error in failed)
+
+def test_async_follower_of_an_interrupted_leader_does_not_hang():
+    flight = SingleFlight()
+
+    async def stop():
+        await asyncio.sleep(0.05)
+        raise ScriptStopped
+
+    async def main():
+        leader = asyncio.create_task(flight.ado("key", stop))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.ado("key", stop))
+        with pytest.raises(ScriptStopped):
+            await leader
+        with pytest.raises(LeaderAborted):
+            await asyncio.wait_for(follower, 1)
+
+    asyncio.run(main())
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "answer"
+
+    async def main():
+        leader = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0.01)
+        # The leader's client disconnected
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        with pytest.raises(LeaderAborted):
+            await follower
+        assert not follower.cancelled()
+
+    asyncio.run(main())
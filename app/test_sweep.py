@@ -0,0 +1,66 @@
+# test_sweep.py - Tests for the retrieval sweep (local fusion formulas, configurations, Pareto front)
+import pandas as pd
+import pytest
+from qdrant_client import models
+
+from sweep import build_config_request, dbsf, derive, pareto_front, rrf, sweep_configs
+
+DENSE = [("a", 0.9), ("b", 0.8), ("d", 0.7)]
+SPARSE = [("b", 5.0), ("c", 3.0)]
+
+def test_rrf_matches_qdrants_formula():
+    fused = dict(rrf([DENSE[:2], SPARSE]))
+    assert fused == pytest.approx({"a": 1 / 2, "b": 1 / 3 + 1 / 2, "c": 1 / 3})
+    assert [point_id for point_id, _ in rrf([DENSE[:2], SPARSE])] == ["b", "a", "c"]
+
+def test_dbsf_normalizes_each_list():
+    fused = dict(dbsf([DENSE[:2], SPARSE]))
+    # Two scores per list: mean +/- std / sqrt(2), so normalized to 0.5 +/- 1 / (6 * sqrt(2))
+    spread = 1 / (6 * 2 ** 0.5)
+    assert fused == pytest.approx({"a": 0.5 + spread, "b": 1.0, "c": 0.5 - spread})
+
+def test_dbsf_single_and_empty_lists():
+    assert dbsf([[("a", 0.3)], []]) == [("a", 0.5)]
+
+@pytest.mark.parametrize("fusion, expected", [
+    ("dense", ["a", "b"]),
+    ("sparse", ["b", "c"]),
+    ("rrf", ["b", "a"]),
+    ("dbsf", ["b", "a"]),
+    ("multistage", ["b", "a"]),
+])
+def test_derive(fusion, expected):
+    config = {"fusion": fusion, "limit": 2, "prefetch_mult": 2 if fusion not in ("dense", "sparse") else None}
+    assert derive(config, DENSE, SPARSE) == expected
+
+def test_derive_limits_the_prefetch_depth():
+    # "b" has the best bm25 score but is only the second dense candidate
+    assert derive({"fusion": "multistage", "limit": 1, "prefetch_mult": 1}, DENSE, SPARSE) == ["a"]
+    assert derive({"fusion": "multistage", "limit": 1, "prefetch_mult": 2}, DENSE, SPARSE) == ["b"]
+
+def test_sweep_configs_only_vary_prefetch_for_fused_searches():
+    configs = sweep_configs([1, 5], [2, 10], ["dense", "rrf"])
+    assert len(configs) == 2 + 4
+    assert {c["prefetch_mult"] for c in configs if c["fusion"] == "dense"} == {None}
+    assert {(c["limit"], c["prefetch_mult"]) for c in configs if c["fusion"] == "rrf"} == {
+        (1, 2), (1, 10), (5, 2), (5, 10),
+    }
+
+def test_config_requests():
+    dense = build_config_request("forts", {"fusion": "dense", "limit": 5, "prefetch_mult": None}, None, None)
+    assert dense.using == "jina-small" and dense.limit == 5 and not dense.prefetch
+
+    fused = build_config_request("forts", {"fusion": "dbsf", "limit": 5, "prefetch_mult": 4}, None, None)
+    assert fused.query.fusion == models.Fusion.DBSF
+    assert [p.limit for p in fused.prefetch] == [20, 20]
+
+    staged = build_config_request("forts", {"fusion": "multistage", "limit": 5, "prefetch_mult": 4}, None, None)
+    assert staged.using == "bm25" and [p.using for p in staged.prefetch] == ["jina-small"]
+
+def test_pareto_front():
+    df = pd.DataFrame({
+        "mrr":            [0.5, 0.6, 0.6, 0.4, 0.7],
+        "latency_p50_ms": [10,  20,  25,  15,  40],
+    })
+    # Row 2 loses to row 1 (same quality, slower); row 3 to row 0 (worse and slower)
+    assert pareto_front(df).tolist() == [True, True, False, False, True]
@@ -0,0 +1,286 @@
+# tracing.py - Per-request Trace Spans, Sampled and Exported to Postgres or an OTLP Collector
+import os
+import time
+import queue
+import atexit
+import random
+import secrets
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Iterator
+
+import httpx
+
+from metrics import observe_stage
+
+# postgres: the spans table (db.save_spans); otlp: an OTLP/HTTP JSON collector
+# (Jaeger, Tempo, otel-collector) at TRACE_COLLECTOR_URL; none: tracing off
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "postgres").lower()
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "brahman-rag")
+# Share of traces exported; slow traces (TRACE_SLOW_MS) and failed ones are always exported
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+# Finished traces waiting for export (more are dropped), and spans sent per export call
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "1000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "500"))
+
+EXPORTERS = ("postgres", "otlp", "none")
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "lock")
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List["Span"] = []
+        self.lock = threading.Lock()
+
+class Span:
+    """One timed step of a request; attributes describe what it did (model, tokens, results...)"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_time", "end_time", "attributes", "error")
+
+    def __init__(self, trace: _Trace, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_time or time.time()) - self.start_time) * 1000
+
+    def set(self, **attributes):
+        """Add attributes (None values are skipped)"""
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def record_error(self, error: BaseException):
+        """Mark the span failed without an exception leaving it (e.g. an error that was handled)"""
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class _UntracedSpan:
+    """Yielded by span() while tracing is off; only remembers whether the step failed"""
+    __slots__ = ("failed",)
+    trace_id = None
+
+    def __init__(self):
+        self.failed = False
+
+    def set(self, **attributes):
+        pass
+
+    def record_error(self, error: BaseException):
+        self.failed = True
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a block as a span of the current trace, or as the root of a new trace
+
+    The current span is kept in a context variable, so nesting follows the
+    call stack in threads and coroutines alike (asyncio tasks and
+    asyncio.to_thread inherit it). When the root span ends, the whole trace
+    is sampled and handed to the exporter thread. Every span's duration also
+    goes to the rag_stage_duration_seconds histogram, traced or not.
+
+    Args:
+        name: Step name ("question", "llm", "qdrant_query", ...)
+        **attributes: Initial attributes; more can be added with span.set()
+    """
+    if TRACE_EXPORTER == "none":
+        # No trace, but the stage still feeds the latency histogram
+        untraced, start_time = _UntracedSpan(), time.time()
+        try:
+            yield untraced
+        except BaseException:
+            untraced.failed = True
+            raise
+        finally:
+            observe_stage(name, time.time() - start_time, untraced.failed)
+        return
+
+    parent = _current_span.get()
+    trace = parent.trace if parent else _Trace()
+    current = Span(trace, parent.span_id if parent else None, name, attributes)
+    _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        current.end_time = time.time()
+        observe_stage(name, current.duration_ms / 1000, current.error is not None)
+        # set() rather than reset(token): generators may resume in a copied context
+        _current_span.set(parent)
+        with trace.lock:
+            trace.spans.append(current)
+        if parent is None:
+            _finish(trace, current)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def _finish(trace: _Trace, root: Span):
+    """Sample a finished trace and queue it for export"""
+    _count("traces")
+    if not (root.error or root.duration_ms >= TRACE_SLOW_MS or random.random() < TRACE_SAMPLE_RATE):
+        return
+    with trace.lock:
+        spans = [s.to_dict() for s in trace.spans]
+    _exporter().submit(spans)
+
+def otlp_payload(spans: List[Dict[str, Any]], service_name: str = TRACE_SERVICE_NAME) -> Dict[str, Any]:
+    """Spans in the OTLP/HTTP JSON format"""
+    def value(v: Any) -> Dict[str, Any]:
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    otlp_spans = []
+    for s in spans:
+        start_ns = int(s["start_time"] * 1e9)
+        otlp_span = {
+            "traceId": s["trace_id"],
+            "spanId": s["span_id"],
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(s["duration_ms"] * 1e6)),
+            "attributes": [{"key": k, "value": value(v)} for k, v in s["attributes"].items()],
+            "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+        }
+        if s["parent_id"]:
+            otlp_span["parentSpanId"] = s["parent_id"]
+        otlp_spans.append(otlp_span)
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "brahman.tracing"}, "spans": otlp_spans}],
+    }]}
+
+class SpanExporter:
+    """
+    Background thread that writes sampled traces in batches
+
+    Request code only enqueues finished traces; when the queue is full
+    (exporter down or slow) new traces are dropped and counted.
+    """
+
+    def __init__(self, exporter: str = TRACE_EXPORTER, max_queue: int = TRACE_QUEUE_SIZE,
+                 batch_size: int = TRACE_BATCH_SIZE):
+        if exporter not in EXPORTERS:
+            raise ValueError(f"Unknown trace exporter: {exporter} (choose from {', '.join(EXPORTERS)})")
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self.failing = False
+        self.thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self.thread.start()
+
+    def submit(self, spans: List[Dict[str, Any]]):
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            _count("dropped_traces")
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            traces = 1
+            while len(batch) < self.batch_size:
+                try:
+                    batch = batch + self.queue.get_nowait()
+                    traces += 1
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+                _count("exported_traces", traces)
+                _count("exported_spans", len(batch))
+                self.failing = False
+            except Exception as e:
+                _count("export_errors")
+                if not self.failing:
+                    # Once per failure streak, not once per batch
+                    print(f"⚠️  Trace export ({self.exporter}) failed: {e}")
+                self.failing = True
+            finally:
+                for _ in range(traces):
+                    self.queue.task_done()
+
+    def export(self, spans: List[Dict[str, Any]]):
+        if self.exporter == "postgres":
+            from db import save_spans
+
+            save_spans(spans)
+        elif self.exporter == "otlp":
+            httpx.post(TRACE_COLLECTOR_URL, json=otlp_payload(spans), timeout=10).raise_for_status()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait (up to timeout seconds) for queued traces to be exported"""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+_exporter_instance: Optional[SpanExporter] = None
+_exporter_lock = threading.Lock()
+_counters: Dict[str, int] = defaultdict(int)
+_counters_lock = threading.Lock()
+
+def _exporter() -> SpanExporter:
+    global _exporter_instance
+    with _exporter_lock:
+        if _exporter_instance is None:
+            _exporter_instance = SpanExporter()
+            atexit.register(_exporter_instance.flush)
+        return _exporter_instance
+
+def _count(name: str, value: int = 1):
+    with _counters_lock:
+        _counters[name] += value
+
+def flush(timeout: float = 5.0):
+    """Export queued traces now (scripts call this before exiting)"""
+    if _exporter_instance is not None:
+        _exporter_instance.flush(timeout)
+
+def stats() -> Dict[str, Any]:
+    """Traces seen, exported and dropped, export errors and the exporter queue depth"""
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        "exporter": TRACE_EXPORTER,
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "slow_ms": TRACE_SLOW_MS,
+        "queue_depth": _exporter_instance.queue.qsize() if _exporter_instance else 0,
+        **counters,
+    }
@@ -22,12 +22,21 @@ PG_USER = os.getenv("POSTGRES_USER", "admin")
 PG_PASSWORD = os.getenv("POSTGRES_PASSWORD", "admin")
 PG_PORT = os.getenv("POSTGRES_PORT", "5432")
 
+# Prometheus (inside Docker network), scraping the API's /metrics
+PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://prometheus:9090")
+
 # Path to dashboard.json
 DASHBOARD_PATH = os.getenv(
     "GRAFANA_DASHBOARD_PATH",
     str(Path(__file__).with_name("dashboard.json"))
 )
 
+# Path to the live metrics dashboard (Prometheus)
+METRICS_DASHBOARD_PATH = os.getenv(
+    "GRAFANA_METRICS_DASHBOARD_PATH",
+    str(Path(__file__).with_name("metrics_dashboard.json"))
+)
+
 auth = HTTPBasicAuth(GRAFANA_USER, GRAFANA_PASSWORD)
 headers = {"Content-Type": "application/json"}
 
@@ -47,7 +56,7 @@ def wait_for_grafana(timeout=120):
 
 def create_or_update_datasource():
     """Create/update the 'PostgreSQL' datasource pointing to postgres:5432."""
-    payload = {
+    return upsert_datasource({
         "name": "PostgreSQL",
         "type": "postgres",
         "url": f"{PG_HOST}:{PG_PORT}",
@@ -61,30 +70,44 @@ def create_or_update_datasource():
             "postgresVersion": 1300
         },
         "secureJsonData": {"password": PG_PASSWORD},
-    }
+    })
+
+def create_or_update_prometheus_datasource():
+    """Create/update the 'Prometheus' datasource pointing to prometheus:9090."""
+    return upsert_datasource({
+        "name": "Prometheus",
+        "type": "prometheus",
+        "url": PROMETHEUS_URL,
+        "access": "proxy",
+        "basicAuth": False,
+        "isDefault": False,
+        "jsonData": {"httpMethod": "POST", "timeInterval": "15s"},
+    })
 
+def upsert_datasource(payload):
+    """Create the datasource, or update the one with the same name; returns its UID."""
     # Update if exists, else create
     getr = requests.get(f"{GRAFANA_URL}/api/datasources/name/{payload['name']}",
                         auth=auth)
     if getr.status_code == 200:
         ds_id = getr.json()["id"]
-        print(f"Updating existing datasource (id={ds_id})")
+        print(f"Updating existing datasource {payload['name']} (id={ds_id})")
         upr = requests.put(f"{GRAFANA_URL}/api/datasources/{ds_id}",
                            headers=headers, json=payload, auth=auth)
         if upr.status_code not in (200, 202):
             raise RuntimeError(f"Update datasource failed: {upr.status_code} {upr.text}")
         return upr.json().get("datasource", {}).get("uid") or upr.json().get("uid")
 
-    print("Creating new datasource")
+    print(f"Creating new datasource {payload['name']}")
     cr = requests.post(f"{GRAFANA_URL}/api/datasources",
                        headers=headers, json=payload, auth=auth)
     if cr.status_code not in (200, 201):
         raise RuntimeError(f"Create datasource failed: {cr.status_code} {cr.text}")
     return cr.json().get("datasource", {}).get("uid") or cr.json().get("uid")
 
-def create_dashboard(datasource_uid):
-    """Import dashboard.json and rewrite datasource UID references."""
-    dash_path = Path(DASHBOARD_PATH)
+def create_dashboard(datasource_uid, dashboard_path=DASHBOARD_PATH):
+    """Import a dashboard JSON file and rewrite datasource UID references."""
+    dash_path = Path(dashboard_path)
     if not dash_path.exists():
         raise FileNotFoundError(f"Dashboard file not found at: {dash_path}")
     with dash_path.open("r", encoding="utf-8") as f:
@@ -125,5 +148,9 @@ def main():
     dash_uid = create_dashboard(ds_uid)
     print(f"Done. Dashboard UID: {dash_uid}")
 
+    prom_uid = create_or_update_prometheus_datasource()
+    metrics_dash_uid = create_dashboard(prom_uid, METRICS_DASHBOARD_PATH)
+    print(f"Done. Metrics dashboard UID: {metrics_dash_uid}")
+
 if __name__ == "__main__":
     main()